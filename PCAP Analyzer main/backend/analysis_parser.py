@@ -0,0 +1,178 @@
+import functools
+import json
+import re
+from typing import Dict, Any, List, Optional
+
+from prompt_builder import ANALYSIS_SECTIONS
+
+ALERT_LEVELS = ["Low", "Medium", "High", "Critical"]
+
+# JSON schema passed as Ollama's ``format`` so the model answers with typed fields
+ANALYSIS_SCHEMA = {
+    "type": "object",
+    "properties": dict(
+        {key: {"type": "string"} for key, _, _ in ANALYSIS_SECTIONS if key != 'recommendations'},
+        alert_level={"type": "string", "enum": ALERT_LEVELS},
+        identified_threats={"type": "array", "items": {"type": "string"}},
+        recommendations={"type": "array", "items": {"type": "string"}}
+    ),
+    "required": [key for key, _, _ in ANALYSIS_SECTIONS] + ["alert_level", "identified_threats"]
+}
+
+THREAT_INDICATORS = [
+    "malware", "scan", "brute force", "data exfiltration",
+    "c2", "command and control", "ddos", "lateral movement",
+    "port scan", "vulnerability exploit", "suspicious traffic"
+]
+# A lookahead so overlapping mentions count too ("port scan" is also a "scan")
+_THREAT_RE = re.compile(r"\b(?=(" + "|".join(re.escape(t) for t in THREAT_INDICATORS) + r"))", re.IGNORECASE)
+
+_HEADINGS = {heading.lower(): key for key, heading, _ in ANALYSIS_SECTIONS}
+# A heading line: optional markdown/numbering, the heading, optional colon and
+# same-line content (e.g. "## TRAFFIC OVERVIEW", "**3. Connection patterns:** ...")
+_HEADING_RE = re.compile(
+    r"^\s*(?P<prefix>#+|\d+[.)]|[-*]\s)?\s*(?P<bold>\*\*)?\s*(?P<prefix2>\d+[.)])?\s*"
+    r"(?P<name>" + "|".join(re.escape(h) for h in _HEADINGS) + r")\b\s*(?:\*\*)?\s*(?P<sep>:)?\s*(?:\*\*)?\s*(?P<rest>.*)$",
+    re.IGNORECASE)
+
+# "Alert level: High", "Risk level - **medium**", "Severity: critical"
+_LABELLED_LEVEL_RE = re.compile(
+    r"\b(?:alert|risk|threat|severity)(?:\s+level)?\s*(?:is|of)?\s*[:=\-]?\s*\**\s*(critical|high|medium|moderate|low)\b",
+    re.IGNORECASE)
+# "high risk", "medium-severity", "critical threat"
+_QUALIFIED_LEVEL_RE = re.compile(
+    r"\b(critical|high|medium|moderate|low)[\s-]+(?:risk|severity|threat|priority|alert)", re.IGNORECASE)
+
+
+def _level(word: str) -> str:
+    word = word.lower()
+    return "Medium" if word == "moderate" else word.title()
+
+
+def parse_alert_level(text: str) -> str:
+    """Find the alert level the analysis states
+
+    An explicit label ("Alert level: High") wins; otherwise the most severe
+    qualified mention ("high risk"). A bare "high" (as in "high volume")
+    does not count. Defaults to Low.
+    """
+    labelled = _LABELLED_LEVEL_RE.search(text)
+    if labelled:
+        return _level(labelled.group(1))
+    qualified = [_level(m.group(1)) for m in _QUALIFIED_LEVEL_RE.finditer(text)]
+    if qualified:
+        return max(qualified, key=ALERT_LEVELS.index)
+    return "Low"
+
+
+def parse_threats(text: str) -> List[str]:
+    """List the known threat indicators mentioned in the analysis"""
+    found = {m.group(1).lower() for m in _THREAT_RE.finditer(text)}
+    return [indicator.title() for indicator in THREAT_INDICATORS if indicator in found]
+
+
+def parse_bullets(text: str) -> List[str]:
+    """Split a bulleted or numbered list into items"""
+    items = []
+    for line in text.splitlines():
+        line = line.strip()
+        if line[:1] in ('-', '*', '•'):
+            items.append(line[1:].strip())
+        elif line[:1].isdigit() and line.split(' ', 1)[0].rstrip('.)').isdigit() and ' ' in line:
+            items.append(line.split(' ', 1)[1].strip())
+    return [item.strip('* ') for item in items if item.strip('* ')]
+
+
+def parse_sections(text: str) -> Dict[str, str]:
+    """Split free-text analysis into sections in a single pass over its lines"""
+    sections = {}
+    current = None
+    for line in text.splitlines():
+        match = _HEADING_RE.match(line)
+        # A body sentence may start with a heading's words; only treat the
+        # line as a heading when it is marked up, followed by a colon or alone
+        if match and (match.group('prefix') or match.group('bold') or match.group('sep')
+                      or not match.group('rest')):
+            current = _HEADINGS[match.group('name').lower()]
+            sections.setdefault(current, [])
+            if match.group('rest'):
+                sections[current].append(match.group('rest'))
+        elif current is not None:
+            sections[current].append(line)
+    return {key: "\n".join(lines).strip() for key, lines in sections.items()}
+
+
+def _recommendations(sections: Dict[str, str]) -> List[str]:
+    text = sections.get('recommendations')
+    if text is None:
+        return ["No specific recommendations found"]
+    return parse_bullets(text)[:5] or [text[:200] + "..."]
+
+
+@functools.lru_cache(maxsize=32)
+def _parse_analysis(text: str) -> Dict[str, Any]:
+    sections = parse_sections(text)
+    return {
+        'sections': sections,
+        'alert_level': parse_alert_level(sections.get('security_assessment', text)),
+        'identified_threats': parse_threats(text),
+        'recommendations': _recommendations(sections)
+    }
+
+
+def parse_analysis(text: str) -> Dict[str, Any]:
+    """Parse a free-text analysis into sections, alert level, threats and recommendations
+
+    Results are memoized by text, so repeated lookups on the same analysis
+    (summary, recommendations, each section) parse it only once.
+    """
+    parsed = _parse_analysis(text)
+    return dict(parsed, sections=dict(parsed['sections']),
+                identified_threats=list(parsed['identified_threats']),
+                recommendations=list(parsed['recommendations']))
+
+
+def _as_text(value: Any) -> str:
+    if isinstance(value, list):
+        return "\n".join(f"- {item}" for item in value)
+    return str(value).strip() if value is not None else ""
+
+
+def parse_structured(text: str) -> Optional[Dict[str, Any]]:
+    """Parse a JSON-mode analysis into the same shape as ``parse_analysis``
+
+    Returns None when the output is not a JSON object, so callers can fall
+    back to the free-text parser.
+    """
+    try:
+        data = json.loads(text)
+    except ValueError:
+        return None
+    if not isinstance(data, dict):
+        return None
+
+    sections = {key: _as_text(data.get(key)) for key, _, _ in ANALYSIS_SECTIONS if data.get(key)}
+    recommendations = data.get('recommendations')
+    if isinstance(recommendations, str):
+        recommendations = parse_bullets(recommendations) or [recommendations]
+    threats = data.get('identified_threats')
+    if isinstance(threats, str):
+        threats = [threats]
+
+    level = str(data.get('alert_level', '')).strip().title()
+    if level == "Moderate":
+        level = "Medium"
+    if level not in ALERT_LEVELS:
+        level = parse_alert_level(sections.get('security_assessment', ''))
+    return {
+        'sections': sections,
+        'alert_level': level,
+        'identified_threats': [str(t) for t in threats] if isinstance(threats, list) else [],
+        'recommendations': [str(r) for r in recommendations] if isinstance(recommendations, list) else []
+    }
+
+
+def render_sections(sections: Dict[str, str]) -> str:
+    """Render parsed sections back into the markdown used for free-text analyses"""
+    return "\n\n".join(f"## {heading}\n{sections[key]}"
+                       for key, heading, _ in ANALYSIS_SECTIONS if sections.get(key))
@@ -1,106 +1,223 @@
-from flask import Flask, jsonify, request
+from flask import Flask, jsonify, request, Response, stream_with_context, send_file
 from flask_cors import CORS
 import json
 import os
-from datetime import datetime
 from models.anomaly_detector import AnomalyDetector
 from packet_processing.packet_parser import PacketParser
 from llm_engine import LLMEngine
-import threading
+from llm_cache import LLMResponseCache
+from llm_scheduler import LLMScheduler, SchedulerBusy
+from analysis_parser import parse_analysis
+from models.model_registry import ModelConfigRegistry
 import time
+import uuid
 from utils import sanitize_for_json
+from storage import UploadStore
+from progress import ProgressBroker
+from profiling import ProfileStore, profile_stage
+from batch import ArchiveTooLarge, ExpansionBudget, analyze_batch, is_archive, iter_archive_captures
+from live_capture import LiveAnalyzer, LiveCapture, resolve_source
+from packet_processing.capture_filter import CaptureFilter, FilterError
+from packet_processing.sampling import FlowSampler
+from packet_processing.app_layer import (inspect_capture, pair_selector, flow_selector, service_selector,
+                                         summarize_pairs)
+from packet_processing.pcap_stream import is_classic_pcap
+from packet_processing.compression import UnsupportedCompression, check_decompressor
+import threading
+from contextlib import ExitStack
+from metrics import (REGISTRY, STAGE_SECONDS, PARSED_PACKETS, PARSED_BYTES, PARSE_PACKET_RATE,
+                     PARSE_BYTE_RATE, QUEUE_DEPTH, CACHE_REQUESTS, ANALYSIS_PEAK_MEMORY, ANALYSES,
+                     MemorySampler)
 
 app = Flask(__name__)
 # Configure CORS to accept requests from frontend
 CORS(app, resources={r"/api/*": {"origins": ["http://localhost:3000", "http://127.0.0.1:3000"]}})
 
-# Initialize models
-anomaly_detector = AnomalyDetector()
-packet_parser = PacketParser()
-llm_engine = LLMEngine(model_name=os.environ.get("LLM_MODEL", "mistral"))
+# Live capture from a FIFO, stdin or growing pcap: LIVE_CAPTURE_SOURCE starts
+# one at boot; /api/live/start may only open sources inside LIVE_CAPTURE_DIR
+LIVE_CAPTURE_DIR = os.environ.get("LIVE_CAPTURE_DIR")
+live_capture = None
+live_lock = threading.Lock()
+
+
+def _start_live_capture(source, follow=True, window_seconds=None):
+    global live_capture
+    # The live thread gets its own detector: the shared one may train, save
+    # and update its stats while request threads use it. Read-only, like the
+    # batch workers', so only request handling writes the model file
+    analyzer = LiveAnalyzer(
+        AnomalyDetector(read_only=True),
+        window_seconds=window_seconds or float(os.environ.get("LIVE_WINDOW_SECONDS", "60")),
+        windows_kept=int(os.environ.get("LIVE_WINDOWS_KEPT", "10")),
+        idle_timeout=float(os.environ.get("LIVE_FLOW_IDLE_TIMEOUT", "120")),
+        max_flows=int(os.environ.get("LIVE_MAX_FLOWS", "50000")),
+        sample_size=int(os.environ.get("LIVE_SAMPLE_PACKETS", "20000"))
+    )
+    live_capture = LiveCapture(analyzer, source, follow=follow).start()
+    return live_capture
+
+
+# Lazy DNS/TLS/HTTP decoding of the traffic behind flagged anomalies. Off by
+# default: it reads the capture a second time on every upload with anomalies
+APP_LAYER_INSPECT = os.environ.get("APP_LAYER_INSPECT", "0").lower() in ("1", "true", "yes")
+APP_LAYER_MAX_ANOMALIES = int(os.environ.get("APP_LAYER_MAX_ANOMALIES", "20"))
 
-# Start a background thread to check LLM availability
-def check_llm_availability():
-    # Wait a bit to allow the container to fully start
-    time.sleep(5)
+# Batch workers are spawned processes that re-import this script as
+# __mp_main__; models, storage and background threads are only set up
+# in the serving process
+if __name__ != '__mp_main__':
+    # Initialize models
+    anomaly_detector = AnomalyDetector()
+    packet_parser = PacketParser()
+    llm_cache = LLMResponseCache(
+        cache_dir=os.environ.get("LLM_CACHE_DIR", os.path.join(os.path.dirname(__file__), 'data', 'llm_cache')),
+        memory_entries=int(os.environ.get("LLM_CACHE_MEMORY_ENTRIES", "128")),
+        disk_max_bytes=int(float(os.environ.get("LLM_CACHE_MAX_MB", "100")) * 1024 * 1024),
+        ttl=int(os.environ.get("LLM_CACHE_TTL", str(24 * 3600)))
+    )
+    # Model configs are loaded and validated once here, then reloaded on change
+    model_registry = ModelConfigRegistry()
+    # Bounded queue in front of Ollama; workers should match OLLAMA_NUM_PARALLEL
+    llm_scheduler = LLMScheduler(
+        workers=int(os.environ.get("LLM_WORKERS", os.environ.get("OLLAMA_NUM_PARALLEL", "2"))),
+        max_queue=int(os.environ.get("LLM_QUEUE_SIZE", "32"))
+    )
+    llm_engine = LLMEngine(model_name=os.environ.get("LLM_MODEL", "mistral"), cache=llm_cache,
+                           pool_size=int(os.environ.get("LLM_POOL_SIZE", "10")), registry=model_registry,
+                           scheduler=llm_scheduler)
+
+    # Content-addressed upload storage with a disk budget (0 disables eviction)
+    upload_store = UploadStore(
+        os.path.join(os.path.dirname(__file__), 'uploads'),
+        max_bytes=int(float(os.environ.get("UPLOAD_DISK_BUDGET_MB", "2048")) * 1024 * 1024),
+        eviction_policy=os.environ.get("UPLOAD_EVICTION_POLICY", "lru")
+    )
+
+    # Progress events for long-running analyses, streamed over SSE
+    progress_broker = ProgressBroker()
+
+    # Opt-in per-stage profiling of uploads: every upload with PROFILE_UPLOADS=1,
+    # or requests carrying X-Profile-Token matching PROFILING_TOKEN
+    profile_store = ProfileStore(
+        os.environ.get("PROFILES_DIR", os.path.join(os.path.dirname(__file__), 'profiles')),
+        token=os.environ.get("PROFILING_TOKEN"),
+        always=os.environ.get("PROFILE_UPLOADS", "0").lower() in ("1", "true", "yes"),
+        keep=int(os.environ.get("PROFILES_KEEP", "50"))
+    )
+
+    if os.environ.get("LIVE_CAPTURE_SOURCE"):
+        _start_live_capture(os.environ["LIVE_CAPTURE_SOURCE"])
+
+    # Background LLM health monitor; requests read its cached state instead of
+    # probing Ollama themselves
     print(f"Checking LLM availability at {llm_engine.api_base}...")
-    print(f"Environment variables: LLM_API_BASE={os.environ.get('LLM_API_BASE')}")
-    
-    # Try to ping the Ollama service directly
-    try:
-        import subprocess
-        result = subprocess.run(['curl', '-s', f"{llm_engine.api_base}/api/tags"], 
-                               capture_output=True, text=True)
-        print(f"Direct curl test: {result.stdout[:100]}...")
-    except Exception as e:
-        print(f"Curl test failed: {e}")
-    
-    available = llm_engine.wait_for_service()
-    if available:
-        print("LLM service is available")
-    else:
-        print("WARNING: LLM service is not available. Network analysis will be limited.")
+    llm_engine.start_health_monitor(interval=float(os.environ.get("LLM_HEALTH_INTERVAL", "10")))
 
-# Start the background thread for non-blocking LLM check
-llm_thread = threading.Thread(target=check_llm_availability)
-llm_thread.daemon = True
-llm_thread.start()
+
+@app.errorhandler(SchedulerBusy)
+def llm_queue_full(e):
+    """Reject quickly when the LLM queue is full instead of holding the request"""
+    response = jsonify({'error': str(e), 'retry_after': e.retry_after})
+    response.status_code = 503
+    response.headers['Retry-After'] = str(e.retry_after)
+    return response
 
 def format_llm_input(packet_summary, anomalies):
     """Format data for LLM input"""
-    # Get packet stats
-    stats = packet_parser.get_stats()
-    
-    # Format the input
+    # Counts come from the analysis being asked about, not the parser's
+    # running totals, so the same capture always yields the same prompt
     return {
         "packet_summary": {
-            "total_packets": stats['total_packets'],
-            "protocols": stats['protocols'],
+            "total_packets": packet_summary.get("total_packets", 0),
+            "protocols": packet_summary.get("protocols", {}),
             "top_sources": packet_summary.get("top_sources", [])
         },
         "anomalies": anomalies
     }
 
-@app.route('/api/upload', methods=['POST'])
-def upload_pcap():
-    """Endpoint to upload and analyze PCAP files"""
-    if 'file' not in request.files:
-        return jsonify({'error': 'No file part'}), 400
-    
-    file = request.files['file']
-    if file.filename == '':
-        return jsonify({'error': 'No selected file'}), 400
-    
-    # Save uploaded file
-    upload_folder = os.path.join(os.path.dirname(__file__), 'uploads')
-    os.makedirs(upload_folder, exist_ok=True)
-    file_path = os.path.join(upload_folder, f"upload_{datetime.now().strftime('%Y%m%d%H%M%S')}.pcap")
-    file.save(file_path)
+def _analyze_capture(file_path, file_name, run_llm_analysis=False, progress=None, bypass_cache=False,
+                     profiler=None, capture_filter=None, index_path=None, sampler=None, inspect_services=None):
+    """Run the parse, detection and optional LLM pipeline on a stored capture
+
+    ``progress`` is an optional ``progress(stage, **data)`` callback receiving
+    structured events as each stage of the pipeline completes. ``profiler``
+    is an optional ``AnalysisProfiler`` that profiles each stage.
+    ``capture_filter`` restricts the analysis to matching packets, using the
+    record index cached at ``index_path``. With a ``FlowSampler`` only the
+    sampled flows are analyzed and volume totals are scaled back up.
+    Application-layer details are decoded only for anomalous address pairs
+    and for flows of the ``inspect_services`` named (dns, tls, http).
+    Compressed captures are decoded as a stream by every stage.
+    """
+    progress = progress or (lambda stage, **data: None)
+    memory = MemorySampler()
+    compression = check_decompressor(file_path)
     
     # Process PCAP file
-    packet_data = packet_parser.parse_pcap(file_path)
+    parse_started = time.perf_counter()
+    with profile_stage(profiler, 'parse'):
+        packet_data = packet_parser.parse_pcap(file_path, progress=progress, capture_filter=capture_filter,
+                                               index_path=index_path, sampler=sampler)
+    parse_time = time.perf_counter() - parse_started
+    STAGE_SECONDS.observe(parse_time, stage='parse')
+    parsed_bytes = sum(p.get('length', 0) for p in packet_data)
+    PARSED_PACKETS.inc(len(packet_data))
+    PARSED_BYTES.inc(parsed_bytes)
+    PARSE_PACKET_RATE.set(len(packet_data) / max(parse_time, 1e-6))
+    PARSE_BYTE_RATE.set(parsed_bytes / max(parse_time, 1e-6))
+    memory.sample()
     
-    # Get packet statistics and flow data
-    packet_stats = packet_parser.get_stats()
+    # Statistics and flow data of this capture; the parser's own stats are
+    # running totals shared by every request
+    packet_stats = packet_data.stats
     
     # Analyze flows
-    flow_features = packet_parser.extract_features(packet_data)
+    with STAGE_SECONDS.time(stage='features'), profile_stage(profiler, 'features'):
+        flow_features = packet_parser.extract_features(packet_data)
+    progress('features_extracted', feature_rows=len(flow_features))
+    memory.sample()
     
     # Detect anomalies
-    anomaly_results = anomaly_detector.analyze(packet_data)
+    with STAGE_SECONDS.time(stage='detection'), profile_stage(profiler, 'detection'):
+        anomaly_results = anomaly_detector.analyze(packet_data)
+    progress('detection_done',
+             anomaly_count=len(anomaly_results['anomalies']),
+             anomalies=[{'src_ip': a.get('src_ip'), 'dst_ip': a.get('dst_ip'), 'anomaly_score': a.get('anomaly_score')}
+                        for a in anomaly_results['anomalies'][:10]])
+    memory.sample()
+    
+    # Decode application-layer details only where they are needed
+    app_layer = None
+    if is_classic_pcap(file_path):
+        if APP_LAYER_INSPECT and anomaly_results['anomalies']:
+            with STAGE_SECONDS.time(stage='app_layer'), profile_stage(profiler, 'app_layer'):
+                _attach_app_layer(file_path, anomaly_results['anomalies'][:APP_LAYER_MAX_ANOMALIES])
+        if inspect_services:
+            with STAGE_SECONDS.time(stage='app_layer'), profile_stage(profiler, 'app_layer_services'):
+                app_layer = inspect_capture(file_path, service_selector(inspect_services))
+            progress('app_layer_done', flows=len(app_layer['flows']))
     
     # Create analysis summary
     packet_summary = {
         'total_packets': len(packet_data),
         'duration': packet_stats.get('duration', 0),
-        'protocols': packet_stats.get('protocols', {}),
+        'protocols': packet_stats['protocols'],
         'services': packet_stats.get('services', {}),
         'top_sources': anomaly_results['summary'].get('top_sources', []),
         'top_destinations': anomaly_results['summary'].get('top_destinations', [])
     }
+    sampling = packet_stats.get('sampling')
+    if sampling:
+        # Report full-capture volumes; per-flow figures are exact for kept flows
+        packet_summary.update({
+            'total_packets': sampling['packets']['estimate'],
+            'protocols': {name: value['estimate'] for name, value in sampling['protocols'].items()},
+            'services': sampler.scale(packet_stats.get('services', {})),
+            'sampled': True,
+            'sample_rate': sampling['rate']
+        })
     
     # Perform LLM analysis if requested
-    run_llm_analysis = request.form.get('run_llm_analysis', 'false').lower() == 'true'
     llm_results = None
     
     if run_llm_analysis:
@@ -112,11 +229,17 @@ def upload_pcap():
         }
         
         # Run comprehensive LLM analysis
-        llm_results = llm_engine.analyze(llm_input)
+        progress('llm_started', model=llm_engine.model_name)
+        with STAGE_SECONDS.time(stage='llm'), profile_stage(profiler, 'llm'):
+            llm_results = llm_engine.analyze(llm_input, bypass_cache=bypass_cache)
+        progress('llm_done', alert_level=llm_results.get('alert_level'))
+    
+    memory.sample()
+    ANALYSIS_PEAK_MEMORY.observe(memory.peak)
     
     response_data = {
         'status': 'success',
-        'file_name': file.filename,
+        'file_name': file_name,
         'packet_count': len(packet_data),
         'capture_duration': packet_stats.get('duration', 0),
         'anomalies': anomaly_results['anomalies'],
@@ -124,10 +247,197 @@ def upload_pcap():
         'flow_analysis': packet_stats.get('flows', {}).get('top_flows', [])[:10],
         'llm_analysis': llm_results
     }
+    if compression:
+        response_data['compression'] = compression
+    if app_layer is not None:
+        response_data['app_layer'] = app_layer
+    if sampling:
+        response_data.update({'sampled': True, 'sampling': sampling,
+                              'estimated_packet_count': sampling['packets']['estimate']})
+    if capture_filter is not None:
+        response_data['capture_filter'] = packet_stats.get('capture_filter') or {'filter': capture_filter.describe()}
+    
+    return response_data
+
+def _attach_app_layer(file_path, anomalies):
+    """Add decoded DNS/TLS/HTTP details and indicators to anomaly records"""
+    pairs = set()
+    for anomaly in anomalies:
+        try:
+            pair_selector([(anomaly['src_ip'], anomaly['dst_ip'])])
+        except (KeyError, ValueError):
+            continue
+        pairs.add((anomaly['src_ip'], anomaly['dst_ip']))
+    if not pairs:
+        return
+    by_pair = summarize_pairs(inspect_capture(file_path, pair_selector(pairs)))
+    for anomaly in anomalies:
+        details = by_pair.get(frozenset((anomaly.get('src_ip'), anomaly.get('dst_ip'))))
+        if details:
+            anomaly['app_layer'] = details
+
+@app.route('/api/upload', methods=['POST'])
+def upload_pcap():
+    """Endpoint to upload and analyze PCAP files"""
+    if 'file' not in request.files:
+        return jsonify({'error': 'No file part'}), 400
+    
+    file = request.files['file']
+    if file.filename == '':
+        return jsonify({'error': 'No selected file'}), 400
+    
+    run_llm_analysis = request.form.get('run_llm_analysis', 'false').lower() == 'true'
+    bypass_cache = request.form.get('bypass_cache', 'false').lower() == 'true'
+    # Optional BPF-style filter and time bounds, pushed down into parsing
+    try:
+        capture_filter = CaptureFilter.from_params(request.form)
+    except FilterError as e:
+        return jsonify({'error': f'Invalid capture filter: {e}'}), 400
+    # Flow-consistent sampling for quick triage of very large captures
+    sampler = None
+    if request.form.get('sample_rate'):
+        try:
+            sampler = FlowSampler(float(request.form['sample_rate']), seed=int(request.form.get('sample_seed', 0)))
+        except ValueError:
+            return jsonify({'error': 'sample_rate must be a number in (0, 1]'}), 400
+        if sampler.rate == 1:
+            sampler = None
+    # Services whose flows get DNS/TLS/HTTP details decoded
+    inspect_services = [name.strip().lower() for name in request.form.get('inspect_services', '').split(',')
+                        if name.strip()]
+    try:
+        service_selector(inspect_services)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    # Clients may pick the id up front so they can subscribe to /api/progress first
+    analysis_id = request.form.get('analysis_id') or uuid.uuid4().hex
+    progress = progress_broker.reporter(analysis_id)
+    # None unless profiling is enabled for this request
+    profiler = profile_store.profiler_for(request.headers, analysis_id, file.filename)
+    
+    # Save uploaded file (identical content is stored only once) and keep it
+    # pinned against eviction while it is analyzed
+    try:
+        with QUEUE_DEPTH.track_inprogress(queue='upload'):
+            with upload_store.receive(file, file.filename) as stored:
+                CACHE_REQUESTS.inc(cache='upload_dedup', result='hit' if stored['deduplicated'] else 'miss')
+                progress('stored', capture_id=stored['digest'], deduplicated=stored['deduplicated'])
+                index_path = (upload_store.derived_path(stored['digest'], 'record_index.json')
+                              if capture_filter else None)
+                response_data = _analyze_capture(stored['path'], file.filename, run_llm_analysis, progress,
+                                                 bypass_cache=bypass_cache, profiler=profiler,
+                                                 capture_filter=capture_filter, index_path=index_path,
+                                                 sampler=sampler, inspect_services=inspect_services)
+    except UnsupportedCompression as e:
+        ANALYSES.inc(endpoint='upload', outcome='error')
+        progress('error', error=str(e))
+        if profiler is not None:
+            profiler.finish()
+        return jsonify({'error': str(e)}), 415
+    except Exception as e:
+        ANALYSES.inc(endpoint='upload', outcome='error')
+        progress('error', error=str(e))
+        if profiler is not None:
+            profiler.finish()
+        raise
+    response_data['analysis_id'] = analysis_id
+    response_data['capture_id'] = stored['digest']
+    response_data['deduplicated'] = stored['deduplicated']
+    if profiler is not None:
+        response_data['profile'] = f"/api/profiles/{profiler.profile_id}"
+    progress('complete', packet_count=response_data['packet_count'])
+    ANALYSES.inc(endpoint='upload', outcome='success')
     
     # Sanitize data for JSON serialization
-    sanitized_data = sanitize_for_json(response_data)
-    return jsonify(sanitized_data)
+    try:
+        with STAGE_SECONDS.time(stage='serialization'), profile_stage(profiler, 'serialization'):
+            sanitized_data = sanitize_for_json(response_data)
+            return jsonify(sanitized_data)
+    finally:
+        if profiler is not None:
+            profiler.finish()
+
+@app.route('/api/upload/batch', methods=['POST'])
+def upload_batch():
+    """Analyze many captures (individual files and/or zip/tar archives) in parallel"""
+    files = request.files.getlist('files') + request.files.getlist('file')
+    files = [f for f in files if f.filename]
+    if not files:
+        return jsonify({'error': 'No files provided'}), 400
+    
+    run_llm_analysis = request.form.get('run_llm_analysis', 'false').lower() == 'true'
+    bypass_cache = request.form.get('bypass_cache', 'false').lower() == 'true'
+    analysis_id = request.form.get('analysis_id') or uuid.uuid4().hex
+    progress = progress_broker.reporter(analysis_id)
+    
+    try:
+        with ExitStack() as pins:
+            # Store every capture (expanding archives) and pin it until the batch is done
+            captures = []
+            budget = ExpansionBudget()
+            for file in files:
+                if is_archive(file.filename):
+                    members = iter_archive_captures(file, file.filename, budget)
+                else:
+                    members = [(file.filename, file)]
+                for name, stream in members:
+                    stored = pins.enter_context(upload_store.receive(stream, name))
+                    CACHE_REQUESTS.inc(cache='upload_dedup', result='hit' if stored['deduplicated'] else 'miss')
+                    captures.append({'path': stored['path'], 'file_name': name, 'capture_id': stored['digest']})
+            if not captures:
+                return jsonify({'error': 'No capture files found in upload'}), 400
+            progress('stored', files_total=len(captures))
+            
+            with STAGE_SECONDS.time(stage='batch'):
+                batch_results = analyze_batch(captures, progress)
+    except ArchiveTooLarge as e:
+        ANALYSES.inc(endpoint='batch', outcome='error')
+        progress('error', error=str(e))
+        return jsonify({'error': str(e)}), 413
+    except Exception as e:
+        ANALYSES.inc(endpoint='batch', outcome='error')
+        progress('error', error=str(e))
+        raise
+    
+    for capture, result in zip(captures, batch_results['results']):
+        result['capture_id'] = capture['capture_id']
+    
+    llm_results = None
+    if run_llm_analysis:
+        summary = batch_results['summary']
+        progress('llm_started', model=llm_engine.model_name)
+        llm_results = llm_engine.analyze({
+            'packet_summary': summary,
+            'anomalies': [a for r in batch_results['results'] for a in r.get('anomalies', [])],
+            'flow_data': {'top_flows': summary['top_flows']}
+        }, bypass_cache=bypass_cache, priority='batch')
+        progress('llm_done', alert_level=llm_results.get('alert_level'))
+    
+    progress('complete', files_total=len(captures))
+    ANALYSES.inc(endpoint='batch', outcome='success')
+    with STAGE_SECONDS.time(stage='serialization'):
+        return jsonify(sanitize_for_json({
+            'status': 'success',
+            'analysis_id': analysis_id,
+            'file_count': len(captures),
+            'results': batch_results['results'],
+            'summary': batch_results['summary'],
+            'llm_analysis': llm_results
+        }))
+
+@app.route('/api/metrics', methods=['GET'])
+def get_metrics():
+    """Expose pipeline metrics in the Prometheus text format"""
+    return Response(REGISTRY.render(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/api/progress/<analysis_id>', methods=['GET'])
+def stream_progress(analysis_id):
+    """Stream progress events for an analysis as Server-Sent Events"""
+    return Response(
+        stream_with_context(progress_broker.subscribe(analysis_id)),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
 
 @app.route('/api/status', methods=['GET'])
 def get_status():
@@ -136,21 +446,117 @@ def get_status():
         'status': 'running',
         'analyzed_packets': packet_parser.get_stats()['total_packets'],
         'detected_anomalies': anomaly_detector.get_stats()['total_anomalies'],
-        'model_status': anomaly_detector.get_model_info()
+        'model_status': anomaly_detector.get_model_info(),
+        'llm_status': llm_engine.health.snapshot() if llm_engine.health else None,
+        'model_configs': model_registry.status(),
+        'llm_scheduler': llm_scheduler.get_stats()
+    })
+
+@app.route('/api/profiles', methods=['GET'])
+def list_profiles():
+    """List stored upload profiles (requires X-Profile-Token)"""
+    if not profile_store.authorized(request.headers):
+        return jsonify({'error': 'Profiling access requires a valid X-Profile-Token'}), 403
+    return jsonify({'profiles': profile_store.list()})
+
+@app.route('/api/profiles/<profile_id>', methods=['GET'])
+@app.route('/api/profiles/<profile_id>/<file_name>', methods=['GET'])
+def download_profile(profile_id, file_name='summary.json'):
+    """Download one file of a stored profile (requires X-Profile-Token)"""
+    if not profile_store.authorized(request.headers):
+        return jsonify({'error': 'Profiling access requires a valid X-Profile-Token'}), 403
+    path = profile_store.path(profile_id, file_name)
+    if path is None:
+        return jsonify({'error': 'Profile not found'}), 404
+    return send_file(path, as_attachment=file_name.endswith('.prof'))
+
+@app.route('/api/live/start', methods=['POST'])
+def start_live_capture():
+    """Start live analysis of a FIFO or growing pcap inside LIVE_CAPTURE_DIR"""
+    data = request.get_json(silent=True) or {}
+    if not LIVE_CAPTURE_DIR:
+        return jsonify({'error': 'Live capture sources are not enabled (set LIVE_CAPTURE_DIR)'}), 403
+    source = resolve_source(str(data.get('source', '')), LIVE_CAPTURE_DIR)
+    if source is None:
+        return jsonify({'error': 'Capture source not found in LIVE_CAPTURE_DIR'}), 404
+    try:
+        window_seconds = float(data['window_seconds']) if data.get('window_seconds') else None
+    except (TypeError, ValueError):
+        return jsonify({'error': 'window_seconds must be a number'}), 400
+    with live_lock:
+        if live_capture is not None and live_capture.running:
+            return jsonify({'error': 'A live capture is already running'}), 409
+        capture = _start_live_capture(source, follow=bool(data.get('follow', True)), window_seconds=window_seconds)
+    return jsonify({'status': 'started', 'capture': capture.status()})
+
+@app.route('/api/live/stop', methods=['POST'])
+def stop_live_capture():
+    """Stop the running live capture; its summary stays available"""
+    with live_lock:
+        if live_capture is None or not live_capture.running:
+            return jsonify({'error': 'No live capture is running'}), 404
+        live_capture.stop(timeout=2)
+    return jsonify({'status': 'stopped', 'capture': live_capture.status()})
+
+@app.route('/api/live/summary', methods=['GET'])
+def live_capture_summary():
+    """Current window counters, recent windows with their anomalies, and active flows"""
+    if live_capture is None:
+        return jsonify({'error': 'No live capture has been started'}), 404
+    windows = request.args.get('windows', type=int)
+    return jsonify({'capture': live_capture.status(), **live_capture.analyzer.summary(windows)})
+
+@app.route('/api/uploads', methods=['GET'])
+def list_uploads():
+    """List stored captures and upload storage usage"""
+    return jsonify({
+        'uploads': upload_store.list(),
+        'storage': upload_store.get_stats()
     })
 
+@app.route('/api/uploads/<digest>', methods=['DELETE'])
+def release_upload(digest):
+    """Drop a reference to a stored capture, deleting it once unreferenced"""
+    if not upload_store.release(digest):
+        return jsonify({'error': 'Unknown capture'}), 404
+    return jsonify({'status': 'success'})
+
+@app.route('/api/uploads/<digest>/app-layer', methods=['GET'])
+def inspect_upload(digest):
+    """Decode DNS/TLS/HTTP details of one flow, host or service in a stored capture"""
+    src_ip = request.args.get('src_ip')
+    services = [name for name in request.args.get('service', '').split(',') if name]
+    try:
+        if src_ip:
+            select = flow_selector(src_ip, request.args.get('dst_ip'), request.args.get('src_port', type=int),
+                                   request.args.get('dst_port', type=int))
+        elif services:
+            select = service_selector(services)
+        else:
+            return jsonify({'error': 'Give src_ip (with optional dst_ip/src_port/dst_port) or service'}), 400
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    try:
+        with upload_store.checkout(digest) as path:
+            if not is_classic_pcap(path):
+                return jsonify({'error': 'Application-layer inspection needs a classic pcap capture'}), 415
+            return jsonify(inspect_capture(path, select,
+                                           max_packets_per_flow=request.args.get('max_packets', 200, type=int)))
+    except KeyError:
+        return jsonify({'error': 'Unknown capture'}), 404
+
 @app.route('/api/analyze-llm', methods=['POST'])
 def analyze_with_llm():
     """Deep analysis of network traffic using LLM"""
     data = request.json
-    packet_summary = data.get('packet_summary', [])
+    packet_summary = data.get('packet_summary', {})
     anomalies = data.get('anomalies', [])
     
     # Format input for LLM
     llm_input = format_llm_input(packet_summary, anomalies)
     
     # Get LLM analysis
-    llm_analysis = llm_engine.analyze(llm_input)
+    llm_analysis = llm_engine.analyze(llm_input, bypass_cache=bool(data.get('bypass_cache', False)))
     
     return jsonify({
         'analysis': llm_analysis,
@@ -158,13 +564,70 @@ def analyze_with_llm():
         'recommendations': llm_engine.generate_recommendations()
     })
 
+def _comprehensive_response(llm_analysis):
+    """Structure an LLM analysis into the /api/analyze-pcap response sections"""
+    text = llm_analysis['analysis']
+    # Analyses carry their parsed sections; results cached before that are parsed here
+    sections = llm_analysis.get('sections')
+    if sections is None:
+        sections = parse_analysis(text)['sections'] if text else {}
+    missing = "Not available" if 'section_errors' in llm_analysis else "Not found in analysis"
+    analysis = {key: sections.get(key, missing) for key in (
+        'traffic_overview', 'protocol_analysis', 'connection_patterns',
+        'security_assessment', 'contextual_interpretation')}
+    response = {
+        'analysis': analysis,
+        'full_analysis': text,
+        'alert_level': llm_analysis.get('alert_level', 'Unknown'),
+        'identified_threats': llm_analysis.get('identified_threats', []),
+        'recommendations': llm_analysis.get('recommendations', [])
+    }
+    if 'output_format' in llm_analysis:
+        response['output_format'] = llm_analysis['output_format']
+    if 'error' in llm_analysis:
+        response['error'] = llm_analysis['error']
+    if 'section_errors' in llm_analysis:
+        response['section_errors'] = llm_analysis['section_errors']
+        response['partial'] = llm_analysis['partial']
+    return response
+
+def _stream_comprehensive_analysis(events):
+    """Relay LLM tokens as SSE ``token`` events, then the structured ``result``"""
+    for event in events:
+        if event['type'] == 'token':
+            yield f"event: token\ndata: {json.dumps({'text': event['text']})}\n\n"
+        else:
+            result = sanitize_for_json(_comprehensive_response(event['result']))
+            yield f"event: result\ndata: {json.dumps(result)}\n\n"
+
 @app.route('/api/analyze-pcap', methods=['POST'])
 def analyze_pcap_comprehensive():
-    """Perform comprehensive PCAP analysis using the LLM"""
+    """Perform comprehensive PCAP analysis using the LLM
+
+    With ``"stream": true`` (or ``Accept: text/event-stream``) tokens are
+    relayed to the client over SSE as they are generated. With
+    ``"mode": "sections"`` each section is generated by its own focused
+    request, concurrently, and failed sections are reported individually.
+    ``"output_format": "json"`` asks the model for schema-constrained JSON.
+    Returns 503 with ``Retry-After`` when the LLM queue is full.
+    """
     data = request.json
     packet_summary = data.get('packet_summary', {})
     anomalies = data.get('anomalies', [])
     flow_data = data.get('flow_data', {})
+    bypass_cache = bool(data.get('bypass_cache', False))
+    output_format = data.get('output_format')
+    if output_format not in (None, 'text', 'json'):
+        return jsonify({'error': "output_format must be 'text' or 'json'"}), 400
+    section_timeout = data.get('section_timeout')
+    if section_timeout is not None:
+        try:
+            section_timeout = float(section_timeout)
+        except (TypeError, ValueError):
+            section_timeout = float('nan')
+        # NaN (including unparseable input) compares false to everything
+        if isinstance(data['section_timeout'], bool) or not 0 < section_timeout < float('inf'):
+            return jsonify({'error': 'section_timeout must be a positive number of seconds'}), 400
     
     # Format input for comprehensive LLM analysis
     llm_input = {
@@ -173,25 +636,27 @@ def analyze_pcap_comprehensive():
         'flow_data': flow_data
     }
     
-    # Get LLM analysis
-    llm_analysis = llm_engine.analyze(llm_input)
+    if data.get('mode') == 'sections':
+        llm_analysis = llm_engine.analyze_sections(
+            llm_input,
+            bypass_cache=bypass_cache,
+            section_timeout=section_timeout
+        )
+        return jsonify(sanitize_for_json(_comprehensive_response(llm_analysis)))
     
-    # Structure the response
-    response = {
-        'analysis': {
-            'traffic_overview': llm_engine.extract_section(llm_analysis['analysis'], "TRAFFIC OVERVIEW"),
-            'protocol_analysis': llm_engine.extract_section(llm_analysis['analysis'], "PROTOCOL ANALYSIS"),
-            'connection_patterns': llm_engine.extract_section(llm_analysis['analysis'], "CONNECTION PATTERNS"),
-            'security_assessment': llm_engine.extract_section(llm_analysis['analysis'], "SECURITY ASSESSMENT"),
-            'contextual_interpretation': llm_engine.extract_section(llm_analysis['analysis'], "CONTEXTUAL INTERPRETATION"),
-        },
-        'full_analysis': llm_analysis['analysis'],
-        'alert_level': llm_analysis['alert_level'],
-        'identified_threats': llm_analysis['identified_threats'],
-        'recommendations': llm_analysis['recommendations']
-    }
+    if data.get('stream') or request.accept_mimetypes.best == 'text/event-stream':
+        # Started here so a full queue is refused before the stream opens
+        events = llm_engine.analyze_stream(llm_input, bypass_cache=bypass_cache, output_format=output_format)
+        return Response(
+            stream_with_context(_stream_comprehensive_analysis(events)),
+            mimetype='text/event-stream',
+            headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+        )
+    
+    # Get LLM analysis
+    llm_analysis = llm_engine.analyze(llm_input, bypass_cache=bypass_cache, output_format=output_format)
     
-    return jsonify(response)
+    return jsonify(_comprehensive_response(llm_analysis))
 
 @app.route('/api/sample-analysis', methods=['GET'])
 def get_sample_analysis():
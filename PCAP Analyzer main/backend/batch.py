@@ -0,0 +1,200 @@
+import multiprocessing
+import os
+import tarfile
+import threading
+import zipfile
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Dict, Any, List, Optional, Callable
+
+from batch_worker import analyze_file, top_counts
+from metrics import QUEUE_DEPTH
+from storage import CAPTURE_EXTENSIONS
+
+ARCHIVE_EXTENSIONS = ('.zip', '.tar', '.tar.gz', '.tgz', '.tar.bz2', '.tbz2', '.tar.xz', '.txz')
+
+# Flows with the same 5-tuple in consecutive captures are stitched together
+# when the gap between them is at most this many seconds
+DEFAULT_STITCH_GAP = float(os.environ.get("BATCH_STITCH_GAP", "120"))
+
+# Limits on what archives in one batch upload may expand to
+BATCH_MAX_MEMBERS = int(os.environ.get("BATCH_MAX_MEMBERS", "500"))
+BATCH_MAX_EXPANDED_BYTES = int(float(os.environ.get("BATCH_MAX_EXPANDED_MB", "4096")) * 1024 * 1024)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor() -> ProcessPoolExecutor:
+    """Return the shared worker pool used for batch analysis"""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            max_workers = int(os.environ.get("BATCH_WORKERS", "0")) or os.cpu_count() or 1
+            # Spawn keeps workers independent of the web server's threads and
+            # PyShark's per-process event loop
+            _executor = ProcessPoolExecutor(max_workers=max_workers,
+                                            mp_context=multiprocessing.get_context('spawn'))
+        return _executor
+
+
+class ArchiveTooLarge(ValueError):
+    """Raised when archives expand to more captures or bytes than allowed"""
+
+
+class ExpansionBudget:
+    """Member count and uncompressed size allowed across the archives of one upload"""
+
+    def __init__(self, max_members=BATCH_MAX_MEMBERS, max_bytes=BATCH_MAX_EXPANDED_BYTES):
+        self.max_members = max_members
+        self.max_bytes = max_bytes
+        self.members = 0
+        self.bytes = 0
+
+    def charge(self, name: str, size: int):
+        """Account for one member before it is expanded, raising ``ArchiveTooLarge`` past a limit"""
+        self.members += 1
+        self.bytes += size
+        if self.members > self.max_members:
+            raise ArchiveTooLarge(f"Archives contain more than {self.max_members} captures")
+        if self.bytes > self.max_bytes:
+            raise ArchiveTooLarge(f"Archives expand to more than {self.max_bytes // (1024 * 1024)} MB "
+                                  f"(at {name})")
+
+
+def is_archive(filename: str) -> bool:
+    """Check whether an uploaded file name looks like a zip/tar archive"""
+    return filename.lower().endswith(ARCHIVE_EXTENSIONS)
+
+
+def iter_archive_captures(file_storage, filename: str, budget: Optional[ExpansionBudget] = None):
+    """Yield ``(name, fileobj)`` for each capture inside a zip or tar archive
+
+    Every member is charged to ``budget`` (a fresh one per archive by
+    default) from its declared size before it is read; zip and tar readers
+    never return more than that size.
+    """
+    budget = budget or ExpansionBudget()
+    stream = getattr(file_storage, 'stream', file_storage)
+    if filename.lower().endswith('.zip'):
+        with zipfile.ZipFile(stream) as archive:
+            for info in archive.infolist():
+                name = os.path.basename(info.filename)
+                if info.is_dir() or not name.lower().endswith(CAPTURE_EXTENSIONS):
+                    continue
+                budget.charge(name, info.file_size)
+                with archive.open(info) as member:
+                    yield name, member
+    else:
+        with tarfile.open(fileobj=stream, mode='r:*') as archive:
+            for info in archive:
+                name = os.path.basename(info.name)
+                if not info.isfile() or not name.lower().endswith(CAPTURE_EXTENSIONS):
+                    continue
+                budget.charge(name, info.size)
+                member = archive.extractfile(info)
+                if member is not None:
+                    yield name, member
+
+
+def stitch_flows(per_file_flows: List[List[Dict[str, Any]]], max_gap=DEFAULT_STITCH_GAP) -> List[Dict[str, Any]]:
+    """Merge flows that continue across capture rotation boundaries
+
+    Flows sharing a 5-tuple are joined when one starts within ``max_gap``
+    seconds of the previous one ending.
+    """
+    by_key = {}
+    for file_index, flows in enumerate(per_file_flows):
+        for flow in flows:
+            key = (flow['src_ip'], flow['src_port'], flow['dst_ip'], flow['dst_port'], flow['protocol'])
+            by_key.setdefault(key, []).append(dict(flow, files=[file_index]))
+
+    stitched = []
+    for segments in by_key.values():
+        segments.sort(key=lambda flow: flow['start_time'])
+        current = segments[0]
+        for segment in segments[1:]:
+            if segment['start_time'] - current['end_time'] <= max_gap:
+                current['packets'] += segment['packets']
+                current['bytes'] += segment['bytes']
+                current['end_time'] = max(current['end_time'], segment['end_time'])
+                current['files'] = sorted(set(current['files'] + segment['files']))
+            else:
+                stitched.append(current)
+                current = segment
+        stitched.append(current)
+
+    for flow in stitched:
+        flow['stitched'] = len(flow['files']) > 1
+    stitched.sort(key=lambda flow: flow['packets'], reverse=True)
+    return stitched
+
+
+def merge_results(file_results: List[Dict[str, Any]], max_gap=DEFAULT_STITCH_GAP) -> Dict[str, Any]:
+    """Build a combined summary across the successfully analyzed captures"""
+    ok = [r for r in file_results if r['result']['status'] == 'success']
+    # Order captures by time so stitching follows rotation order
+    ok.sort(key=lambda r: r['start_time'] if r['start_time'] is not None else float('inf'))
+
+    protocols, services = Counter(), Counter()
+    sources, destinations = Counter(), Counter()
+    for r in ok:
+        protocols.update(r['result']['summary']['protocols'])
+        services.update(r['result']['summary']['services'])
+        sources.update(r['sources'])
+        destinations.update(r['destinations'])
+
+    starts = [r['start_time'] for r in ok if r['start_time'] is not None]
+    ends = [r['end_time'] for r in ok if r['end_time'] is not None]
+    flows = stitch_flows([r['flows'] for r in ok], max_gap)
+    file_names = [r['result']['file_name'] for r in ok]
+    for flow in flows:
+        flow['files'] = [file_names[i] for i in flow['files']]
+
+    return {
+        'files': len(ok),
+        'total_packets': sum(r['result']['packet_count'] for r in ok),
+        'duration': (max(ends) - min(starts)) if starts and ends else 0,
+        'protocols': dict(protocols),
+        'services': dict(services),
+        'top_sources': top_counts(sources),
+        'top_destinations': top_counts(destinations),
+        'total_flows': len(flows),
+        'stitched_flows': sum(1 for flow in flows if flow['stitched']),
+        'top_flows': flows[:20],
+        'anomaly_count': sum(len(r['result']['anomalies']) for r in ok)
+    }
+
+
+def analyze_batch(captures: List[Dict[str, str]], progress: Optional[Callable] = None) -> Dict[str, Any]:
+    """Analyze captures in parallel across the worker pool
+
+    ``captures`` is a list of ``{'path', 'file_name'}`` dicts. Returns
+    per-file results (in input order) and the merged summary.
+    """
+    progress = progress or (lambda stage, **data: None)
+    executor = get_executor()
+    futures = {executor.submit(analyze_file, c['path'], c['file_name']): i for i, c in enumerate(captures)}
+    QUEUE_DEPTH.inc(len(futures), queue='batch')
+
+    file_results = [None] * len(captures)
+    for done, future in enumerate(as_completed(futures), start=1):
+        QUEUE_DEPTH.dec(queue='batch')
+        index = futures[future]
+        try:
+            file_results[index] = future.result()
+        except Exception as e:
+            print(f"Error analyzing {captures[index]['file_name']}: {e}")
+            file_results[index] = {'result': {'status': 'error',
+                                              'file_name': captures[index]['file_name'],
+                                              'error': str(e)}}
+        progress('file_done',
+                 file_name=captures[index]['file_name'],
+                 status=file_results[index]['result']['status'],
+                 files_done=done,
+                 files_total=len(captures))
+
+    return {
+        'results': [r['result'] for r in file_results],
+        'summary': merge_results(file_results)
+    }
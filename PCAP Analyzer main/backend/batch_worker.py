@@ -0,0 +1,71 @@
+from collections import Counter
+from typing import Dict, Any, List
+
+from packet_processing.endpoints import endpoints_of
+
+# Batch analysis entry point run inside worker processes. Spawned workers
+# import this module by name, so it must stay free of import-time side
+# effects: nothing is loaded until a worker first calls ``analyze_file``.
+_worker_state = {}
+
+
+def top_counts(counter: Counter, n=10) -> List[Dict[str, Any]]:
+    return [{'ip': ip, 'count': count} for ip, count in counter.most_common(n)]
+
+
+def analyze_file(file_path: str, file_name: str) -> Dict[str, Any]:
+    """Analyze one capture inside a worker process
+
+    Returns the per-file result in the same shape as ``/api/upload`` plus the
+    raw counters and full flow list needed to build the merged summary.
+    """
+    from models.anomaly_detector import AnomalyDetector
+    from packet_processing.packet_parser import PacketParser
+
+    # Each worker keeps its own detector; parsers are per file so their
+    # cumulative stats do not bleed between captures. Workers never write
+    # the shared model file: only the server process saves what it trains
+    if 'detector' not in _worker_state:
+        _worker_state['detector'] = AnomalyDetector(read_only=True)
+    detector = _worker_state['detector']
+    parser = PacketParser()
+
+    packet_data = parser.parse_pcap(file_path)
+    packet_stats = packet_data.stats
+    anomaly_results = detector.analyze(packet_data)
+
+    sources = Counter(p['src_ip'] for p in packet_data if 'src_ip' in p)
+    destinations = Counter(p['dst_ip'] for p in packet_data if 'dst_ip' in p)
+    # Endpoint IDs are per capture; results leave the worker keyed by address
+    endpoints = endpoints_of(packet_data)
+    if endpoints is not None:
+        sources = Counter(endpoints.restore_keys(sources))
+        destinations = Counter(endpoints.restore_keys(destinations))
+    timestamps = [p['timestamp'] for p in packet_data if 'timestamp' in p]
+    flows = parser._analyze_flows(packet_data, limit=None)
+
+    packet_summary = {
+        'total_packets': len(packet_data),
+        'duration': packet_stats.get('duration', 0),
+        'protocols': packet_stats.get('protocols', {}),
+        'services': packet_stats.get('services', {}),
+        'top_sources': top_counts(sources),
+        'top_destinations': top_counts(destinations)
+    }
+
+    return {
+        'result': {
+            'status': 'success',
+            'file_name': file_name,
+            'packet_count': len(packet_data),
+            'capture_duration': packet_stats.get('duration', 0),
+            'anomalies': anomaly_results['anomalies'],
+            'summary': packet_summary,
+            'flow_analysis': flows['top_flows'][:10]
+        },
+        'sources': dict(sources),
+        'destinations': dict(destinations),
+        'start_time': min(timestamps) if timestamps else None,
+        'end_time': max(timestamps) if timestamps else None,
+        'flows': flows['top_flows']
+    }
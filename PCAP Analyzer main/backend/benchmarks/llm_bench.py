@@ -0,0 +1,224 @@
+#!/usr/bin/env python3
+"""Benchmark the LLM path: throughput, tail latency, caching and concurrency.
+
+Drives ``LLMEngine`` the way the API does (response cache, scheduler,
+pooled session) against the bundled Ollama stand-in, so it runs offline and
+repeatably. Pass ``--api-base`` to measure a real Ollama server instead.
+
+Scenarios:
+  throughput   distinct prompts at increasing client concurrency
+  cache        the same prompts again, served from the response cache
+  coalescing   identical prompts sent at once, which should run once
+  streaming    time to first token through analyze_stream
+  backpressure a burst larger than the queue, counting fast rejections
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from benchmarks.ollama_stub import OllamaStub  # noqa: E402
+from benchmarks.prompt_budget_bench import synthetic_input  # noqa: E402
+from llm_cache import LLMResponseCache  # noqa: E402
+from llm_engine import LLMEngine  # noqa: E402
+from llm_scheduler import LLMScheduler, SchedulerBusy  # noqa: E402
+
+DEFAULT_CONCURRENCY = [1, 2, 4, 8]
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of a non-empty list"""
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, int(round(pct / 100 * len(ordered))) - 1))
+    return ordered[index]
+
+
+def summarize(name, latencies, elapsed, **extra):
+    return dict({
+        'scenario': name,
+        'requests': len(latencies),
+        'throughput_rps': len(latencies) / elapsed if elapsed else None,
+        'p50': percentile(latencies, 50) if latencies else None,
+        'p95': percentile(latencies, 95) if latencies else None,
+        'p99': percentile(latencies, 99) if latencies else None,
+        'max': max(latencies) if latencies else None,
+        'mean': statistics.mean(latencies) if latencies else None
+    }, **extra)
+
+
+def make_engine(api_base, model, workers, max_queue):
+    engine = LLMEngine(model_name=model, cache=LLMResponseCache(memory_entries=4096),
+                       scheduler=LLMScheduler(workers=workers, max_queue=max_queue))
+    engine.api_base = api_base
+    engine.start_health_monitor(interval=60).check_now()
+    return engine
+
+
+def inputs(count, offset=0):
+    """Distinct LLM inputs, so prompts (and cache keys) differ"""
+    result = []
+    for i in range(count):
+        data = synthetic_input(anomalies=20, flows=5, services=10, seed=offset + i)
+        data['packet_summary']['total_packets'] = 1000 + offset + i
+        result.append(data)
+    return result
+
+
+def timed_calls(fn, items, concurrency):
+    """Call ``fn`` on each item with ``concurrency`` client threads"""
+    latencies, errors = [], []
+    lock = threading.Lock()
+
+    def call(item):
+        started = time.perf_counter()
+        try:
+            result = fn(item)
+        except Exception as e:
+            with lock:
+                errors.append(type(e).__name__)
+            return
+        elapsed = time.perf_counter() - started
+        with lock:
+            if isinstance(result, dict) and result.get('error'):
+                errors.append(result['error'])
+            else:
+                latencies.append(elapsed)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(call, items))
+    return latencies, errors, time.perf_counter() - started
+
+
+def generations(stub):
+    return stub.get_stats()['generate'] if stub else None
+
+
+def run(api_base, model, requests_per_level, concurrency_levels, workers, max_queue, stub=None):
+    results = []
+    offset = 0
+
+    for concurrency in concurrency_levels:
+        engine = make_engine(api_base, model, workers, max_queue)
+        items = inputs(requests_per_level, offset)
+        offset += requests_per_level
+        latencies, errors, elapsed = timed_calls(
+            lambda data: engine.analyze(data, bypass_cache=True), items, concurrency)
+        results.append(summarize('throughput', latencies, elapsed, concurrency=concurrency,
+                                 workers=workers, errors=len(errors)))
+
+        if concurrency == concurrency_levels[-1]:
+            # Same prompts again: every request should be a cache hit
+            before = generations(stub)
+            latencies, errors, elapsed = timed_calls(engine.analyze, items, concurrency)
+            hits = engine.cache.get_stats()
+            results.append(summarize('cache', latencies, elapsed, concurrency=concurrency, errors=len(errors),
+                                     memory_hits=hits['memory_hits'],
+                                     generations=generations(stub) - before if stub else None))
+
+    # Identical concurrent requests should share one generation
+    engine = make_engine(api_base, model, workers, max_queue)
+    identical = inputs(1, offset)[0]
+    offset += 1
+    callers = max(concurrency_levels)
+    before = generations(stub)
+    latencies, errors, elapsed = timed_calls(
+        lambda data: engine.analyze(data, bypass_cache=True), [identical] * callers, callers)
+    results.append(summarize('coalescing', latencies, elapsed, concurrency=callers, errors=len(errors),
+                             coalesced=engine.scheduler.get_stats()['coalesced'],
+                             generations=generations(stub) - before if stub else None))
+
+    # Time to first token over the streaming path
+    ttfts, totals = [], []
+    for data in inputs(min(requests_per_level, 10), offset):
+        started = time.perf_counter()
+        first = None
+        for event in engine.analyze_stream(data, bypass_cache=True):
+            if event['type'] == 'token' and first is None:
+                first = time.perf_counter() - started
+        totals.append(time.perf_counter() - started)
+        if first is not None:
+            ttfts.append(first)
+    offset += min(requests_per_level, 10)
+    results.append(summarize('streaming', totals, sum(totals), concurrency=1,
+                             ttft_p50=percentile(ttfts, 50) if ttfts else None,
+                             ttft_p95=percentile(ttfts, 95) if ttfts else None))
+
+    # A burst beyond workers + queue should be rejected immediately, not block
+    engine = make_engine(api_base, model, workers, max_queue)
+    burst = workers + max_queue + callers
+    rejected = []
+
+    def submit(data):
+        started = time.perf_counter()
+        try:
+            return engine.analyze(data, bypass_cache=True)
+        except SchedulerBusy as e:
+            rejected.append((time.perf_counter() - started, e.retry_after))
+            raise
+
+    latencies, errors, elapsed = timed_calls(submit, inputs(burst, offset), burst)
+    results.append(summarize('backpressure', latencies, elapsed, concurrency=burst, errors=len(errors),
+                             rejected=len(rejected),
+                             reject_max_seconds=max((r[0] for r in rejected), default=None),
+                             retry_after_max=max((r[1] for r in rejected), default=None)))
+    return results
+
+
+def _fmt(value, digits=3):
+    if value is None:
+        return "-"
+    return f"{value:.{digits}f}" if isinstance(value, float) else str(value)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--api-base', help="Benchmark this Ollama server instead of the bundled stand-in")
+    parser.add_argument('--model', default=os.environ.get("LLM_MODEL", "mistral"))
+    parser.add_argument('--requests', type=int, default=32, help="Requests per concurrency level")
+    parser.add_argument('--concurrency', type=int, nargs='+', default=DEFAULT_CONCURRENCY)
+    parser.add_argument('--workers', type=int, default=2, help="Scheduler workers (LLM_WORKERS)")
+    parser.add_argument('--queue-size', type=int, default=16, help="Scheduler queue size (LLM_QUEUE_SIZE)")
+    parser.add_argument('--latency', type=float, default=0.05, help="Stand-in: seconds before the first token")
+    parser.add_argument('--tokens-per-second', type=float, default=400.0, help="Stand-in: generation speed")
+    parser.add_argument('--parallel', type=int, default=2, help="Stand-in: concurrent generations")
+    parser.add_argument('--failure-rate', type=float, default=0.0, help="Stand-in: fraction of HTTP 500s")
+    parser.add_argument('--json', help="Write results to this file")
+    args = parser.parse_args()
+
+    stub = None
+    api_base = args.api_base
+    if api_base is None:
+        stub = OllamaStub(models=[args.model if ':' in args.model else f"{args.model}:latest"],
+                          latency=args.latency, tokens_per_second=args.tokens_per_second,
+                          parallel=args.parallel, failure_rate=args.failure_rate, seed=1).start()
+        api_base = stub.url
+
+    try:
+        results = run(api_base, args.model, args.requests, sorted(args.concurrency),
+                      args.workers, args.queue_size, stub)
+    finally:
+        if stub:
+            stub.stop()
+
+    print(f"{'scenario':<13} {'conc':>5} {'reqs':>5} {'req/s':>8} {'p50 s':>7} {'p95 s':>7} "
+          f"{'p99 s':>7} {'max s':>7} {'err':>4}  notes")
+    for r in results:
+        notes = ", ".join(f"{k}={_fmt(r[k])}" for k in ('memory_hits', 'coalesced', 'generations', 'ttft_p50',
+                                                         'ttft_p95', 'rejected', 'reject_max_seconds',
+                                                         'retry_after_max') if r.get(k) is not None)
+        print(f"{r['scenario']:<13} {r['concurrency']:>5} {r['requests']:>5} {_fmt(r['throughput_rps'], 1):>8} "
+              f"{_fmt(r['p50']):>7} {_fmt(r['p95']):>7} {_fmt(r['p99']):>7} {_fmt(r['max']):>7} "
+              f"{r.get('errors', 0):>4}  {notes}")
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
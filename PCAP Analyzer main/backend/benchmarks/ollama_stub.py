@@ -0,0 +1,247 @@
+#!/usr/bin/env python3
+"""Local stand-in for the Ollama API, for exercising the LLM path without a model.
+
+Implements /api/tags, /api/ps and /api/generate (streaming and
+non-streaming) with configurable first-token latency, generation speed,
+parallel slots and injected failures. Generated text is a canned analysis
+in the usual section layout, or a JSON object when the request sets
+``format``. Request counters are served at /_stub/stats.
+
+Run standalone (``python benchmarks/ollama_stub.py --port 11434``) and point
+LLM_API_BASE at it, or start it in-process with ``OllamaStub(...).start()``.
+"""
+import argparse
+import json
+import random
+import threading
+import time
+from datetime import datetime, timezone
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+ANALYSIS_TEXT = """## TRAFFIC OVERVIEW
+The capture is dominated by TCP sessions to web services with a steady background of DNS lookups from internal hosts.
+
+## PROTOCOL ANALYSIS
+TCP carries most bytes, mainly HTTPS on port 443. UDP is almost entirely DNS with a normal query to response ratio.
+
+## CONNECTION PATTERNS
+A handful of workstations account for most connections. One host contacts many destination ports in a short window.
+
+## SECURITY ASSESSMENT
+The burst of connections across sequential ports from a single source is consistent with a port scan. Alert level: Medium.
+
+## CONTEXTUAL INTERPRETATION
+This looks like an office network during working hours with one host performing reconnaissance.
+
+## RECOMMENDATIONS
+- Investigate the scanning host and confirm whether the activity was authorized
+- Restrict outbound connections to non-standard ports
+- Review DNS logs for unusual query volume"""
+
+ANALYSIS_JSON = {
+    "traffic_overview": "Mostly TCP web sessions with background DNS lookups.",
+    "protocol_analysis": "HTTPS dominates TCP; UDP is almost entirely DNS.",
+    "connection_patterns": "One host contacts many destination ports in a short window.",
+    "security_assessment": "Sequential port connections from one source indicate a port scan.",
+    "contextual_interpretation": "An office network with one host performing reconnaissance.",
+    "alert_level": "Medium",
+    "identified_threats": ["Port Scan"],
+    "recommendations": ["Investigate the scanning host", "Restrict outbound connections to non-standard ports"]
+}
+
+
+class OllamaStub:
+    """Threaded HTTP server emulating the parts of Ollama the backend uses.
+
+    ``parallel`` mirrors OLLAMA_NUM_PARALLEL: generations beyond it wait for
+    a slot, as they would on a real server. ``failure_rate`` answers that
+    fraction of generations with HTTP 500 and ``disconnect_rate`` drops the
+    connection without a response.
+    """
+
+    def __init__(self, host="127.0.0.1", port=0, models=("mistral:latest", "qwen2:0.5b"),
+                 latency=0.05, tokens_per_second=200.0, parallel=1, failure_rate=0.0,
+                 disconnect_rate=0.0, seed=None):
+        self.models = list(models)
+        self.latency = latency
+        self.tokens_per_second = tokens_per_second
+        self.failure_rate = failure_rate
+        self.disconnect_rate = disconnect_rate
+        self.random = random.Random(seed)
+        self.slots = threading.Semaphore(parallel)
+        self.lock = threading.Lock()
+        self.stats = {'generate': 0, 'stream': 0, 'failed': 0, 'disconnected': 0,
+                      'in_flight': 0, 'max_in_flight': 0, 'tokens': 0}
+        self.server = ThreadingHTTPServer((host, port), self._handler())
+        self.server.daemon_threads = True
+        self.thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> 'OllamaStub':
+        self.thread = threading.Thread(target=self.server.serve_forever, name="ollama-stub", daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def get_stats(self):
+        with self.lock:
+            return dict(self.stats)
+
+    def _count(self, key, amount=1):
+        with self.lock:
+            self.stats[key] += amount
+
+    def _roll(self, rate) -> bool:
+        with self.lock:
+            return rate > 0 and self.random.random() < rate
+
+    def _handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def _send_json(self, status, body):
+                data = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_GET(self):
+                if self.path == '/api/tags':
+                    self._send_json(200, {'models': [{'name': name, 'model': name} for name in stub.models]})
+                elif self.path == '/api/ps':
+                    self._send_json(200, {'models': [{'name': name, 'model': name} for name in stub.models[:1]]})
+                elif self.path == '/api/version':
+                    self._send_json(200, {'version': 'stub'})
+                elif self.path == '/_stub/stats':
+                    self._send_json(200, stub.get_stats())
+                else:
+                    self._send_json(404, {'error': 'not found'})
+
+            def do_POST(self):
+                length = int(self.headers.get('Content-Length', 0))
+                try:
+                    request = json.loads(self.rfile.read(length) or b'{}')
+                except ValueError:
+                    self._send_json(400, {'error': 'invalid JSON'})
+                    return
+                if self.path != '/api/generate':
+                    self._send_json(404, {'error': 'not found'})
+                    return
+                if request.get('model') not in stub.models and f"{request.get('model')}:latest" not in stub.models:
+                    self._send_json(404, {'error': f"model '{request.get('model')}' not found"})
+                    return
+
+                stub._count('generate')
+                if stub._roll(stub.disconnect_rate):
+                    stub._count('disconnected')
+                    self.close_connection = True
+                    self.connection.close()
+                    return
+                if stub._roll(stub.failure_rate):
+                    stub._count('failed')
+                    self._send_json(500, {'error': 'injected failure'})
+                    return
+
+                with stub.slots:
+                    with stub.lock:
+                        stub.stats['in_flight'] += 1
+                        stub.stats['max_in_flight'] = max(stub.stats['max_in_flight'], stub.stats['in_flight'])
+                    try:
+                        self._generate(request)
+                    finally:
+                        stub._count('in_flight', -1)
+
+            def _generate(self, request):
+                started = time.perf_counter()
+                if request.get('format'):
+                    tokens = [json.dumps(ANALYSIS_JSON)]
+                else:
+                    tokens = [word + ' ' for word in ANALYSIS_TEXT.split(' ')]
+                limit = (request.get('options') or {}).get('num_predict')
+                if limit and limit > 0:
+                    tokens = tokens[:limit]
+                per_token = 1.0 / stub.tokens_per_second if stub.tokens_per_second > 0 else 0.0
+                prompt_tokens = len(request.get('prompt', '')) // 4
+                time.sleep(stub.latency)
+                prompt_done = time.perf_counter()
+
+                def final(**extra):
+                    now = time.perf_counter()
+                    return dict({
+                        'model': request['model'],
+                        'created_at': datetime.now(timezone.utc).isoformat(),
+                        'done': True,
+                        'done_reason': 'stop',
+                        'total_duration': int((now - started) * 1e9),
+                        'load_duration': 0,
+                        'prompt_eval_count': prompt_tokens,
+                        'prompt_eval_duration': int((prompt_done - started) * 1e9),
+                        'eval_count': len(tokens),
+                        'eval_duration': int((now - prompt_done) * 1e9)
+                    }, **extra)
+
+                stub._count('tokens', len(tokens))
+                if not request.get('stream', True):
+                    time.sleep(per_token * len(tokens))
+                    self._send_json(200, final(response=''.join(tokens)))
+                    return
+
+                stub._count('stream')
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/x-ndjson')
+                self.send_header('Transfer-Encoding', 'chunked')
+                self.end_headers()
+                for token in tokens:
+                    time.sleep(per_token)
+                    self._write_chunk({'model': request['model'], 'response': token, 'done': False})
+                self._write_chunk(final(response=''))
+                self.wfile.write(b"0\r\n\r\n")
+
+            def _write_chunk(self, body):
+                data = (json.dumps(body) + "\n").encode()
+                self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+                self.wfile.flush()
+
+        return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--host', default="127.0.0.1")
+    parser.add_argument('--port', type=int, default=11434)
+    parser.add_argument('--models', nargs='+', default=["mistral:latest", "qwen2:0.5b"])
+    parser.add_argument('--latency', type=float, default=0.05, help="Seconds before the first token")
+    parser.add_argument('--tokens-per-second', type=float, default=200.0)
+    parser.add_argument('--parallel', type=int, default=1, help="Concurrent generations, like OLLAMA_NUM_PARALLEL")
+    parser.add_argument('--failure-rate', type=float, default=0.0, help="Fraction of generations answered with HTTP 500")
+    parser.add_argument('--disconnect-rate', type=float, default=0.0, help="Fraction of generations dropped without a response")
+    parser.add_argument('--seed', type=int)
+    args = parser.parse_args()
+
+    stub = OllamaStub(args.host, args.port, args.models, args.latency, args.tokens_per_second,
+                      args.parallel, args.failure_rate, args.disconnect_rate, args.seed)
+    print(f"Ollama stub listening on {stub.url}")
+    try:
+        stub.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stub.server.server_close()
+
+
+if __name__ == '__main__':
+    main()
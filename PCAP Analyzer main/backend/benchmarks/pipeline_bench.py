@@ -0,0 +1,231 @@
+#!/usr/bin/env python3
+"""Benchmark the analysis pipeline stage by stage on synthetic captures.
+
+For each capture size a synthetic pcap is generated (see synth_pcap.py),
+then each stage is timed while peak memory is tracked:
+
+  parse     PacketParser.parse_pcap (needs TShark; otherwise skipped and the
+            generator's own packet records feed the later stages)
+  flows     PacketParser._analyze_flows over all flows
+  features  PacketParser.extract_features
+  train     AnomalyDetector.train on the extracted features
+  detect    AnomalyDetector.analyze
+
+Results are written as JSON, by default under ``benchmarks/results/``,
+which is git-ignored. Given ``--baseline`` (an earlier results file),
+stages that got slower or bigger than ``--threshold`` are flagged and the
+exit status is 1, so the benchmark can gate CI.
+
+No baseline is committed: timings only compare on the same machine. To
+produce one, run the benchmark on the reference revision first::
+
+    git checkout main
+    python benchmarks/pipeline_bench.py --output benchmarks/results/baseline.json
+    git checkout -
+    python benchmarks/pipeline_bench.py --baseline benchmarks/results/baseline.json
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timezone
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from benchmarks.synth_pcap import generate_pcap, parse_mix, DEFAULT_MIX  # noqa: E402
+from metrics import current_rss_bytes  # noqa: E402
+
+DEFAULT_SIZES = [10000, 100000]
+# Differences below these are noise, whatever the percentage
+MIN_SECONDS_DELTA = 0.05
+MIN_BYTES_DELTA = 16 * 1024 * 1024
+# Default location of results files; ignored by git (see backend/.gitignore)
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'results')
+
+
+class PeakMemory:
+    """Poll RSS in a background thread and report the peak inside a block"""
+
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self.peak = 0
+        self.start_rss = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _poll(self):
+        while not self._stop.is_set():
+            self.peak = max(self.peak, current_rss_bytes() or 0)
+            self._stop.wait(self.interval)
+
+    def __enter__(self):
+        self.start_rss = current_rss_bytes() or 0
+        self.peak = self.start_rss
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._poll, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, current_rss_bytes() or 0)
+
+
+def timed_stage(stages, name, packets, fn):
+    """Run one stage, recording wall time, peak RSS and RSS growth"""
+    with PeakMemory() as memory:
+        started = time.perf_counter()
+        result = fn()
+        seconds = time.perf_counter() - started
+    stages[name] = {
+        'seconds': seconds,
+        'packets_per_sec': packets / seconds if seconds else None,
+        'peak_rss_bytes': memory.peak,
+        'rss_growth_bytes': memory.peak - memory.start_rss
+    }
+    return result
+
+
+def run_size(packets, workdir, hosts, mix, anomaly_rate, seed, parse):
+    from models.anomaly_detector import AnomalyDetector
+    from packet_processing.endpoints import intern_packets
+    from packet_processing.packet_parser import PacketParser
+
+    path = os.path.join(workdir, f"synthetic-{packets}-{seed}.pcap")
+    parser = PacketParser()
+    parse = parse and parser.tshark_available
+    capture = generate_pcap(path, packets, hosts, mix, anomaly_rate, seed=seed, records=not parse)
+    stages = {}
+
+    if parse:
+        packet_data = timed_stage(stages, 'parse', packets, lambda: parser.parse_pcap(path))
+    else:
+        # Interned like parse_pcap's output, so later stages see endpoint IDs
+        packet_data = intern_packets(capture.pop('records'))
+    timed_stage(stages, 'flows', packets, lambda: parser._analyze_flows(packet_data, limit=None))
+    features = timed_stage(stages, 'features', packets, lambda: parser.extract_features(packet_data))
+
+    # Train into a scratch location so the shipped model is left untouched
+    detector = AnomalyDetector()
+    detector.model = None
+    detector.model_path = os.path.join(workdir, 'isolation_forest.joblib')
+    timed_stage(stages, 'train', packets, lambda: detector.train(features))
+    detection = timed_stage(stages, 'detect', packets, lambda: detector.analyze(packet_data))
+
+    return {
+        'packets': packets,
+        'file_bytes': os.path.getsize(path),
+        'wire_bytes': capture['bytes'],
+        'parsed_with': 'tshark' if parse else 'generator records (TShark unavailable or --no-parse)',
+        'injected_anomalies': capture['injected_anomalies'],
+        'detected_anomalies': len(detection['anomalies']),
+        'generate_seconds': capture['generate_seconds'],
+        'stages': stages
+    }
+
+
+def environment():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {
+        'timestamp': datetime.now(timezone.utc).isoformat(),
+        'commit': commit,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'tshark': shutil.which('tshark') is not None
+    }
+
+
+def compare(results, baseline, threshold):
+    """List stages whose time or peak memory regressed beyond ``threshold``"""
+    previous = {(run['packets'], stage): values
+                for run in baseline.get('runs', []) for stage, values in run['stages'].items()}
+    regressions = []
+    for run in results['runs']:
+        for stage, values in run['stages'].items():
+            old = previous.get((run['packets'], stage))
+            if old is None:
+                continue
+            for key, min_delta in (('seconds', MIN_SECONDS_DELTA), ('peak_rss_bytes', MIN_BYTES_DELTA)):
+                delta = values[key] - old[key]
+                change = delta / old[key] if old[key] else 0.0
+                values[f'{key}_change'] = change
+                if change > threshold and delta > min_delta:
+                    regressions.append({'packets': run['packets'], 'stage': stage, 'metric': key,
+                                        'baseline': old[key], 'current': values[key], 'change': change})
+    return regressions
+
+
+def print_table(results):
+    print(f"{'packets':>10} {'stage':<9} {'seconds':>9} {'pkts/s':>11} {'peak MB':>9} {'growth MB':>10} {'vs base':>8}")
+    for run in results['runs']:
+        for stage, values in run['stages'].items():
+            change = values.get('seconds_change')
+            print(f"{run['packets']:>10} {stage:<9} {values['seconds']:>9.3f} "
+                  f"{values['packets_per_sec'] or 0:>11.0f} {values['peak_rss_bytes'] / 2 ** 20:>9.1f} "
+                  f"{values['rss_growth_bytes'] / 2 ** 20:>10.1f} "
+                  f"{(f'{change:+.0%}' if change is not None else '-'):>8}")
+        print(f"{'':>10} injected {sum(run['injected_anomalies'].values())} anomalies, "
+              f"detected {run['detected_anomalies']} ({run['parsed_with']})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--packets', type=int, nargs='+', default=DEFAULT_SIZES,
+                        help="Capture sizes to benchmark (e.g. 10000 100000 1000000)")
+    parser.add_argument('--hosts', type=int, default=50)
+    parser.add_argument('--mix', type=parse_mix, default=DEFAULT_MIX, help="e.g. tcp=0.7,udp=0.25,icmp=0.05")
+    parser.add_argument('--anomaly-rate', type=float, default=0.01)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--no-parse', action='store_true', help="Skip TShark parsing and feed generator records")
+    parser.add_argument('--workdir', help="Where captures are written (default: a temporary directory)")
+    parser.add_argument('--output', help="Results file (default: benchmarks/results/pipeline-<time>.json, "
+                                         "git-ignored)")
+    parser.add_argument('--baseline', help="Earlier results file to compare against")
+    parser.add_argument('--threshold', type=float, default=0.2, help="Allowed slowdown/growth before flagging")
+    args = parser.parse_args()
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix="pcap-bench-")
+    os.makedirs(workdir, exist_ok=True)
+    results = {'environment': environment(), 'runs': []}
+    try:
+        for packets in sorted(args.packets):
+            print(f"Benchmarking {packets} packets...", file=sys.stderr)
+            results['runs'].append(run_size(packets, workdir, args.hosts, args.mix, args.anomaly_rate,
+                                            args.seed, not args.no_parse))
+    finally:
+        if not args.workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    regressions = []
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.threshold)
+        results['baseline'] = args.baseline
+        results['regressions'] = regressions
+
+    output = args.output or os.path.join(RESULTS_DIR, f"pipeline-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    os.makedirs(os.path.dirname(output) or '.', exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(results, f, indent=2)
+
+    print_table(results)
+    print(f"Results written to {output}")
+    for r in regressions:
+        print(f"REGRESSION: {r['stage']} at {r['packets']} packets, {r['metric']} "
+              f"{r['baseline']:.3f} -> {r['current']:.3f} ({r['change']:+.0%})")
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""Measure LLM latency against prompt size under different token budgets.
+
+Builds prompts from a large synthetic capture summary at several token
+budgets and times /api/generate for each against an Ollama-compatible
+server, reporting estimated prompt tokens next to the observed latency.
+With ``--stub`` it runs against the bundled Ollama stand-in instead.
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import time
+
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from benchmarks.ollama_stub import OllamaStub  # noqa: E402
+from models.model_registry import ModelConfigRegistry  # noqa: E402
+from prompt_builder import PromptBuilder  # noqa: E402
+
+DEFAULT_BUDGETS = [256, 512, 1024, 2048, 4096]
+
+
+def synthetic_input(anomalies=200, flows=20, services=60, seed=7):
+    """Build an LLM input resembling a busy capture"""
+    rng = random.Random(seed)
+    hosts = [f"10.0.{i // 256}.{i % 256}" for i in range(50)]
+    return {
+        'packet_summary': {
+            'total_packets': 250000,
+            'duration': 900.0,
+            'protocols': {'TCP': 180000, 'UDP': 65000, 'ICMP': 5000},
+            'services': {f"service-{i}": rng.randint(1, 5000) for i in range(services)},
+            'top_sources': [{'ip': h, 'count': rng.randint(100, 10000)} for h in hosts[:10]],
+            'top_destinations': [{'ip': h, 'count': rng.randint(100, 10000)} for h in hosts[10:20]]
+        },
+        'anomalies': [{
+            'src_ip': rng.choice(hosts), 'dst_ip': rng.choice(hosts),
+            'protocol': rng.choice(['TCP', 'UDP']), 'anomaly_score': -rng.random() / 5
+        } for _ in range(anomalies)],
+        'flow_data': {'top_flows': [{
+            'src_ip': rng.choice(hosts), 'src_port': rng.randint(1024, 65535),
+            'dst_ip': rng.choice(hosts), 'dst_port': rng.choice([53, 80, 443, 8080]),
+            'protocol': 'TCP', 'packets': rng.randint(10, 10000), 'bytes': rng.randint(1000, 10 ** 7)
+        } for _ in range(flows)]}
+    }
+
+
+def run(api_base, model, budgets, repeats, timeout):
+    registry = ModelConfigRegistry()
+    builder = PromptBuilder()
+    input_data = synthetic_input()
+    session = requests.Session()
+    results = []
+
+    for budget in budgets:
+        built = builder.build(input_data, budget=budget)
+        request_data = registry.build_request(model, built['prompt'])
+        latencies, prompt_eval = [], []
+        for _ in range(repeats):
+            started = time.perf_counter()
+            response = session.post(f"{api_base}/api/generate", json=request_data, timeout=timeout)
+            response.raise_for_status()
+            latencies.append(time.perf_counter() - started)
+            body = response.json()
+            if 'prompt_eval_duration' in body:
+                prompt_eval.append(body['prompt_eval_duration'] / 1e9)
+        results.append({
+            'budget': budget,
+            'estimated_tokens': built['estimated_tokens'],
+            'level': built['level'],
+            'latency_median': statistics.median(latencies),
+            'latency_max': max(latencies),
+            'prompt_eval_median': statistics.median(prompt_eval) if prompt_eval else None
+        })
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--api-base', default=os.environ.get("LLM_API_BASE", "http://localhost:11434"))
+    parser.add_argument('--model', default=os.environ.get("LLM_MODEL", "qwen2:0.5b"))
+    parser.add_argument('--budgets', type=int, nargs='+', default=DEFAULT_BUDGETS)
+    parser.add_argument('--repeats', type=int, default=3)
+    parser.add_argument('--timeout', type=float, default=300)
+    parser.add_argument('--stub', action='store_true', help="Run against the bundled Ollama stand-in")
+    parser.add_argument('--json', help="Write results to this file")
+    args = parser.parse_args()
+
+    stub = None
+    api_base = args.api_base
+    if args.stub:
+        stub = OllamaStub(models=[args.model]).start()
+        api_base = stub.url
+    try:
+        results = run(api_base, args.model, args.budgets, args.repeats, args.timeout)
+    finally:
+        if stub:
+            stub.stop()
+
+    print(f"{'budget':>8} {'est. tokens':>12} {'level':>6} {'median s':>10} {'max s':>8} {'prompt eval s':>14}")
+    for r in results:
+        prompt_eval = f"{r['prompt_eval_median']:.3f}" if r['prompt_eval_median'] is not None else "-"
+        print(f"{r['budget']:>8} {r['estimated_tokens']:>12} {r['level']:>6} "
+              f"{r['latency_median']:>10.3f} {r['latency_max']:>8.3f} {prompt_eval:>14}")
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,271 @@
+#!/usr/bin/env python3
+"""Generate synthetic pcap captures with known traffic and injected anomalies.
+
+Writes a valid libpcap file (Ethernet/IPv4 with TCP, UDP and ICMP) of any
+size from a few thousand to tens of millions of packets. Background traffic
+is a skewed mix of flows between ``hosts`` internal hosts and a set of
+external servers. On top of that, bursts of known anomalies are injected:
+port scans, a large outbound transfer to an unusual port, DNS tunnelling
+and a SYN flood. The counts that were injected are returned so results can
+be checked against ground truth.
+
+Frames are truncated to ``snaplen`` bytes, while the original length is
+kept in the record header. This keeps multi-million packet files at a
+manageable size. IP and transport checksums are left zero; Wireshark does
+not validate them by default.
+"""
+import argparse
+import base64
+import json
+import random
+import socket
+import struct
+import time
+
+PCAP_GLOBAL_HEADER = struct.pack('<IHHiIII', 0xa1b2c3d4, 2, 4, 0, 0, 65535, 1)  # LINKTYPE_ETHERNET
+RECORD_HEADER = struct.Struct('<IIII')
+ETHERNET = struct.pack('!6s6sH', b'\x02\x00\x00\x00\x00\x02', b'\x02\x00\x00\x00\x00\x01', 0x0800)
+IPV4 = struct.Struct('!BBHHHBBH4s4s')
+TCP = struct.Struct('!HHIIBBHHH')
+UDP = struct.Struct('!HHHH')
+ICMP = struct.Struct('!BBHHH')
+DNS_HEADER = struct.Struct('!HHHHHH')
+
+PROTO_NUMBERS = {'TCP': 6, 'UDP': 17, 'ICMP': 1}
+TCP_SERVICES = [(443, 0.55), (80, 0.25), (22, 0.1), (8080, 0.05), (3389, 0.05)]
+UDP_SERVICES = [(53, 0.7), (123, 0.2), (67, 0.1)]
+SYN, ACK, PSH, RST = 0x02, 0x10, 0x08, 0x04
+
+DEFAULT_MIX = {'TCP': 0.7, 'UDP': 0.25, 'ICMP': 0.05}
+ANOMALY_KINDS = ('port_scan', 'exfiltration', 'dns_tunnel', 'syn_flood')
+DOMAINS = ["example.com", "updates.example.net", "cdn.example.org", "mail.example.com", "api.example.io"]
+
+SCANNER_IP = "203.0.113.66"
+EXFIL_IP = "198.51.100.23"
+TUNNEL_DOMAIN = "t.example-tunnel.net"
+
+_ZEROS = bytes(65535)
+
+
+def _weighted(pairs, rng):
+    value, cumulative = rng.random(), 0.0
+    for item, weight in pairs:
+        cumulative += weight
+        if value < cumulative:
+            return item
+    return pairs[-1][0]
+
+
+def _dns_query(name: str, ident: int) -> bytes:
+    labels = b''.join(bytes([len(part)]) + part.encode() for part in name.split('.'))
+    return DNS_HEADER.pack(ident, 0x0100, 1, 0, 0, 0) + labels + b'\x00' + struct.pack('!HH', 1, 1)
+
+
+class SyntheticCapture:
+    """Deterministic packet source for one synthetic capture"""
+
+    def __init__(self, packets=10000, hosts=50, protocol_mix=None, anomaly_rate=0.01,
+                 anomaly_kinds=ANOMALY_KINDS, duration=600.0, start_time=1700000000.0, seed=0):
+        self.packets = packets
+        self.rng = random.Random(seed)
+        self.duration = duration
+        self.start_time = start_time
+        mix = protocol_mix or DEFAULT_MIX
+        total = sum(mix.values())
+        self.mix = [(proto.upper(), weight / total) for proto, weight in mix.items()]
+
+        self.internal = [f"10.0.{i // 250}.{i % 250 + 1}" for i in range(max(1, hosts))]
+        self.external = [f"93.184.{i // 250}.{i % 250 + 1}" for i in range(max(4, hosts // 2))] + ["8.8.8.8", "1.1.1.1"]
+        self.flows = [self._new_flow() for _ in range(max(8, hosts * 4))]
+
+        # Each anomaly kind is a burst inside its own window of packet indices
+        self.anomalies = {}
+        kinds = list(anomaly_kinds)
+        per_kind = int(packets * anomaly_rate) // len(kinds) if kinds else 0
+        for kind in kinds:
+            if per_kind <= 0:
+                continue
+            window = min(packets, per_kind * 4)
+            start = self.rng.randrange(0, packets - window + 1)
+            self.anomalies[kind] = {'start': start, 'end': start + window, 'remaining': per_kind, 'sent': 0}
+        self.victim = self.internal[0]
+        self.web_server = self.internal[-1]
+        self.scan_port = 1
+
+    def _new_flow(self):
+        proto = _weighted(self.mix, self.rng)
+        client = self.rng.choice(self.internal)
+        server = self.rng.choice(self.external + self.internal)
+        if proto == 'TCP':
+            dport = _weighted(TCP_SERVICES, self.rng)
+        elif proto == 'UDP':
+            dport = _weighted(UDP_SERVICES, self.rng)
+        else:
+            dport = 0
+        return (proto, client, server, self.rng.randint(32768, 60999), dport, self.rng.choice((64, 128)))
+
+    def _background(self):
+        rng = self.rng
+        # Squaring skews selection towards the first flows: a few heavy hitters
+        proto, client, server, sport, dport, ttl = self.flows[int(len(self.flows) * rng.random() ** 2)]
+        if rng.random() < 0.001:
+            # Flows churn slowly over the capture
+            self.flows[rng.randrange(len(self.flows))] = self._new_flow()
+        if rng.random() < 0.5:
+            return proto, client, server, sport, dport, ttl, self._payload(proto, dport), ACK | PSH
+        return proto, server, client, dport, sport, ttl, self._payload(proto, sport, reply=True), ACK
+
+    def _payload(self, proto, port, reply=False):
+        if proto == 'UDP' and port == 53:
+            return _dns_query(self.rng.choice(DOMAINS), self.rng.randrange(65536)) if not reply else 90
+        if proto == 'TCP':
+            return self.rng.choice((0, 0, 0, 64, 512, 1460, 1460)) if not reply else self.rng.choice((0, 1460))
+        if proto == 'ICMP':
+            return 56
+        return self.rng.randint(40, 200)
+
+    def _anomaly(self, kind):
+        rng = self.rng
+        if kind == 'port_scan':
+            self.scan_port = self.scan_port % 65535 + 1
+            return 'TCP', SCANNER_IP, self.victim, 40000, self.scan_port, 52, 0, SYN
+        if kind == 'exfiltration':
+            return 'TCP', self.internal[len(self.internal) // 2], EXFIL_IP, 51515, 4444, 64, 1460, ACK | PSH
+        if kind == 'dns_tunnel':
+            chunk = base64.b32encode(rng.getrandbits(320).to_bytes(40, 'big')).decode().rstrip('=').lower()
+            name = f"{chunk[:40]}.{chunk[40:]}.{TUNNEL_DOMAIN}"
+            return 'UDP', self.internal[1 % len(self.internal)], "8.8.8.8", rng.randint(32768, 60999), 53, 64, \
+                _dns_query(name, rng.randrange(65536)), 0
+        # syn_flood: spoofed sources
+        source = f"{rng.randint(1, 223)}.{rng.randint(0, 255)}.{rng.randint(0, 255)}.{rng.randint(1, 254)}"
+        return 'TCP', source, self.web_server, rng.randint(1024, 65535), 80, rng.randint(30, 250), 0, SYN
+
+    def __iter__(self):
+        """Yield ``(timestamp, proto, src, dst, sport, dport, ttl, payload, tcp_flags, anomaly_kind)``"""
+        rng = self.rng
+        rate = self.packets / self.duration if self.duration else 1000.0
+        timestamp = self.start_time
+        for index in range(self.packets):
+            timestamp += rng.expovariate(rate)
+            kind = None
+            for name, state in self.anomalies.items():
+                if state['remaining'] and state['start'] <= index < state['end']:
+                    left = state['end'] - index
+                    if rng.random() * left < state['remaining']:
+                        kind = name
+                        state['remaining'] -= 1
+                        state['sent'] += 1
+                        break
+            fields = self._anomaly(kind) if kind else self._background()
+            yield (timestamp,) + fields + (kind,)
+
+    def injected(self):
+        """Anomaly packets actually injected so far, by kind"""
+        return {kind: state['sent'] for kind, state in self.anomalies.items()}
+
+
+def encode_frame(proto, src, dst, sport, dport, ttl, payload, flags, ident=0):
+    """Build an Ethernet/IPv4 frame; ``payload`` is bytes or a zero-filled length"""
+    if isinstance(payload, int):
+        payload = _ZEROS[:payload]
+    if proto == 'TCP':
+        transport = TCP.pack(sport, dport, ident, 0, 5 << 4, flags, 65535, 0, 0)
+    elif proto == 'UDP':
+        transport = UDP.pack(sport, dport, 8 + len(payload), 0)
+    else:
+        transport = ICMP.pack(8, 0, 0, ident & 0xffff, 1)
+    total_length = 20 + len(transport) + len(payload)
+    ip = IPV4.pack(0x45, 0, total_length, ident & 0xffff, 0x4000, ttl, PROTO_NUMBERS[proto], 0,
+                   socket.inet_aton(src), socket.inet_aton(dst))
+    frame = ETHERNET + ip + transport + payload
+    if len(frame) < 60:
+        frame += _ZEROS[:60 - len(frame)]
+    return frame
+
+
+def to_record(packet):
+    """Convert a generated packet into the dict ``PacketParser.parse_pcap`` produces"""
+    timestamp, proto, src, dst, sport, dport, ttl, payload, flags, _ = packet
+    length = len(encode_frame(proto, src, dst, sport, dport, ttl, payload, flags))
+    record = {'timestamp': timestamp, 'length': length, 'protocol': proto if proto != 'ICMP' else None,
+              'src_ip': src, 'dst_ip': dst, 'ttl': ttl}
+    if proto != 'ICMP':
+        record.update({'src_port': sport, 'dst_port': dport})
+    if proto == 'TCP':
+        record['tcp_flags'] = flags
+    return record
+
+
+def generate_pcap(path, packets=10000, hosts=50, protocol_mix=None, anomaly_rate=0.01,
+                  anomaly_kinds=ANOMALY_KINDS, duration=600.0, snaplen=128, seed=0, records=False):
+    """Write a synthetic capture to ``path`` and describe what it contains
+
+    With ``records`` the parser-shaped packet dicts are returned as well,
+    for benchmarking downstream stages without TShark.
+    """
+    capture = SyntheticCapture(packets, hosts, protocol_mix, anomaly_rate, anomaly_kinds, duration, seed=seed)
+    started = time.perf_counter()
+    total_bytes = 0
+    protocols = {}
+    packet_records = [] if records else None
+    with open(path, 'wb', buffering=1024 * 1024) as f:
+        f.write(PCAP_GLOBAL_HEADER)
+        for ident, packet in enumerate(capture):
+            timestamp, proto, src, dst, sport, dport, ttl, payload, flags, _ = packet
+            frame = encode_frame(proto, src, dst, sport, dport, ttl, payload, flags, ident)
+            captured = frame[:snaplen] if snaplen else frame
+            seconds = int(timestamp)
+            f.write(RECORD_HEADER.pack(seconds, int((timestamp - seconds) * 1e6), len(captured), len(frame)))
+            f.write(captured)
+            total_bytes += len(frame)
+            protocols[proto] = protocols.get(proto, 0) + 1
+            if records:
+                packet_records.append(to_record(packet))
+
+    result = {
+        'path': path,
+        'packets': packets,
+        'bytes': total_bytes,
+        'hosts': hosts,
+        'protocols': protocols,
+        'injected_anomalies': capture.injected(),
+        'anomaly_sources': {'port_scan': SCANNER_IP, 'exfiltration': EXFIL_IP, 'dns_tunnel': TUNNEL_DOMAIN},
+        'seed': seed,
+        'generate_seconds': time.perf_counter() - started
+    }
+    if records:
+        result['records'] = packet_records
+    return result
+
+
+def parse_mix(text):
+    """Parse ``tcp=0.7,udp=0.25,icmp=0.05`` into a protocol mix"""
+    mix = {}
+    for part in text.split(','):
+        name, _, weight = part.partition('=')
+        if name.strip().upper() not in PROTO_NUMBERS:
+            raise argparse.ArgumentTypeError(f"unknown protocol {name!r}")
+        mix[name.strip().upper()] = float(weight)
+    return mix
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('output', help="pcap file to write")
+    parser.add_argument('--packets', type=int, default=10000)
+    parser.add_argument('--hosts', type=int, default=50)
+    parser.add_argument('--mix', type=parse_mix, default=DEFAULT_MIX, help="e.g. tcp=0.7,udp=0.25,icmp=0.05")
+    parser.add_argument('--anomaly-rate', type=float, default=0.01, help="Fraction of packets that are anomalous")
+    parser.add_argument('--anomalies', nargs='*', choices=ANOMALY_KINDS, default=list(ANOMALY_KINDS))
+    parser.add_argument('--duration', type=float, default=600.0, help="Capture duration in seconds")
+    parser.add_argument('--snaplen', type=int, default=128, help="Bytes stored per frame (0 keeps whole frames)")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    info = generate_pcap(args.output, args.packets, args.hosts, args.mix, args.anomaly_rate,
+                         args.anomalies, args.duration, args.snaplen, args.seed)
+    print(json.dumps(info, indent=2))
+
+
+if __name__ == '__main__':
+    main()
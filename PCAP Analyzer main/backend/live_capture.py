@@ -0,0 +1,304 @@
+import math
+import os
+import random
+import threading
+import time
+from collections import Counter, OrderedDict, deque
+from typing import Dict, Any, Optional
+
+from metrics import LIVE_PACKETS, LIVE_FLOWS, LIVE_WINDOWS
+from packet_processing.pcap_stream import PcapStreamReader, decode_packet, detect_service
+
+# Most sources and destinations listed per window
+TOP_TALKERS = 10
+TOP_FLOWS = 10
+
+
+def _finite(value):
+    """Replace NaN/inf feature values (e.g. the std of a one-packet flow) with None"""
+    return None if isinstance(value, float) and not math.isfinite(value) else value
+
+
+class _Window:
+    """Counters for one time window of live traffic"""
+
+    def __init__(self, start: float, length: float):
+        self.start = start
+        self.end = start + length
+        self.packets = 0
+        self.bytes = 0
+        self.protocols = Counter()
+        self.services = Counter()
+        self.sources = Counter()
+        self.destinations = Counter()
+        self.other_talkers = 0
+        self.new_flows = 0
+        self.expired_flows = 0
+        self.evicted_flows = 0
+        # Reservoir sample of the window's packets for the anomaly detector
+        self.sample = []
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            'start': self.start,
+            'end': self.end,
+            'packets': self.packets,
+            'bytes': self.bytes,
+            'protocols': dict(self.protocols),
+            'services': dict(self.services),
+            'top_sources': [{'ip': ip, 'count': n} for ip, n in self.sources.most_common(TOP_TALKERS)],
+            'top_destinations': [{'ip': ip, 'count': n} for ip, n in self.destinations.most_common(TOP_TALKERS)],
+            'new_flows': self.new_flows,
+            'expired_flows': self.expired_flows,
+            'evicted_flows': self.evicted_flows,
+            'sampled_packets': len(self.sample)
+        }
+
+
+class LiveAnalyzer:
+    """Incremental flow table, protocol counters and detection over rolling windows.
+
+    Packets are assigned to fixed windows of ``window_seconds`` by capture
+    timestamp, so a replayed capture is windowed the same way as live
+    traffic. When a window closes its packet sample is run through the
+    anomaly detector and its summary joins the last ``windows_kept``.
+
+    Memory stays bounded however long the capture runs: flows idle for
+    ``idle_timeout`` seconds are expired, the flow table is capped at
+    ``max_flows`` (least recently active evicted first), each window counts
+    at most ``max_talkers`` distinct addresses and keeps a reservoir sample
+    of at most ``sample_size`` packets for detection.
+    """
+
+    def __init__(self, detector=None, window_seconds: float = 60, windows_kept: int = 10,
+                 idle_timeout: float = 120, max_flows: int = 50000, max_talkers: int = 10000,
+                 sample_size: int = 20000, max_anomalies: int = 50, seed: Optional[int] = None):
+        self.detector = detector
+        self.window_seconds = window_seconds
+        self.idle_timeout = idle_timeout
+        self.max_flows = max_flows
+        self.max_talkers = max_talkers
+        self.sample_size = sample_size
+        self.max_anomalies = max_anomalies
+        self.flows = OrderedDict()
+        self.windows = deque(maxlen=windows_kept)
+        self.current = None
+        self.total_packets = 0
+        self.total_bytes = 0
+        self.lock = threading.Lock()
+        self._random = random.Random(seed)
+
+    def add(self, packet: Dict[str, Any]):
+        """Account one decoded packet, closing the current window when it is over"""
+        timestamp = packet['timestamp']
+        closed = None
+        with self.lock:
+            if self.current is None:
+                self.current = self._new_window(timestamp)
+            elif timestamp >= self.current.end:
+                closed = self.current
+                self.current = self._new_window(timestamp)
+            self._account(self.current, packet, timestamp)
+        if closed is not None:
+            self._close(closed)
+
+    def flush(self):
+        """Close the current window, e.g. when the stream ends"""
+        with self.lock:
+            closed, self.current = self.current, None
+        if closed is not None:
+            self._close(closed)
+
+    def _new_window(self, timestamp: float) -> _Window:
+        start = math.floor(timestamp / self.window_seconds) * self.window_seconds
+        return _Window(start, self.window_seconds)
+
+    def _account(self, window: _Window, packet: Dict[str, Any], timestamp: float):
+        length = packet.get('length', 0)
+        window.packets += 1
+        window.bytes += length
+        self.total_packets += 1
+        self.total_bytes += length
+        window.protocols[packet.get('protocol') or 'Unknown'] += 1
+        service = detect_service(packet)
+        if service:
+            window.services[service] += 1
+
+        src_ip, dst_ip = packet.get('src_ip'), packet.get('dst_ip')
+        if src_ip is not None:
+            for counter, ip in ((window.sources, src_ip), (window.destinations, dst_ip)):
+                if ip in counter or len(counter) < self.max_talkers:
+                    counter[ip] += 1
+                else:
+                    window.other_talkers += 1
+            self._update_flow(window, packet, src_ip, dst_ip, length, timestamp)
+
+        # Reservoir sampling keeps a uniform sample of the window's packets
+        if len(window.sample) < self.sample_size:
+            window.sample.append(packet)
+        else:
+            slot = self._random.randrange(window.packets)
+            if slot < self.sample_size:
+                window.sample[slot] = packet
+
+    def _update_flow(self, window, packet, src_ip, dst_ip, length, timestamp):
+        protocol = packet.get('protocol') or 'Unknown'
+        src_port, dst_port = packet.get('src_port', 0), packet.get('dst_port', 0)
+        key = (src_ip, src_port, dst_ip, dst_port, protocol)
+        flow = self.flows.get(key)
+        if flow is None:
+            flow = self.flows[key] = {
+                'src_ip': src_ip,
+                'dst_ip': dst_ip,
+                'src_port': src_port,
+                'dst_port': dst_port,
+                'protocol': protocol,
+                'packets': 0,
+                'bytes': 0,
+                'start_time': timestamp,
+                'end_time': timestamp
+            }
+            window.new_flows += 1
+        else:
+            # Most recently active flows live at the end of the table
+            self.flows.move_to_end(key)
+        flow['packets'] += 1
+        flow['bytes'] += length
+        flow['end_time'] = max(flow['end_time'], timestamp)
+
+        # The oldest entry is the least recently active, so expiry stops at
+        # the first flow that is still live
+        cutoff = timestamp - self.idle_timeout
+        while self.flows:
+            oldest = next(iter(self.flows.values()))
+            if oldest['end_time'] >= cutoff:
+                break
+            self.flows.popitem(last=False)
+            window.expired_flows += 1
+        while len(self.flows) > self.max_flows:
+            self.flows.popitem(last=False)
+            window.evicted_flows += 1
+
+    def _close(self, window: _Window):
+        """Run detection on a finished window and keep its summary"""
+        summary = window.summary()
+        summary['other_talkers'] = window.other_talkers
+        summary['anomalies'] = []
+        if self.detector is not None and window.sample:
+            started = time.perf_counter()
+            try:
+                results = self.detector.analyze(window.sample)
+            except Exception as e:
+                summary['detection_error'] = str(e)
+            else:
+                anomalies = sorted(results['anomalies'], key=lambda a: a.get('anomaly_score', 0))
+                summary['anomaly_count'] = len(anomalies)
+                summary['anomalies'] = [{k: _finite(v) for k, v in a.items()}
+                                        for a in anomalies[:self.max_anomalies]]
+                if results['summary'].get('message'):
+                    summary['detection_message'] = results['summary']['message']
+            summary['detection_seconds'] = time.perf_counter() - started
+        window.sample = []
+        with self.lock:
+            self.windows.append(summary)
+            LIVE_FLOWS.set(len(self.flows))
+        LIVE_WINDOWS.inc()
+
+    def summary(self, windows: Optional[int] = None) -> Dict[str, Any]:
+        """The open window's counters, the latest closed windows and the busiest active flows"""
+        with self.lock:
+            current = self.current.summary() if self.current is not None else None
+            closed = list(self.windows)
+            top_flows = sorted(self.flows.values(), key=lambda f: f['packets'], reverse=True)[:TOP_FLOWS]
+            top_flows = [dict(flow) for flow in top_flows]
+            active_flows = len(self.flows)
+        if windows is not None:
+            closed = closed[-windows:] if windows > 0 else []
+        return {
+            'window_seconds': self.window_seconds,
+            'current_window': current,
+            'last_window': closed[-1] if closed else None,
+            'windows': closed,
+            'active_flows': active_flows,
+            'top_flows': top_flows,
+            'total_packets': self.total_packets,
+            'total_bytes': self.total_bytes
+        }
+
+
+class LiveCapture:
+    """Feed a pcap stream (FIFO, stdin or growing file) into a ``LiveAnalyzer`` on a thread
+
+    ``source`` is a path or a binary file object; ``-`` means stdin. With
+    ``follow`` a regular file is tailed instead of read once. Stopping takes
+    effect at the next poll of a followed file; a blocked FIFO read ends
+    when its writer sends data or closes.
+    """
+
+    def __init__(self, analyzer: LiveAnalyzer, source, follow: bool = True, poll_interval: float = 0.2):
+        self.analyzer = analyzer
+        self.source = source
+        self.follow = follow
+        self.poll_interval = poll_interval
+        self.started = None
+        self.finished = None
+        self.error = None
+        self.reader = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self) -> 'LiveCapture':
+        if self._thread is None:
+            self.started = time.time()
+            self._thread = threading.Thread(target=self._run, name='live-capture', daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self, timeout: Optional[float] = None):
+        self._stop.set()
+        if self._thread is not None and timeout:
+            self._thread.join(timeout)
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def _run(self):
+        source = self.source
+        if source == '-':
+            import sys
+            source = sys.stdin.buffer
+        self.reader = PcapStreamReader(source, follow=self.follow, poll_interval=self.poll_interval,
+                                       stop=self._stop)
+        try:
+            for timestamp, wire_length, data in self.reader:
+                self.analyzer.add(decode_packet(timestamp, wire_length, data, self.reader.linktype))
+                LIVE_PACKETS.inc()
+                if self._stop.is_set():
+                    break
+        except Exception as e:
+            self.error = str(e)
+        finally:
+            self.analyzer.flush()
+            self.finished = time.time()
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            'source': self.source if isinstance(self.source, str) else getattr(self.source, 'name', None),
+            'follow': self.follow,
+            'running': self.running,
+            'started': self.started,
+            'finished': self.finished,
+            'records': self.reader.records if self.reader else 0,
+            'bytes_read': self.reader.bytes_read if self.reader else 0,
+            'error': self.error
+        }
+
+
+def resolve_source(source: str, allowed_dir: Optional[str]) -> Optional[str]:
+    """Resolve a requested capture source, allowing only paths inside ``allowed_dir``"""
+    if not allowed_dir:
+        return None
+    root = os.path.realpath(allowed_dir)
+    path = os.path.realpath(os.path.join(root, source))
+    return path if path.startswith(root + os.sep) and os.path.exists(path) else None
@@ -0,0 +1,165 @@
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Dict, Any, Optional
+
+from metrics import CACHE_REQUESTS
+
+
+def normalize_prompt(prompt: str) -> str:
+    """Collapse whitespace so cosmetic prompt differences share a cache entry"""
+    return re.sub(r"\s+", " ", prompt).strip()
+
+
+class LLMResponseCache:
+    """Two-tier cache of LLM analysis results.
+
+    An in-memory LRU tier sits in front of a size-bounded on-disk tier; both
+    honour the same TTL. Keys are hashes of the normalized prompt, the model
+    name and the model configuration. Entries are kept as JSON text in both
+    tiers, so every ``get`` returns a fresh copy that callers may modify.
+    """
+
+    def __init__(self, cache_dir: Optional[str] = None, memory_entries=128,
+                 disk_max_bytes=100 * 1024 * 1024, ttl=24 * 3600):
+        self.cache_dir = cache_dir
+        self.memory_entries = memory_entries
+        self.disk_max_bytes = disk_max_bytes
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.memory = OrderedDict()  # key -> (stored_at, value as JSON text)
+        self.stats = {'memory_hits': 0, 'disk_hits': 0, 'misses': 0}
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+
+    @staticmethod
+    def make_key(prompt: str, model_name: str, model_config: Dict[str, Any]) -> str:
+        """Hash the normalized prompt together with the model and its config"""
+        payload = json.dumps({
+            'prompt': normalize_prompt(prompt),
+            'model': model_name,
+            'config': model_config
+        }, sort_keys=True)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def _disk_path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def _expired(self, stored_at: float) -> bool:
+        return bool(self.ttl) and time.time() - stored_at > self.ttl
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Return a cached result, checking memory before disk"""
+        with self.lock:
+            entry = self.memory.get(key)
+            if entry is not None:
+                if not self._expired(entry[0]):
+                    self.memory.move_to_end(key)
+                    self.stats['memory_hits'] += 1
+                    CACHE_REQUESTS.inc(cache='llm', result='hit')
+                    return json.loads(entry[1])
+                del self.memory[key]
+
+        value = self._disk_get(key)
+        with self.lock:
+            if value is None:
+                self.stats['misses'] += 1
+                CACHE_REQUESTS.inc(cache='llm', result='miss')
+                return None
+            self.stats['disk_hits'] += 1
+            CACHE_REQUESTS.inc(cache='llm', result='hit')
+            self._memory_put(key, value[0], json.dumps(value[1]))
+            return value[1]
+
+    def _disk_get(self, key: str):
+        """Read an entry from the disk tier as ``(stored_at, value)``"""
+        if not self.cache_dir:
+            return None
+        path = self._disk_path(key)
+        try:
+            with open(path, 'r') as f:
+                entry = json.load(f)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            print(f"Error reading LLM cache entry {key}: {e}")
+            return None
+        if self._expired(entry['stored_at']):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            return None
+        # Touch the file so disk eviction is least-recently-used
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return entry['stored_at'], entry['value']
+
+    def _memory_put(self, key: str, stored_at: float, text: str):
+        """Insert serialized JSON into the memory tier (lock must be held)"""
+        self.memory[key] = (stored_at, text)
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.memory_entries:
+            self.memory.popitem(last=False)
+
+    def put(self, key: str, value: Dict[str, Any]):
+        """Store a result in both tiers"""
+        stored_at = time.time()
+        # Serialized once: later changes to ``value`` cannot reach the cache
+        try:
+            text = json.dumps(value)
+        except (TypeError, ValueError) as e:
+            print(f"Not caching LLM result {key}: {e}")
+            return
+        with self.lock:
+            self._memory_put(key, stored_at, text)
+        if not self.cache_dir:
+            return
+        path = self._disk_path(key)
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        try:
+            with open(tmp_path, 'w') as f:
+                f.write(f'{{"stored_at": {json.dumps(stored_at)}, "value": {text}}}')
+            os.replace(tmp_path, path)
+        except Exception as e:
+            print(f"Error writing LLM cache entry {key}: {e}")
+            return
+        self._enforce_disk_budget()
+
+    def _enforce_disk_budget(self):
+        """Remove least recently used disk entries until within budget"""
+        if not self.disk_max_bytes:
+            return
+        entries = []
+        total = 0
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith('.json'):
+                continue
+            path = os.path.join(self.cache_dir, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+            total += stat.st_size
+        entries.sort()
+        for _, size, path in entries:
+            if total <= self.disk_max_bytes:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except OSError:
+                pass
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Return cache hit statistics"""
+        with self.lock:
+            return dict(self.stats, memory_entries=len(self.memory))
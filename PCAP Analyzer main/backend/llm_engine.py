@@ -1,39 +1,180 @@
 import requests
+from requests.adapters import HTTPAdapter
 import json
 import os
+import hashlib
+import queue
+import threading
 import time
+import uuid
+from concurrent.futures import TimeoutError as FutureTimeout
 from typing import List, Dict, Any, Optional
+from metrics import LLM_TTFT_SECONDS, LLM_REQUEST_SECONDS
+from models.model_registry import ModelConfigRegistry
+from llm_scheduler import LLMScheduler
+from prompt_builder import PromptBuilder, prompt_budget, ANALYSIS_SECTIONS, JSON_PROMPT_FOOTER, section_header
+from analysis_parser import (ANALYSIS_SCHEMA, parse_analysis, parse_structured, parse_alert_level,
+                             parse_threats, parse_bullets, render_sections)
+
+# Timeout (seconds) for lightweight Ollama metadata calls such as /api/tags
+HEALTH_CHECK_TIMEOUT = 5
+# Maximum silence (seconds) between streamed chunks before giving up
+STREAM_READ_TIMEOUT = float(os.environ.get("LLM_STREAM_READ_TIMEOUT", "60"))
+# Maximum time (seconds) a stream's client waits for its next event, queueing included
+STREAM_WAIT_TIMEOUT = float(os.environ.get("LLM_STREAM_WAIT_TIMEOUT", "180"))
+# How often (seconds) a waiting stream checks whether its worker is still there
+STREAM_POLL_INTERVAL = 1.0
+# Output format used when neither the request nor the model config picks one
+DEFAULT_OUTPUT_FORMAT = os.environ.get("LLM_OUTPUT_FORMAT", "text")
+# Time each section of a section-wise analysis may take
+SECTION_TIMEOUT = float(os.environ.get("LLM_SECTION_TIMEOUT", "60"))
+# Time a full analysis may take, waiting in the LLM queue included
+ANALYSIS_TIMEOUT = float(os.environ.get("LLM_ANALYSIS_TIMEOUT", "180"))
+
+
+def model_matches(name: str, model_name: str) -> bool:
+    """Compare Ollama model names, treating an untagged name as ``:latest``"""
+    if ':' not in model_name:
+        model_name = f"{model_name}:latest"
+    if ':' not in name:
+        name = f"{name}:latest"
+    return name == model_name
+
+
+class LLMHealthMonitor:
+    """Poll Ollama in the background and publish cached availability.
+
+    Request handlers read the last known state instead of probing Ollama
+    themselves, so an unavailable LLM fails fast and an available one costs
+    no extra round trip.
+    """
+
+    def __init__(self, engine, interval=10, unhealthy_interval=2):
+        self.engine = engine
+        self.interval = interval
+        self.unhealthy_interval = unhealthy_interval  # poll faster while down
+        self.lock = threading.Lock()
+        self.state = {
+            'available': False,
+            'service_up': False,
+            'model_pulled': False,
+            'model_loaded': None,
+            'last_checked': None,
+            'last_error': None
+        }
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """Start the background polling thread"""
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name="llm-health-monitor", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop the background polling thread"""
+        self._stop.set()
+        self._wake.set()
+
+    def _run(self):
+        while not self._stop.is_set():
+            available = self.check_now()
+            self._wake.wait(self.interval if available else self.unhealthy_interval)
+            self._wake.clear()
+
+    def check_now(self) -> bool:
+        """Probe Ollama immediately and publish the result"""
+        state = self.engine.probe()
+        state['last_checked'] = time.time()
+        with self.lock:
+            if state['available'] != self.state['available']:
+                if state['available']:
+                    print(f"LLM service is available with model {self.engine.model_name}")
+                else:
+                    print(f"WARNING: LLM service is not available ({state['last_error']}). "
+                          "Network analysis will be limited.")
+            self.state.update(state)
+        return state['available']
+
+    def report_failure(self, error: str):
+        """Mark the service down after a failed request and re-check soon"""
+        with self.lock:
+            self.state.update(available=False, last_error=error)
+        self._wake.set()
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Return the last published health state"""
+        with self.lock:
+            return dict(self.state)
+
 
 class LLMEngine:
-    def __init__(self, model_name="mistral", max_retries=5, retry_delay=2):
+    def __init__(self, model_name="mistral", max_retries=5, retry_delay=2, cache=None, pool_size=10,
+                 registry=None, scheduler=None):
         self.model_name = model_name
+        self.cache = cache  # optional LLMResponseCache
+        self.registry = registry or ModelConfigRegistry()
+        # Every Ollama generation goes through the scheduler's bounded queue
+        self.scheduler = scheduler or LLMScheduler()
+        self.prompt_builder = PromptBuilder()
         # Set default to ollama (service name) when running in Docker
         self.api_base = os.environ.get("LLM_API_BASE", "http://ollama:11434")
         self.last_analysis = None
         self.max_retries = max_retries
         self.retry_delay = retry_delay
+        # Keep-alive connection pool shared by all Ollama traffic
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.health = None  # LLMHealthMonitor once start_health_monitor() is called
         print(f"Initializing LLMEngine with API base: {self.api_base}")  # Debug info
-        
-    def is_available(self) -> bool:
-        """Check if Ollama is available and model is loaded"""
+    
+    def start_health_monitor(self, interval=10) -> LLMHealthMonitor:
+        """Start background health checks used instead of per-request probing"""
+        if self.health is None:
+            self.health = LLMHealthMonitor(self, interval=interval)
+            self.health.start()
+        return self.health
+    
+    def probe(self) -> Dict[str, Any]:
+        """Query Ollama once for service, model and loaded-model state"""
+        state = {'available': False, 'service_up': False, 'model_pulled': False,
+                 'model_loaded': None, 'last_error': None}
         try:
-            # First check if Ollama service is up
-            response = requests.get(f"{self.api_base}/api/tags")
+            response = self.session.get(f"{self.api_base}/api/tags", timeout=HEALTH_CHECK_TIMEOUT)
             if response.status_code != 200:
-                print(f"Ollama service not available: {response.status_code}")
-                return False
-                
-            # Check if our model is available
+                state['last_error'] = f"Ollama service not available: {response.status_code}"
+                return state
+            state['service_up'] = True
             models = response.json().get('models', [])
-            for model in models:
-                if model.get('name') == self.model_name:
-                    return True
-                    
-            print(f"Model {self.model_name} not loaded in Ollama")
-            return False
+            state['model_pulled'] = any(model_matches(m.get('name', ''), self.model_name) for m in models)
+            if not state['model_pulled']:
+                state['last_error'] = f"Model {self.model_name} not available in Ollama"
+                return state
+            state['available'] = True
         except Exception as e:
-            print(f"Error checking Ollama availability: {e}")
-            return False
+            state['last_error'] = f"Error checking Ollama availability: {e}"
+            return state
+        
+        # /api/ps lists models resident in memory; older Ollama versions lack it
+        try:
+            response = self.session.get(f"{self.api_base}/api/ps", timeout=HEALTH_CHECK_TIMEOUT)
+            if response.status_code == 200:
+                running = response.json().get('models', [])
+                state['model_loaded'] = any(model_matches(m.get('name', ''), self.model_name) for m in running)
+        except Exception:
+            pass
+        return state
+        
+    def is_available(self) -> bool:
+        """Check if Ollama is available and model is loaded"""
+        state = self.probe()
+        if not state['available']:
+            print(state['last_error'])
+        return state['available']
     
     def wait_for_service(self) -> bool:
         """Wait for Ollama service to be available"""
@@ -47,169 +188,433 @@ class LLMEngine:
         print("Failed to connect to Ollama service after maximum retries")
         return False
             
-    def analyze(self, input_data: Dict[str, Any]) -> Dict[str, Any]:
-        """Analyze network data with LLM"""
-        # Check/wait for Ollama service
-        if not self.wait_for_service():
-            return {
-                "error": "LLM service unavailable",
-                "analysis": "Unable to perform LLM analysis as the service is unavailable.",
-                "alert_level": "Unknown",
-                "identified_threats": [],
-                "recommendations": ["Check LLM service configuration and connectivity."]
-            }
-            
-        # Format the prompt
-        prompt = self._create_prompt(input_data)
+    def _prepare_request(self, input_data: Dict[str, Any], output_format: Optional[str] = None) -> Dict[str, Any]:
+        """Build the prompt, model config, Ollama request and cache key for an analysis"""
+        # Validated model config, mapped onto Ollama request options
+        model_config = self.registry.get(self.model_name)
+        output_format = output_format or model_config.get('output_format', DEFAULT_OUTPUT_FORMAT)
         
-        # Load model-specific configuration
-        config_path = os.path.join(os.path.dirname(__file__), 'models', f"{self.model_name.split(':')[0]}_config.json")
-        model_config = {}
+        # Format the prompt within the model's token budget
+        built = self._build_prompt(input_data, output_format)
+        prompt = built['prompt']
+        request_data = self.registry.build_request(self.model_name, prompt)
+        if output_format == 'json':
+            # Ollama constrains generation to the schema
+            request_data['format'] = ANALYSIS_SCHEMA
         
-        try:
-            if os.path.exists(config_path):
-                with open(config_path, 'r') as f:
-                    model_config = json.load(f)
-                    print(f"Loaded model-specific config for {self.model_name}")
-            else:
-                print(f"No model-specific config found at {config_path}, using defaults")
-        except Exception as e:
-            print(f"Error loading model config: {e}")
+        cache_key = None
+        if self.cache is not None:
+            # Key on the effective settings sent to Ollama, defaults included
+            effective_config = {k: v for k, v in request_data.items() if k not in ('prompt', 'stream')}
+            cache_key = self.cache.make_key(prompt, self.model_name, effective_config)
         
-        # Create request with model-specific parameters if available
-        request_data = {
-            "model": self.model_name,
-            "prompt": prompt,
-            "stream": False,
-            "temperature": model_config.get("temperature", 0.1),
-            "max_tokens": model_config.get("num_predict", 1024),
+        return {'prompt': prompt, 'model_config': model_config, 'prompt_tokens': built['estimated_tokens'],
+                'request_data': request_data, 'cache_key': cache_key,
+                'request_key': self._request_key(request_data), 'output_format': output_format}
+    
+    @staticmethod
+    def _request_key(request_data: Dict[str, Any]) -> str:
+        """Identify identical Ollama requests so in-flight duplicates are coalesced"""
+        payload = json.dumps(request_data, sort_keys=True)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+    
+    def _lookup_cache(self, prepared: Dict[str, Any], bypass_cache: bool) -> Optional[Dict[str, Any]]:
+        """Return a cached analysis for a prepared request, if any"""
+        if prepared['cache_key'] is None or bypass_cache:
+            return None
+        cached = self.cache.get(prepared['cache_key'])
+        if cached is None:
+            return None
+        self.last_analysis = cached["analysis"]
+        return dict(cached, cached=True)
+    
+    def _service_available(self) -> bool:
+        """Check Ollama availability: use the monitor's cached state when it is
+        running so an unavailable service fails fast, else probe and wait"""
+        if self.health is not None:
+            return self.health.snapshot()['available']
+        return self.wait_for_service()
+    
+    def _unavailable_result(self) -> Dict[str, Any]:
+        return {
+            "error": "LLM service unavailable",
+            "analysis": "Unable to perform LLM analysis as the service is unavailable.",
+            "alert_level": "Unknown",
+            "identified_threats": [],
+            "recommendations": ["Check LLM service configuration and connectivity."]
+        }
+    
+    def _request_failed(self, e: Exception) -> Dict[str, Any]:
+        """Log a failed Ollama request and build the error result"""
+        if isinstance(e, requests.RequestException):
+            error_msg = f"Request error with LLM service: {str(e)}"
+            if self.health is not None and isinstance(e, (requests.ConnectionError, requests.Timeout)):
+                self.health.report_failure(error_msg)
+        else:
+            error_msg = f"Unexpected error: {str(e)}"
+        print(error_msg)
+        return {"error": error_msg, "analysis": "Error occurred during analysis."}
+    
+    def _check_token_limit(self, stats: Dict[str, Any], prepared: Dict[str, Any]):
+        """Warn when a generation produced more tokens than num_predict allows"""
+        limit = prepared['request_data']['options'].get('num_predict')
+        eval_count = stats.get('eval_count')
+        if limit and eval_count is not None and eval_count > limit:
+            print(f"WARNING: {self.model_name} generated {eval_count} tokens, "
+                  f"exceeding the configured num_predict of {limit}")
+    
+    def _complete_analysis(self, text: str, prepared: Dict[str, Any]) -> Dict[str, Any]:
+        """Parse the generated text once into sections, alert level, threats and recommendations
+
+        JSON output is parsed into its typed fields and rendered back to the
+        usual markdown; free text (or JSON that failed to parse) goes through
+        the section parser. The parsed sections are kept on the result.
+        """
+        parsed = parse_structured(text) if prepared['output_format'] == 'json' else None
+        output_format = 'json'
+        if parsed is None:
+            parsed = parse_analysis(text)
+            output_format = 'text'
+        else:
+            text = render_sections(parsed['sections']) or text
+        self.last_analysis = text
+        analysis = {
+            "analysis": self.last_analysis,
+            "alert_level": parsed['alert_level'],
+            "identified_threats": parsed['identified_threats'],
+            "recommendations": parsed['recommendations'],
+            "sections": parsed['sections'],
+            "output_format": output_format,
+            "prompt_tokens_estimate": prepared['prompt_tokens']
         }
+        if prepared['cache_key'] is not None:
+            self.cache.put(prepared['cache_key'], analysis)
+        return dict(analysis, cached=False)
+            
+    def analyze(self, input_data: Dict[str, Any], bypass_cache: bool = False,
+                priority: str = 'interactive', output_format: Optional[str] = None) -> Dict[str, Any]:
+        """Analyze network data with LLM
+
+        Results are served from the response cache when an identical prompt
+        was already answered by the same model and config, unless
+        ``bypass_cache`` is set. Otherwise the request is queued on the
+        scheduler at ``priority`` ('interactive' or 'batch'), joining an
+        identical request already in flight. Raises ``SchedulerBusy`` when
+        the queue is full. A request not answered within ``ANALYSIS_TIMEOUT``
+        seconds is withdrawn from the scheduler and an error result returned.
+
+        ``output_format`` ('text' or 'json') overrides the model config's
+        ``output_format`` and ``LLM_OUTPUT_FORMAT``.
+        """
+        prepared = self._prepare_request(input_data, output_format)
+        cached = self._lookup_cache(prepared, bypass_cache)
+        if cached is not None:
+            return cached
         
-        # Add other parameters if they exist in config
-        for param in ["top_p", "top_k", "stop", "system"]:
-            if param in model_config:
-                request_data[param] = model_config[param]
+        if not self._service_available():
+            return self._unavailable_result()
         
+        try:
+            result = self.scheduler.run(prepared['request_key'], lambda: self._generate(prepared), priority,
+                                        timeout=ANALYSIS_TIMEOUT)
+        except FutureTimeout:
+            error_msg = f"LLM analysis timed out after {ANALYSIS_TIMEOUT}s"
+            print(error_msg)
+            return {"error": error_msg, "analysis": "Error occurred during analysis."}
+        # Coalesced callers share one result; give each its own copy
+        return dict(result)
+    
+    def _generate(self, prepared: Dict[str, Any]) -> Dict[str, Any]:
+        """Run one non-streaming Ollama generation for a prepared request"""
         # Call the local LLM (using Ollama API format)
+        started = time.perf_counter()
+        outcome = 'error'
         try:
-            response = requests.post(
+            response = self.session.post(
                 f"{self.api_base}/api/generate",
-                json=request_data,
+                json=prepared['request_data'],
                 timeout=60  # Add timeout to prevent hanging requests
             )
             
             if response.status_code == 200:
                 result = response.json()
-                self.last_analysis = result.get("response", "No response from LLM")
-                return {
-                    "analysis": self.last_analysis,
-                    "alert_level": self._extract_alert_level(self.last_analysis),
-                    "identified_threats": self._extract_threats(self.last_analysis),
-                    "recommendations": self.generate_recommendations()
-                }
+                outcome = 'success'
+                # Without streaming, model load plus prompt evaluation is the
+                # time Ollama needed before emitting its first token
+                if 'prompt_eval_duration' in result:
+                    ttft_ns = result.get('load_duration', 0) + result['prompt_eval_duration']
+                    LLM_TTFT_SECONDS.observe(ttft_ns / 1e9, model=self.model_name)
+                self._check_token_limit(result, prepared)
+                return self._complete_analysis(result.get("response", "No response from LLM"), prepared)
             else:
                 error_msg = f"Failed to get LLM response: {response.status_code}"
                 print(error_msg)
                 return {"error": error_msg, "analysis": "Error occurred during analysis."}
                 
-        except requests.RequestException as e:
-            error_msg = f"Request error with LLM service: {str(e)}"
-            print(error_msg)
-            return {"error": error_msg, "analysis": "Error occurred during analysis."}
         except Exception as e:
-            error_msg = f"Unexpected error: {str(e)}"
-            print(error_msg)
-            return {"error": error_msg, "analysis": "Error occurred during analysis."}
+            return self._request_failed(e)
+        finally:
+            LLM_REQUEST_SECONDS.observe(time.perf_counter() - started, model=self.model_name, outcome=outcome)
     
-    def _create_prompt(self, input_data: Dict[str, Any]) -> str:
-        """Create a detailed prompt for comprehensive network analysis"""
-        anomalies = input_data.get("anomalies", [])
-        packet_summary = input_data.get("packet_summary", {})
-        flow_data = input_data.get("flow_data", {})
-        
-        prompt = """You are a cybersecurity expert analyzing network traffic captured in a PCAP file.
-Provide a comprehensive analysis that includes:
+    def analyze_stream(self, input_data: Dict[str, Any], bypass_cache: bool = False,
+                       output_format: Optional[str] = None, priority: str = 'interactive'):
+        """Analyze network data with LLM, yielding tokens as Ollama produces them
 
-1. TRAFFIC OVERVIEW: Explain what the overall traffic represents and key patterns observed
-2. PROTOCOL ANALYSIS: Analyze the protocol distribution and what activities they indicate
-3. CONNECTION PATTERNS: Identify communication patterns between hosts and their significance
-4. SECURITY ASSESSMENT: Identify potential security issues, suspicious activities, or vulnerabilities
-5. CONTEXTUAL INTERPRETATION: Explain what this traffic likely represents in a network environment
-6. RECOMMENDATIONS: What actions should be taken based on this analysis
+        Yields ``{'type': 'token', 'text': ...}`` events followed by a single
+        ``{'type': 'result', 'result': ...}`` event carrying the same result
+        ``analyze`` returns. Section extraction and the alert level are only
+        computed once the stream has ended. A cached result is replayed as a
+        single token.
 
-Use technical details where relevant, but explain concepts clearly. Be specific about what's happening in this traffic.
+        The generation runs on a scheduler worker like any other request, so
+        streams share the same concurrency limit, and tokens are handed to
+        the caller through a queue. A full queue raises ``SchedulerBusy``
+        before the first event. Closing the returned generator early (the
+        client went away) stops the generation.
+        """
+        prepared = self._prepare_request(input_data, output_format)
+        cached = self._lookup_cache(prepared, bypass_cache)
+        if cached is not None:
+            return self._replay(cached)
+        if not self._service_available():
+            return iter([{'type': 'result', 'result': self._unavailable_result()}])
+        
+        events = queue.Queue()
+        stop = threading.Event()
+        # Each stream has its own consumer, so streams are never coalesced
+        key = ('stream', uuid.uuid4().hex)
+        future = self.scheduler.submit(key, lambda: self._stream_into(prepared, events, stop), priority)
+        return self._relay(events, stop, key, future)
+    
+    @staticmethod
+    def _replay(cached: Dict[str, Any]):
+        yield {'type': 'token', 'text': cached['analysis']}
+        yield {'type': 'result', 'result': cached}
+    
+    def _relay(self, events: queue.Queue, stop: threading.Event, key, future, wait_timeout: Optional[float] = None):
+        """Yield the events a scheduler worker produces, up to the result
 
-NETWORK SUMMARY:
-"""
+        Ends with an error result instead when the job finishes without
+        producing one (it failed or was dropped), or when nothing arrives for
+        ``wait_timeout`` seconds (``STREAM_WAIT_TIMEOUT``), so the response
+        thread is never left waiting for good.
+        """
+        wait_timeout = wait_timeout or STREAM_WAIT_TIMEOUT
+        try:
+            last_event = time.monotonic()
+            while True:
+                try:
+                    event = events.get(timeout=STREAM_POLL_INTERVAL)
+                except queue.Empty:
+                    # Everything the job queued is visible once it is done
+                    if future.done() and events.empty():
+                        yield {'type': 'result', 'result': self._stream_lost(future)}
+                        return
+                    if time.monotonic() - last_event > wait_timeout:
+                        error_msg = f"LLM stream produced nothing for {wait_timeout}s"
+                        print(error_msg)
+                        yield {'type': 'result',
+                               'result': {"error": error_msg, "analysis": "Error occurred during analysis."}}
+                        return
+                    continue
+                last_event = time.monotonic()
+                yield event
+                if event['type'] == 'result':
+                    return
+        finally:
+            stop.set()
+            self.scheduler.cancel(key, future)
+    
+    @staticmethod
+    def _stream_lost(future) -> Dict[str, Any]:
+        """Error result for a stream whose job ended without a result event"""
+        if future.cancelled():
+            error_msg = "LLM stream was cancelled"
+        elif future.exception() is not None:
+            error_msg = f"LLM stream failed: {future.exception()}"
+        else:
+            error_msg = "LLM stream ended without a result"
+        print(error_msg)
+        return {"error": error_msg, "analysis": "Error occurred during analysis."}
+    
+    def _stream_into(self, prepared: Dict[str, Any], events: queue.Queue, stop: threading.Event):
+        """Run one streaming generation on a scheduler worker, queueing its events"""
+        stream = self._stream(prepared)
+        try:
+            for event in stream:
+                if stop.is_set():
+                    break
+                events.put(event)
+        except Exception as e:
+            events.put({'type': 'result', 'result': self._request_failed(e)})
+        finally:
+            stream.close()
+    
+    def _stream(self, prepared: Dict[str, Any]):
+        request_data = dict(prepared['request_data'], stream=True)
+        started = time.perf_counter()
+        outcome = 'error'
+        chunks = []
+        try:
+            # The read timeout applies between streamed chunks, not to the whole generation
+            with self.session.post(f"{self.api_base}/api/generate", json=request_data,
+                                   stream=True, timeout=(HEALTH_CHECK_TIMEOUT, STREAM_READ_TIMEOUT)) as response:
+                if response.status_code != 200:
+                    error_msg = f"Failed to get LLM response: {response.status_code}"
+                    print(error_msg)
+                    yield {'type': 'result', 'result': {"error": error_msg, "analysis": "Error occurred during analysis."}}
+                    return
+                
+                for line in response.iter_lines():
+                    if not line:
+                        continue
+                    chunk = json.loads(line)
+                    if chunk.get('error'):
+                        raise RuntimeError(chunk['error'])
+                    token = chunk.get('response', '')
+                    if token:
+                        if not chunks:
+                            LLM_TTFT_SECONDS.observe(time.perf_counter() - started, model=self.model_name)
+                        chunks.append(token)
+                        yield {'type': 'token', 'text': token}
+                    if chunk.get('done'):
+                        self._check_token_limit(chunk, prepared)
+                        break
+            outcome = 'success'
+            text = "".join(chunks) or "No response from LLM"
+            yield {'type': 'result', 'result': self._complete_analysis(text, prepared)}
+        except Exception as e:
+            yield {'type': 'result', 'result': self._request_failed(e)}
+        finally:
+            LLM_REQUEST_SECONDS.observe(time.perf_counter() - started, model=self.model_name, outcome=outcome)
+    
+    def _prepare_section(self, input_data: Dict[str, Any], heading: str, instruction: str) -> Dict[str, Any]:
+        """Build a focused request for one analysis section"""
+        settings = dict(self.registry.options(self.model_name), **self.registry.get(self.model_name))
+        built = self.prompt_builder.build(input_data, budget=prompt_budget(settings),
+                                          header=section_header(heading, instruction),
+                                          footer=f"Provide the {heading} section:")
+        request_data = self.registry.build_request(self.model_name, built['prompt'])
+        # A single section needs only a fraction of the full analysis' output
+        options = request_data['options']
+        options['num_predict'] = max(64, options['num_predict'] // 3)
+        cache_key = None
+        if self.cache is not None:
+            effective_config = {k: v for k, v in request_data.items() if k not in ('prompt', 'stream')}
+            cache_key = self.cache.make_key(built['prompt'], self.model_name, effective_config)
+        return {'request_data': request_data, 'cache_key': cache_key, 'prompt_tokens': built['estimated_tokens'],
+                'request_key': self._request_key(request_data)}
+    
+    def _cached_section(self, prepared: Dict[str, Any], bypass_cache: bool) -> Optional[str]:
+        if prepared['cache_key'] is None or bypass_cache:
+            return None
+        cached = self.cache.get(prepared['cache_key'])
+        return cached['analysis'] if cached is not None else None
+    
+    def _generate_section(self, prepared: Dict[str, Any], timeout: float) -> str:
+        """Generate one section's text; runs on a scheduler worker"""
+        started = time.perf_counter()
+        outcome = 'error'
+        try:
+            response = self.session.post(f"{self.api_base}/api/generate",
+                                         json=prepared['request_data'], timeout=timeout)
+            if response.status_code != 200:
+                raise RuntimeError(f"Failed to get LLM response: {response.status_code}")
+            result = response.json()
+            outcome = 'success'
+        finally:
+            LLM_REQUEST_SECONDS.observe(time.perf_counter() - started, model=self.model_name, outcome=outcome)
         
-        # Add packet summary statistics
-        prompt += f"Total Packets: {packet_summary.get('total_packets', 0)}\n"
-        prompt += f"Protocol Distribution: {json.dumps(packet_summary.get('protocols', {}))}\n"
-        prompt += f"Top Source IPs: {json.dumps(packet_summary.get('top_sources', []))}\n"
-        prompt += f"Top Destination IPs: {json.dumps(packet_summary.get('top_destinations', []))}\n"
-        prompt += f"Capture Duration: {packet_summary.get('duration', 0)} seconds\n\n"
+        self._check_token_limit(result, prepared)
+        text = result.get("response", "").strip()
+        if prepared['cache_key'] is not None and text:
+            self.cache.put(prepared['cache_key'], {"analysis": text})
+        return text
+    
+    def analyze_sections(self, input_data: Dict[str, Any], bypass_cache: bool = False,
+                         section_timeout: Optional[float] = None,
+                         priority: str = 'interactive') -> Dict[str, Any]:
+        """Analyze network data with one focused LLM request per section
+
+        Sections are queued on the scheduler together, so they run
+        concurrently up to its worker count, and each must finish within
+        ``section_timeout`` of the analysis starting; sections still queued
+        at that point are withdrawn from the scheduler. The result has the same
+        fields as ``analyze`` plus ``sections`` and ``section_errors``; failed
+        sections are reported there while the rest are still returned.
+        Raises ``SchedulerBusy`` when the queue cannot take every section.
+        """
+        if not self._service_available():
+            return self._unavailable_result()
         
-        # Add flow data for better context
-        if flow_data:
-            prompt += "TOP TRAFFIC FLOWS:\n"
-            for i, flow in enumerate(flow_data.get('top_flows', [])[:10]):
-                prompt += f"Flow {i+1}: {flow.get('src_ip')}:{flow.get('src_port')} → "
-                prompt += f"{flow.get('dst_ip')}:{flow.get('dst_port')} "
-                prompt += f"({flow.get('protocol')}, {flow.get('packets')} packets, "
-                prompt += f"{flow.get('bytes')} bytes)\n"
-            prompt += "\n"
+        section_timeout = section_timeout or SECTION_TIMEOUT
+        sections, errors, pending = {}, {}, {}
+        for key, heading, instruction in ANALYSIS_SECTIONS:
+            prepared = self._prepare_section(input_data, heading, instruction)
+            text = self._cached_section(prepared, bypass_cache)
+            if text is not None:
+                sections[key] = text
+            else:
+                pending[key] = prepared
         
-        # Add detected services
-        if 'services' in packet_summary:
-            prompt += "DETECTED SERVICES:\n"
-            for service, count in packet_summary.get('services', {}).items():
-                prompt += f"- {service}: {count} connections\n"
-            prompt += "\n"
+        # All sections are queued together or, if the queue is too full, none is
+        submitted = self.scheduler.submit_many(
+            [(prepared['request_key'], lambda prepared=prepared: self._generate_section(prepared, section_timeout))
+             for prepared in pending.values()],
+            priority)
+        futures = dict(zip(pending, submitted))
         
-        # Add anomaly information
-        if anomalies:
-            prompt += "DETECTED ANOMALIES:\n"
-            for i, anomaly in enumerate(anomalies[:10]):  # Limit to first 10 anomalies
-                prompt += f"Anomaly {i+1}:\n"
-                prompt += f"- Source: {anomaly.get('src_ip', 'Unknown')}\n"
-                prompt += f"- Destination: {anomaly.get('dst_ip', 'Unknown')}\n"
-                prompt += f"- Protocol: {anomaly.get('protocol', 'Unknown')}\n"
-                prompt += f"- Anomaly Score: {anomaly.get('anomaly_score', 0)}\n"
-                if 'description' in anomaly:
-                    prompt += f"- Description: {anomaly.get('description')}\n"
-                prompt += "\n"
+        deadline = time.monotonic() + section_timeout
+        for key, future in futures.items():
+            try:
+                sections[key] = future.result(max(0, deadline - time.monotonic()))
+            except FutureTimeout:
+                # Take it off the queue if it never started, so abandoned
+                # sections do not hold worker slots for later requests
+                self.scheduler.cancel(pending[key]['request_key'], future)
+                errors[key] = f"timed out after {section_timeout}s"
+                print(f"LLM section {key} failed: {errors[key]}")
+            except Exception as e:
+                error_msg = f"{type(e).__name__}: {e}"
+                print(f"LLM section {key} failed: {error_msg}")
+                # A section running past its own timeout says nothing about service health
+                if self.health is not None and isinstance(e, requests.ConnectionError):
+                    self.health.report_failure(error_msg)
+                errors[key] = error_msg
         
-        prompt += "Provide your comprehensive analysis:"
-        return prompt
+        self.last_analysis = render_sections(sections)
+        recommendations = parse_bullets(sections.get('recommendations', ''))
+        result = {
+            "analysis": self.last_analysis,
+            "alert_level": parse_alert_level(sections.get('security_assessment', self.last_analysis)),
+            "identified_threats": parse_threats(self.last_analysis),
+            "recommendations": recommendations or self.generate_recommendations(),
+            "sections": sections,
+            "section_errors": errors,
+            "partial": bool(errors)
+        }
+        if len(errors) == len(ANALYSIS_SECTIONS):
+            result["error"] = "All LLM sections failed"
+        return result
+    
+    def _build_prompt(self, input_data: Dict[str, Any], output_format: str = 'text') -> Dict[str, Any]:
+        """Build the prompt within this model's token budget, with its size estimate"""
+        settings = dict(self.registry.options(self.model_name), **self.registry.get(self.model_name))
+        if output_format == 'json':
+            return self.prompt_builder.build(input_data, budget=prompt_budget(settings), footer=JSON_PROMPT_FOOTER)
+        return self.prompt_builder.build(input_data, budget=prompt_budget(settings))
+    
+    def _create_prompt(self, input_data: Dict[str, Any]) -> str:
+        """Create a detailed prompt for comprehensive network analysis"""
+        return self._build_prompt(input_data)['prompt']
         
     def _extract_alert_level(self, analysis: str) -> str:
         """Extract the alert level from the LLM response"""
-        if "critical" in analysis.lower():
-            return "Critical"
-        elif "high" in analysis.lower():
-            return "High"
-        elif "medium" in analysis.lower():
-            return "Medium"
-        else:
-            return "Low"
+        return parse_alert_level(analysis)
             
     def _extract_threats(self, analysis: str) -> List[str]:
         """Extract identified threats from the LLM response"""
-        # This is a simplified implementation
-        threats = []
-        lower_analysis = analysis.lower()
-        
-        threat_indicators = [
-            "malware", "scan", "brute force", "data exfiltration", 
-            "c2", "command and control", "ddos", "lateral movement",
-            "port scan", "vulnerability exploit", "suspicious traffic"
-        ]
-        
-        for indicator in threat_indicators:
-            if indicator in lower_analysis:
-                threats.append(indicator.title())
-                
-        return threats
+        return parse_threats(analysis)
     
     def generate_summary(self) -> str:
         """Generate a short summary from the last analysis"""
@@ -224,59 +629,14 @@ NETWORK SUMMARY:
         """Extract recommendations from LLM analysis"""
         if not self.last_analysis:
             return []
-            
-        # Look for recommendations in the LLM response
-        rec_section = self.last_analysis.lower().find("recommend")
-        if rec_section == -1:
-            return ["No specific recommendations found"]
-        
-        # Extract the recommendation section
-        rec_text = self.last_analysis[rec_section:]
-        
-        # Split into bullet points if possible
-        if "-" in rec_text:
-            recs = [r.strip() for r in rec_text.split("-") if r.strip()]
-            return recs[1:6]  # Skip the header and limit to 5 recommendations
-        else:
-            return [rec_text[:200] + "..."]
+        return parse_analysis(self.last_analysis)['recommendations']
 
     def extract_section(self, text, section_name):
         """Extract a specific section from the LLM analysis"""
         if not text:
             return "Not available"
-        
-        # Find the section by name
-        lower_text = text.lower()
-        section_name_lower = section_name.lower()
-        
-        start_idx = lower_text.find(section_name_lower)
-        if start_idx == -1:
-            return "Not found in analysis"
-        
-        # Find the next section heading or end of text
-        next_section_starts = []
-        for heading in ["TRAFFIC OVERVIEW", "PROTOCOL ANALYSIS", "CONNECTION PATTERNS", 
-                        "SECURITY ASSESSMENT", "CONTEXTUAL INTERPRETATION", "RECOMMENDATIONS"]:
-            if heading.lower() != section_name_lower:
-                pos = lower_text.find(heading.lower(), start_idx + len(section_name))
-                if pos != -1:
-                    next_section_starts.append(pos)
-        
-        # Find where this section ends
-        if next_section_starts:
-            end_idx = min(next_section_starts)
-        else:
-            end_idx = len(text)
-        
-        # Extract the section content (skipping the heading)
-        section_content = text[start_idx:end_idx].strip()
-        
-        # Remove the section heading from the content
-        heading_end = section_content.find('\n')
-        if heading_end != -1:
-            section_content = section_content[heading_end:].strip()
-        
-        return section_content
+        key = section_name.lower().replace(' ', '_')
+        return parse_analysis(text)['sections'].get(key, "Not found in analysis")
 
     def get_sample_analysis(self):
         """Return sample analysis data for when no real data is available"""
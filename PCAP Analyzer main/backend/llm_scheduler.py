@@ -0,0 +1,204 @@
+import heapq
+import itertools
+import math
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+from typing import Dict, Any, Callable, Hashable, Iterable, List, Tuple
+
+from metrics import QUEUE_DEPTH, LLM_SCHEDULED
+
+# Lower values are served first
+PRIORITIES = {'interactive': 0, 'batch': 1}
+
+
+class SchedulerBusy(Exception):
+    """Raised when the LLM queue is full; ``retry_after`` is a hint in seconds"""
+
+    def __init__(self, retry_after: int):
+        super().__init__(f"LLM queue is full, retry after {retry_after}s")
+        self.retry_after = retry_after
+
+
+class _Job:
+    __slots__ = ('key', 'fn', 'priority', 'future', 'started', 'cancelled', 'waiters')
+
+    def __init__(self, key, fn, priority):
+        self.key = key
+        self.fn = fn
+        self.priority = priority
+        self.future = Future()
+        self.started = False
+        self.cancelled = False
+        self.waiters = 1
+
+
+class LLMScheduler:
+    """Bounded priority queue of LLM requests served by a fixed set of workers.
+
+    Identical requests (same key) that are queued or running are coalesced:
+    the request runs once and every caller gets its result. Interactive
+    requests are served before batch ones. When the queue is full new
+    requests are rejected at once with ``SchedulerBusy`` rather than
+    blocking the caller.
+    """
+
+    def __init__(self, workers=2, max_queue=32):
+        self.workers = max(1, workers)
+        self.max_queue = max_queue
+        self.condition = threading.Condition()
+        self.heap = []  # (priority, sequence, job); may hold stale entries for started jobs
+        self.sequence = itertools.count()
+        self.inflight = {}  # key -> queued or running job
+        self.queued = 0
+        self.running = 0
+        self.avg_seconds = 10.0  # moving average of job duration, seeds the retry hint
+        self.stats = {'submitted': 0, 'coalesced': 0, 'rejected': 0, 'completed': 0, 'failed': 0,
+                      'cancelled': 0}
+        self.threads = []
+
+    def start(self):
+        """Start the worker threads (idempotent)"""
+        with self.condition:
+            if self.threads:
+                return
+            for i in range(self.workers):
+                thread = threading.Thread(target=self._worker, name=f"llm-worker-{i}", daemon=True)
+                self.threads.append(thread)
+                thread.start()
+
+    def retry_after(self) -> int:
+        """Seconds until the current backlog is expected to drain"""
+        with self.condition:
+            return self._retry_after()
+
+    def _retry_after(self) -> int:
+        backlog = self.queued + self.running
+        return max(1, math.ceil(backlog / self.workers * self.avg_seconds))
+
+    def submit(self, key: Hashable, fn: Callable[[], Any], priority: str = 'interactive') -> Future:
+        """Queue ``fn`` under ``key``, or join the identical request already in flight"""
+        return self.submit_many([(key, fn)], priority)[0]
+
+    def submit_many(self, requests: Iterable[Tuple[Hashable, Callable[[], Any]]],
+                    priority: str = 'interactive') -> List[Future]:
+        """Queue several ``(key, fn)`` requests at once, returning their futures in order
+
+        Either every request is queued (or joins one in flight), or, when the
+        queue cannot take all the new ones, none is and ``SchedulerBusy`` is
+        raised. Capacity is checked and taken under one lock, so concurrent
+        callers cannot fill the queue half way through.
+        """
+        requests = list(requests)
+        rank = PRIORITIES[priority]
+        self.start()
+        with self.condition:
+            new_keys = {key for key, _ in requests if key not in self.inflight}
+            if self.queued + len(new_keys) > self.max_queue:
+                self.stats['rejected'] += 1
+                LLM_SCHEDULED.inc(result='rejected')
+                raise SchedulerBusy(self._retry_after())
+
+            futures = []
+            for key, fn in requests:
+                job = self.inflight.get(key)
+                if job is not None:
+                    job.waiters += 1
+                    self.stats['coalesced'] += 1
+                    LLM_SCHEDULED.inc(result='coalesced')
+                    if not job.started and rank < job.priority:
+                        # An interactive caller joined a queued batch request: move it up
+                        job.priority = rank
+                        heapq.heappush(self.heap, (rank, next(self.sequence), job))
+                    futures.append(job.future)
+                    continue
+
+                job = _Job(key, fn, rank)
+                self.inflight[key] = job
+                heapq.heappush(self.heap, (rank, next(self.sequence), job))
+                self.queued += 1
+                self.stats['submitted'] += 1
+                LLM_SCHEDULED.inc(result='queued')
+                QUEUE_DEPTH.inc(queue='llm')
+                self.condition.notify()
+                futures.append(job.future)
+            return futures
+
+    def cancel(self, key: Hashable, future: Future) -> bool:
+        """Withdraw one caller's interest in a submitted request, e.g. after it timed out
+
+        Once no caller is left waiting the request leaves the in-flight map,
+        so a later identical request starts afresh instead of joining it. A
+        request that has not started yet is also taken off the queue and its
+        future cancelled; returns True in that case. A running request cannot
+        be interrupted and finishes on its own.
+        """
+        with self.condition:
+            job = self.inflight.get(key)
+            if job is None or job.future is not future:
+                return False
+            job.waiters -= 1
+            if job.waiters > 0:
+                return False
+            del self.inflight[key]
+            if job.started:
+                return False
+            # Its heap entry is skipped by the workers
+            job.cancelled = True
+            self.queued -= 1
+            self.stats['cancelled'] += 1
+            QUEUE_DEPTH.dec(queue='llm')
+        return future.cancel()
+
+    def run(self, key: Hashable, fn: Callable[[], Any], priority: str = 'interactive', timeout=None) -> Any:
+        """Submit and wait up to ``timeout`` seconds for the result
+
+        On timeout this caller's interest is withdrawn (see ``cancel``) before
+        ``concurrent.futures.TimeoutError`` is raised.
+        """
+        future = self.submit(key, fn, priority)
+        try:
+            return future.result(timeout)
+        except FutureTimeout:
+            self.cancel(key, future)
+            raise
+
+    def _worker(self):
+        while True:
+            with self.condition:
+                job = None
+                while job is None:
+                    while not self.heap:
+                        self.condition.wait()
+                    _, _, candidate = heapq.heappop(self.heap)
+                    if not candidate.started and not candidate.cancelled:
+                        job = candidate
+                job.started = True
+                self.queued -= 1
+                self.running += 1
+                QUEUE_DEPTH.dec(queue='llm')
+
+            started = time.perf_counter()
+            try:
+                result = job.fn()
+            except BaseException as e:
+                outcome = 'failed'
+                job.future.set_exception(e)
+            else:
+                outcome = 'completed'
+                job.future.set_result(result)
+            finally:
+                elapsed = time.perf_counter() - started
+                with self.condition:
+                    self.running -= 1
+                    # Gone already if every caller cancelled while it ran
+                    if self.inflight.get(job.key) is job:
+                        del self.inflight[job.key]
+                    self.stats[outcome] += 1
+                    self.avg_seconds = 0.8 * self.avg_seconds + 0.2 * elapsed
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Queue occupancy and request counts"""
+        with self.condition:
+            return dict(self.stats, queued=self.queued, running=self.running, workers=self.workers,
+                        max_queue=self.max_queue, retry_after=self._retry_after())
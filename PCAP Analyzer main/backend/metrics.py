@@ -0,0 +1,224 @@
+import bisect
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Tuple, List, Optional
+
+# Latency buckets (seconds) spanning sub-millisecond stages to slow CPU LLM calls
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+MEMORY_BUCKETS = tuple(mb * 1024 * 1024 for mb in (64, 128, 256, 512, 1024, 2048, 4096, 8192, 16384))
+
+
+def _format_labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Metric:
+    """Base class for labelled metrics; each child series is keyed by label values"""
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labels: Tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(labels)
+        self.lock = threading.Lock()
+        self.series = {}
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(name, "")) for name in self.label_names)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        with self.lock:
+            for key, value in sorted(self.series.items()):
+                lines.extend(self._render_series(key, value))
+        return lines
+
+    def _render_series(self, key, value) -> List[str]:
+        return [f"{self.name}{_format_labels(self.label_names, key)} {_format_value(value)}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self.lock:
+            self.series[key] = self.series.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def set(self, value: float, **labels):
+        with self.lock:
+            self.series[self._key(labels)] = value
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self.lock:
+            self.series[key] = self.series.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+    @contextmanager
+    def track_inprogress(self, **labels):
+        """Increment the gauge for the duration of the block"""
+        self.inc(**labels)
+        try:
+            yield
+        finally:
+            self.dec(**labels)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labels: Tuple[str, ...] = (), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            series = self.series.get(key)
+            if series is None:
+                # Per-bucket (non-cumulative) counts, a sum and a total count
+                series = self.series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        """Observe the wall-clock duration of the block"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def _render_series(self, key, value) -> List[str]:
+        counts, total, count = value
+        lines = []
+        cumulative = 0
+        for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+            cumulative += bucket_count
+            labels = _format_labels(self.label_names, key, f'le="{_format_value(bound)}"')
+            lines.append(f"{self.name}_bucket{labels} {cumulative}")
+        labels = _format_labels(self.label_names, key)
+        lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+        lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+
+class MetricsRegistry:
+    """Collection of metrics rendered in the Prometheus text exposition format"""
+
+    def __init__(self):
+        self.metrics = []
+
+    def counter(self, name, documentation, labels=()) -> Counter:
+        return self._register(Counter(name, documentation, labels))
+
+    def gauge(self, name, documentation, labels=()) -> Gauge:
+        return self._register(Gauge(name, documentation, labels))
+
+    def histogram(self, name, documentation, labels=(), buckets=LATENCY_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, documentation, labels, buckets))
+
+    def _register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+_PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+
+def current_rss_bytes() -> Optional[int]:
+    """Return the current resident set size, or the process peak where /proc is unavailable"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * _PAGE_SIZE
+    except (OSError, ValueError, IndexError):
+        pass
+    try:
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+    except Exception:
+        return None
+
+
+class MemorySampler:
+    """Track the peak RSS seen at sample points during an analysis.
+
+    Sampling reads ``/proc/self/statm`` only at stage boundaries, which keeps
+    it cheap enough to leave on in production.
+    """
+
+    def __init__(self):
+        self.peak = 0
+        self.sample()
+
+    def sample(self):
+        rss = current_rss_bytes()
+        if rss and rss > self.peak:
+            self.peak = rss
+        return rss
+
+
+REGISTRY = MetricsRegistry()
+
+STAGE_SECONDS = REGISTRY.histogram(
+    "pcap_stage_duration_seconds", "Latency of each analysis pipeline stage", labels=("stage",))
+PARSED_PACKETS = REGISTRY.counter(
+    "pcap_parsed_packets_total", "Packets parsed from uploaded captures")
+PARSED_BYTES = REGISTRY.counter(
+    "pcap_parsed_bytes_total", "Bytes of packet data parsed from uploaded captures")
+PARSE_PACKET_RATE = REGISTRY.gauge(
+    "pcap_parse_packets_per_second", "Packets per second achieved by the most recent parse")
+PARSE_BYTE_RATE = REGISTRY.gauge(
+    "pcap_parse_bytes_per_second", "Bytes per second achieved by the most recent parse")
+QUEUE_DEPTH = REGISTRY.gauge(
+    "pcap_queue_depth", "Analyses waiting or in progress", labels=("queue",))
+CACHE_REQUESTS = REGISTRY.counter(
+    "pcap_cache_requests_total", "Cache lookups by cache and result", labels=("cache", "result"))
+LLM_TTFT_SECONDS = REGISTRY.histogram(
+    "pcap_llm_time_to_first_token_seconds", "Time until the LLM produced its first token", labels=("model",))
+LLM_REQUEST_SECONDS = REGISTRY.histogram(
+    "pcap_llm_request_duration_seconds", "Total LLM request latency", labels=("model", "outcome"))
+LLM_SCHEDULED = REGISTRY.counter(
+    "pcap_llm_scheduler_requests_total", "LLM requests queued, coalesced or rejected by the scheduler",
+    labels=("result",))
+ANALYSIS_PEAK_MEMORY = REGISTRY.histogram(
+    "pcap_analysis_peak_rss_bytes", "Peak resident memory observed during an analysis", buckets=MEMORY_BUCKETS)
+ANALYSES = REGISTRY.counter(
+    "pcap_analyses_total", "Completed analyses by endpoint and outcome", labels=("endpoint", "outcome"))
+LIVE_PACKETS = REGISTRY.counter(
+    "pcap_live_packets_total", "Packets read from the live capture source")
+LIVE_FLOWS = REGISTRY.gauge(
+    "pcap_live_active_flows", "Flows currently tracked by live capture")
+LIVE_WINDOWS = REGISTRY.counter(
+    "pcap_live_windows_total", "Live capture windows closed and analyzed")
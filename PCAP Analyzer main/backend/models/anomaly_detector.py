@@ -6,11 +6,16 @@ import joblib
 import os
 from datetime import datetime
 
+from packet_processing.endpoints import ENDPOINT_FIELDS, endpoints_of
+
 class AnomalyDetector:
-    def __init__(self):
+    def __init__(self, read_only=False):
+        # A read-only detector loads the saved model but never writes it back
+        self.read_only = read_only
         self.model = None
         self.scaler = StandardScaler()
         self.feature_columns = None
+        self._parser = None
         self.stats = {
             'total_anomalies': 0,
             'last_training': None,
@@ -35,6 +40,8 @@ class AnomalyDetector:
     
     def _save_model(self):
         """Save the trained model"""
+        if self.read_only:
+            return
         os.makedirs(os.path.dirname(self.model_path), exist_ok=True)
         model_data = {
             'model': self.model,
@@ -49,8 +56,9 @@ class AnomalyDetector:
         if packet_features.empty:
             return False
         
-        # Select numerical features only
-        numerical_features = packet_features.select_dtypes(include=[np.number])
+        # Select numerical features only; interned endpoint IDs are keys, not features
+        numerical_features = packet_features.select_dtypes(include=[np.number]).drop(
+            columns=list(ENDPOINT_FIELDS), errors='ignore')
         self.feature_columns = numerical_features.columns.tolist()
         
         # Scale features
@@ -73,14 +81,19 @@ class AnomalyDetector:
         return True
     
     def analyze(self, packet_data):
-        """Analyze packets for anomalies using the trained model"""
+        """Analyze packets for anomalies using the trained model
+
+        Interned packets are grouped by endpoint ID; anomaly records get their
+        address strings back from the packets' endpoint dictionary.
+        """
         from packet_processing.packet_parser import PacketParser
         
-        # Create a packet parser instance
-        parser = PacketParser()
+        # One parser for feature extraction; live capture calls this every window
+        if self._parser is None:
+            self._parser = PacketParser()
         
         # Extract features
-        packet_features = parser.extract_features(packet_data)
+        packet_features = self._parser.extract_features(packet_data)
         
         if packet_features.empty:
             return {
@@ -120,11 +133,14 @@ class AnomalyDetector:
             predictions = self.model.predict(X)
             
             # Prepare results
+            endpoints = endpoints_of(packet_data)
             anomalies = []
             for i, pred in enumerate(predictions):
                 if pred == -1:  # Anomaly
                     anomaly_record = packet_features.iloc[i].to_dict()
                     anomaly_record['anomaly_score'] = float(anomaly_scores[i])
+                    if endpoints is not None:
+                        endpoints.restore(anomaly_record)
                     anomalies.append(anomaly_record)
             
             # Update stats
@@ -0,0 +1,172 @@
+import json
+import os
+import threading
+from typing import Dict, Any, List, Optional
+
+# Defaults applied when a model has no config file (or an invalid one)
+DEFAULT_OPTIONS = {
+    "temperature": 0.1,
+    "num_predict": 1024
+}
+
+# Config keys that Ollama expects inside the request's ``options`` object,
+# with the type and range each must satisfy
+OPTION_SCHEMA = {
+    "temperature": ((int, float), 0.0, 2.0),
+    "top_p": ((int, float), 0.0, 1.0),
+    "top_k": (int, 1, None),
+    "min_p": ((int, float), 0.0, 1.0),
+    "num_predict": (int, 1, None),
+    "num_ctx": (int, 1, None),
+    "repeat_penalty": ((int, float), 0.0, None),
+    "seed": (int, None, None),
+    "num_thread": (int, 1, None),
+    "stop": (list, None, None),
+}
+
+# Config keys sent as top-level request fields
+TOP_LEVEL_SCHEMA = {
+    "system": str,
+    "keep_alive": (str, int),
+}
+
+# Config keys used by the backend itself and never sent to Ollama
+BACKEND_SCHEMA = {
+    "prompt_token_budget": (int, 1, None),
+    "output_format": (str, None, None),
+}
+
+# "json" asks Ollama for schema-constrained output instead of free text
+OUTPUT_FORMATS = ("text", "json")
+
+
+class ModelConfigRegistry:
+    """Validated, cached model configurations loaded from ``<model>_config.json``.
+
+    All configs are loaded and validated once at startup. ``get`` only
+    re-reads a file when its mtime has changed, so configs can be edited
+    without restarting the backend.
+    """
+
+    def __init__(self, config_dir: Optional[str] = None):
+        self.config_dir = config_dir or os.path.dirname(__file__)
+        self.lock = threading.Lock()
+        self.entries = {}  # base model name -> {'config', 'mtime', 'errors'}
+        self.load_all()
+
+    @staticmethod
+    def base_name(model_name: str) -> str:
+        """Strip the tag from a model name (``qwen2:0.5b`` -> ``qwen2``)"""
+        return model_name.split(':')[0]
+
+    def _path(self, base_name: str) -> str:
+        return os.path.join(self.config_dir, f"{base_name}_config.json")
+
+    def load_all(self):
+        """Load and validate every config file in the config directory"""
+        for name in sorted(os.listdir(self.config_dir)):
+            if name.endswith('_config.json'):
+                self._load(name[:-len('_config.json')])
+
+    @staticmethod
+    def validate(config: Any) -> List[str]:
+        """Return a list of problems with a model config (empty when valid)"""
+        if not isinstance(config, dict):
+            return ["config must be a JSON object"]
+        errors = []
+        for key, value in config.items():
+            if key in OPTION_SCHEMA or key in BACKEND_SCHEMA:
+                types, minimum, maximum = OPTION_SCHEMA.get(key) or BACKEND_SCHEMA[key]
+                if isinstance(value, bool) or not isinstance(value, types):
+                    errors.append(f"{key} has invalid type {type(value).__name__}")
+                elif key == "stop":
+                    if not all(isinstance(s, str) for s in value):
+                        errors.append("stop must be a list of strings")
+                elif key == "output_format":
+                    if value not in OUTPUT_FORMATS:
+                        errors.append(f"output_format must be one of {', '.join(OUTPUT_FORMATS)}")
+                elif minimum is not None and value < minimum:
+                    errors.append(f"{key}={value} is below the minimum {minimum}")
+                elif maximum is not None and value > maximum:
+                    errors.append(f"{key}={value} is above the maximum {maximum}")
+            elif key in TOP_LEVEL_SCHEMA:
+                if not isinstance(value, TOP_LEVEL_SCHEMA[key]):
+                    errors.append(f"{key} has invalid type {type(value).__name__}")
+            else:
+                errors.append(f"unknown setting {key}")
+        return errors
+
+    def _load(self, base_name: str) -> Dict[str, Any]:
+        """(Re)load one config file into the registry"""
+        path = self._path(base_name)
+        try:
+            mtime = os.stat(path).st_mtime
+        except FileNotFoundError:
+            entry = {'config': {}, 'mtime': None, 'errors': []}
+            with self.lock:
+                self.entries[base_name] = entry
+            return entry
+
+        try:
+            with open(path, 'r') as f:
+                config = json.load(f)
+            errors = self.validate(config)
+        except Exception as e:
+            config, errors = {}, [f"could not be parsed: {e}"]
+
+        if errors:
+            # Reject the whole file rather than sending a half-valid config
+            print(f"Invalid model config {path}: {'; '.join(errors)}. Using defaults.")
+            config = {}
+        else:
+            print(f"Loaded model-specific config for {base_name}")
+
+        entry = {'config': config, 'mtime': mtime, 'errors': errors}
+        with self.lock:
+            self.entries[base_name] = entry
+        return entry
+
+    def _entry(self, model_name: str) -> Dict[str, Any]:
+        """Return the cached entry, reloading it if the file's mtime changed"""
+        base_name = self.base_name(model_name)
+        with self.lock:
+            entry = self.entries.get(base_name)
+        try:
+            mtime = os.stat(self._path(base_name)).st_mtime
+        except FileNotFoundError:
+            mtime = None
+        if entry is None or entry['mtime'] != mtime:
+            entry = self._load(base_name)
+        return entry
+
+    def get(self, model_name: str) -> Dict[str, Any]:
+        """Return the validated config for a model (empty if none)"""
+        return dict(self._entry(model_name)['config'])
+
+    def options(self, model_name: str) -> Dict[str, Any]:
+        """Return the Ollama ``options`` for a model, with defaults applied"""
+        config = self.get(model_name)
+        options = dict(DEFAULT_OPTIONS)
+        options.update({key: value for key, value in config.items() if key in OPTION_SCHEMA})
+        return options
+
+    def build_request(self, model_name: str, prompt: str, stream: bool = False) -> Dict[str, Any]:
+        """Build an Ollama /api/generate request body for a model"""
+        config = self.get(model_name)
+        request_data = {
+            "model": model_name,
+            "prompt": prompt,
+            "stream": stream,
+            "options": self.options(model_name)
+        }
+        for key in TOP_LEVEL_SCHEMA:
+            if key in config:
+                request_data[key] = config[key]
+        return request_data
+
+    def status(self) -> Dict[str, Any]:
+        """Summarize loaded configs and validation errors"""
+        with self.lock:
+            return {name: {'valid': not entry['errors'], 'errors': entry['errors'],
+                           'num_predict': entry['config'].get('num_predict')}
+                    for name, entry in self.entries.items() if entry['mtime'] is not None}
@@ -0,0 +1,289 @@
+import math
+import struct
+from collections import Counter
+from typing import Dict, Any, Callable, Iterable, List, Optional, Tuple
+
+from packet_processing.endpoints import address_key, key_text
+from packet_processing.pcap_stream import PROTOCOLS, PcapStreamReader, header_fields, transport_payload
+
+# Ports that select a service for inspection; decoders also sniff payloads
+SERVICE_PORTS = {
+    'dns': {53, 5353},
+    'tls': {443, 465, 853, 993, 995, 8443},
+    'http': {80, 8000, 8080}
+}
+TLS_VERSIONS = {0x0300: 'SSL 3.0', 0x0301: 'TLS 1.0', 0x0302: 'TLS 1.1', 0x0303: 'TLS 1.2', 0x0304: 'TLS 1.3'}
+DNS_TYPES = {1: 'A', 2: 'NS', 5: 'CNAME', 10: 'NULL', 12: 'PTR', 15: 'MX', 16: 'TXT', 28: 'AAAA', 33: 'SRV',
+             65: 'HTTPS', 255: 'ANY'}
+HTTP_METHODS = (b'GET ', b'POST ', b'PUT ', b'HEAD ', b'DELETE ', b'OPTIONS ', b'PATCH ', b'CONNECT ')
+
+# DNS names whose longest label is this long and random-looking suggest tunneling
+TUNNEL_LABEL_LENGTH = 24
+TUNNEL_LABEL_ENTROPY = 3.5
+TUNNEL_NAME_LENGTH = 80
+TUNNEL_MIN_QUERIES = 5
+# Decoded items kept per flow and kind; everything is still counted
+MAX_ITEMS = 20
+
+
+def _entropy(text: str) -> float:
+    counts = Counter(text)
+    return -sum(n / len(text) * math.log2(n / len(text)) for n in counts.values()) if text else 0.0
+
+
+def _dns_name(payload: bytes, offset: int) -> Tuple[str, int]:
+    """Read a possibly compressed DNS name; returns the name and the offset after it
+
+    A name cut off by the capture's snap length is returned as far as it
+    goes, with None for the offset.
+    """
+    labels, end, jumps = [], None, 0
+    while True:
+        if offset >= len(payload):
+            return '.'.join(labels), None
+        length = payload[offset]
+        if length & 0xc0 == 0xc0:
+            if jumps > 10:
+                raise ValueError("DNS name compression loop")
+            if end is None:
+                end = offset + 2
+            offset = struct.unpack_from('!H', payload, offset)[0] & 0x3fff
+            jumps += 1
+            continue
+        if length == 0:
+            return '.'.join(labels), end if end is not None else offset + 1
+        labels.append(payload[offset + 1:offset + 1 + length].decode('ascii', 'replace'))
+        offset += 1 + length
+
+
+def decode_dns(payload: bytes, tcp: bool = False) -> Optional[Dict[str, Any]]:
+    """Decode the header and first question of a DNS message"""
+    if tcp:
+        payload = payload[2:]
+    try:
+        _, flags, questions, answers = struct.unpack_from('!HHHH', payload, 0)
+        if questions == 0 or flags & 0x7800:  # only standard queries
+            return None
+        name, offset = _dns_name(payload, 12)
+        qtype = struct.unpack_from('!H', payload, offset)[0] if offset is not None else None
+    except (struct.error, IndexError, ValueError):
+        return None
+    decoded = {'query': name, 'qtype': DNS_TYPES.get(qtype, str(qtype)) if qtype is not None else None,
+               'response': bool(flags & 0x8000), 'rcode': flags & 0x000f, 'answers': answers}
+    if offset is None:
+        decoded['truncated'] = True
+    return decoded
+
+
+def decode_tls_client_hello(payload: bytes) -> Optional[Dict[str, Any]]:
+    """Decode SNI and offered versions from a TLS ClientHello in one segment"""
+    try:
+        if payload[0] != 22 or payload[1] != 3 or payload[5] != 1:
+            return None
+        record_version = struct.unpack_from('!H', payload, 1)[0]
+        client_version = struct.unpack_from('!H', payload, 9)[0]
+        offset = 9 + 2 + 32
+        offset += 1 + payload[offset]  # session id
+        cipher_bytes = struct.unpack_from('!H', payload, offset)[0]
+        offset += 2 + cipher_bytes
+        offset += 1 + payload[offset]  # compression methods
+        sni, versions = None, []
+        if offset + 2 <= len(payload):
+            extensions_end = offset + 2 + struct.unpack_from('!H', payload, offset)[0]
+            offset += 2
+            while offset + 4 <= min(extensions_end, len(payload)):
+                ext_type, ext_length = struct.unpack_from('!HH', payload, offset)
+                body = payload[offset + 4:offset + 4 + ext_length]
+                if ext_type == 0 and len(body) >= 5 and body[2] == 0:
+                    name_length = struct.unpack_from('!H', body, 3)[0]
+                    sni = body[5:5 + name_length].decode('ascii', 'replace')
+                elif ext_type == 43 and body:
+                    versions = [v for v in struct.unpack_from(f'!{body[0] // 2}H', body, 1)
+                                if v & 0x0f0f != 0x0a0a]  # skip GREASE values
+                offset += 4 + ext_length
+    except (struct.error, IndexError):
+        return None
+    highest = max(versions or [client_version])
+    return {'sni': sni, 'record_version': TLS_VERSIONS.get(record_version, hex(record_version)),
+            'client_version': TLS_VERSIONS.get(client_version, hex(client_version)),
+            'highest_version': TLS_VERSIONS.get(highest, hex(highest)), 'highest_version_code': highest,
+            'cipher_suites': cipher_bytes // 2}
+
+
+def decode_http_request(payload: bytes) -> Optional[Dict[str, Any]]:
+    """Decode the request line and Host/User-Agent headers of an HTTP request"""
+    if not payload.startswith(HTTP_METHODS):
+        return None
+    head = payload.split(b'\r\n\r\n', 1)[0].decode('latin-1').split('\r\n')
+    parts = head[0].split(' ')
+    if len(parts) != 3 or not parts[2].startswith('HTTP/'):
+        return None
+    headers = {}
+    for line in head[1:]:
+        name, sep, value = line.partition(':')
+        if sep:
+            headers[name.strip().lower()] = value.strip()
+    return {'method': parts[0], 'path': parts[1][:200], 'version': parts[2], 'host': headers.get('host'),
+            'user_agent': headers.get('user-agent')}
+
+
+def decode_payload(fields: Tuple, payload: bytes) -> Optional[Tuple[str, Dict[str, Any]]]:
+    """Pick and run the decoder for a payload; returns ``(kind, decoded)`` or None"""
+    if not payload:
+        return None
+    _, _, proto, src_port, dst_port = fields
+    if src_port in SERVICE_PORTS['dns'] or dst_port in SERVICE_PORTS['dns']:
+        decoded = decode_dns(payload, tcp=proto == 6)
+        return ('dns', decoded) if decoded else None
+    if proto != 6:
+        return None
+    if payload[0] == 22:
+        decoded = decode_tls_client_hello(payload)
+        return ('tls', decoded) if decoded else None
+    decoded = decode_http_request(payload)
+    return ('http', decoded) if decoded else None
+
+
+def pair_selector(pairs: Iterable[Tuple[str, str]]) -> Callable[[Tuple], bool]:
+    """Select traffic between any of the given address pairs, in either direction"""
+    wanted = set()
+    for src_ip, dst_ip in pairs:
+        wanted.add((address_key(src_ip), address_key(dst_ip)))
+        wanted.add((address_key(dst_ip), address_key(src_ip)))
+    return lambda fields: (fields[0], fields[1]) in wanted
+
+
+def flow_selector(src_ip: str, dst_ip: Optional[str] = None, src_port: Optional[int] = None,
+                  dst_port: Optional[int] = None) -> Callable[[Tuple], bool]:
+    """Select one flow (or a host, when only ``src_ip`` is given) in either direction"""
+    a, b = address_key(src_ip), address_key(dst_ip) if dst_ip else None
+
+    def select(fields):
+        src, dst, _, sport, dport = fields
+        if src == a and (b is None or dst == b):
+            return (src_port is None or sport == src_port) and (dst_port is None or dport == dst_port)
+        if dst == a and (b is None or src == b):
+            return (src_port is None or dport == src_port) and (dst_port is None or sport == dst_port)
+        return False
+    return select
+
+
+def service_selector(services: Iterable[str]) -> Callable[[Tuple], bool]:
+    """Select flows on the well-known ports of the named services (dns, tls, http)"""
+    ports = set()
+    for service in services:
+        if service not in SERVICE_PORTS:
+            raise ValueError(f"unknown service {service!r}; expected one of {', '.join(SERVICE_PORTS)}")
+        ports |= SERVICE_PORTS[service]
+    return lambda fields: fields[3] in ports or fields[4] in ports
+
+
+def flow_indicators(flow: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Derive tunneling and weak-TLS indicators from a flow's decoded items"""
+    indicators = []
+    suspicious = flow['counts'].get('suspicious_dns', 0)
+    if suspicious >= TUNNEL_MIN_QUERIES or (suspicious and flow['counts'].get('txt_dns')):
+        # Only the first MAX_ITEMS queries are kept, so the example is recorded as it is counted
+        example = flow.get('suspicious_example') or next(
+            (q['query'] for q in flow['dns'] if q.get('suspicious')), None)
+        indicators.append({'type': 'dns_tunneling', 'severity': 'High',
+                           'detail': f"{suspicious} long/high-entropy queries"
+                                     + (f", e.g. {example}" if example else "")})
+    for hello in flow['tls']:
+        if hello['highest_version_code'] < 0x0303:
+            indicators.append({'type': 'weak_tls', 'severity': 'Medium',
+                               'detail': f"client offers at most {hello['highest_version']}"
+                                         + (f" to {hello['sni']}" if hello['sni'] else "")})
+            break
+    if flow['tls'] and not any(hello['sni'] for hello in flow['tls']):
+        indicators.append({'type': 'tls_without_sni', 'severity': 'Low', 'detail': 'ClientHello carries no SNI'})
+    return indicators
+
+
+def _suspicious_name(name: str) -> bool:
+    longest = max(name.split('.'), key=len) if name else ''
+    return len(name) >= TUNNEL_NAME_LENGTH or (
+        len(longest) >= TUNNEL_LABEL_LENGTH and _entropy(longest) >= TUNNEL_LABEL_ENTROPY)
+
+
+def inspect_capture(path: str, select: Callable[[Tuple], bool], max_flows: int = 500,
+                    max_packets_per_flow: int = 200) -> Dict[str, Any]:
+    """Decode application-layer details for the selected packets of a classic pcap
+
+    Packets are selected on raw header fields, so unselected traffic is
+    never decoded. Flows are keyed direction-independently; each reports
+    its decoded DNS, TLS and HTTP items and the indicators derived from them.
+    Only the first ``max_flows`` flows seen and the first
+    ``max_packets_per_flow`` packets of each are inspected.
+    """
+    reader = PcapStreamReader(path)
+    flows = {}
+    selected = decoded = 0
+    for _, _, data in reader:
+        fields = header_fields(data, reader.linktype)
+        if fields[0] is None or not select(fields):
+            continue
+        src, dst, proto, sport, dport = fields
+        # Each DNS query uses a fresh client port; group them per client and resolver
+        if dport in SERVICE_PORTS['dns']:
+            sport = 0
+        elif sport in SERVICE_PORTS['dns']:
+            dport = 0
+        key = (proto,) + tuple(sorted(((src, sport), (dst, dport))))
+        flow = flows.get(key)
+        if flow is None:
+            if len(flows) >= max_flows:
+                continue
+            flow = flows[key] = {
+                'src_ip': key_text(src), 'dst_ip': key_text(dst),
+                'src_port': sport or None, 'dst_port': dport or None, 'protocol': PROTOCOLS.get(proto, proto),
+                'packets_inspected': 0, 'counts': Counter(), 'dns': [], 'tls': [], 'http': []
+            }
+        if flow['packets_inspected'] >= max_packets_per_flow:
+            continue
+        flow['packets_inspected'] += 1
+        selected += 1
+        # Only now is the payload sliced out of the frame
+        _, payload = transport_payload(data, reader.linktype, fields)
+        result = decode_payload(fields, payload)
+        if result is None:
+            continue
+        kind, item = result
+        decoded += 1
+        flow['counts'][kind] += 1
+        if kind == 'dns' and not item['response']:
+            item['suspicious'] = _suspicious_name(item['query'])
+            flow['counts']['suspicious_dns'] += item['suspicious']
+            if item['suspicious']:
+                flow.setdefault('suspicious_example', item['query'])
+            flow['counts']['txt_dns'] += item['qtype'] in ('TXT', 'NULL')
+        if len(flow[kind]) < MAX_ITEMS:
+            flow[kind].append(item)
+
+    results = []
+    for flow in flows.values():
+        flow['indicators'] = flow_indicators(flow)
+        flow.pop('suspicious_example', None)
+        flow['counts'] = dict(flow['counts'])
+        for hello in flow['tls']:
+            hello.pop('highest_version_code', None)
+        results.append(flow)
+    results.sort(key=lambda f: (-len(f['indicators']), -f['packets_inspected']))
+    return {'records_scanned': reader.records, 'packets_selected': selected, 'packets_decoded': decoded,
+            'flows': results}
+
+
+def summarize_pairs(inspection: Dict[str, Any]) -> Dict[frozenset, Dict[str, Any]]:
+    """Group an inspection's flows by unordered address pair, for attaching to anomalies"""
+    pairs = {}
+    for flow in inspection['flows']:
+        summary = pairs.setdefault(frozenset((flow['src_ip'], flow['dst_ip'])), {
+            'dns_queries': [], 'tls_sni': [], 'http_hosts': [], 'indicators': []})
+        summary['dns_queries'].extend(q['query'] for q in flow['dns'] if not q['response'])
+        summary['tls_sni'].extend(h['sni'] for h in flow['tls'] if h['sni'])
+        summary['http_hosts'].extend(r['host'] for r in flow['http'] if r['host'])
+        summary['indicators'].extend(flow['indicators'])
+    for summary in pairs.values():
+        for key in ('dns_queries', 'tls_sni', 'http_hosts'):
+            summary[key] = list(dict.fromkeys(summary[key]))[:10]
+    return pairs
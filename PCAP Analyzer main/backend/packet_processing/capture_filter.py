@@ -0,0 +1,283 @@
+import ipaddress
+import re
+from datetime import datetime, timezone
+from typing import Dict, Any, Callable, Optional, Tuple
+
+from packet_processing.endpoints import IPV6_TAG, address_key
+
+# IP protocol numbers of the protocol primitives
+IP_PROTOCOLS = {'tcp': 6, 'udp': 17, 'icmp': 1}
+PORT_PROTOCOLS = (6, 17)
+
+_TOKEN = re.compile(r'\s*(\(|\)|&&|\|\||!|[^\s()!]+)')
+
+# Predicates take the ``(src, dst, ip_proto, src_port, dst_port)`` tuple
+# produced by ``pcap_stream.header_fields``
+Predicate = Callable[[Tuple], bool]
+
+
+class FilterError(ValueError):
+    """Raised for filter expressions or time bounds that cannot be parsed"""
+
+
+def parse_time(value) -> Optional[float]:
+    """Parse an epoch number or ISO 8601 string (naive times are UTC) into epoch seconds"""
+    if value is None or value == '':
+        return None
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        pass
+    try:
+        parsed = datetime.fromisoformat(str(value).replace('Z', '+00:00'))
+    except ValueError:
+        raise FilterError(f"invalid time bound: {value!r}")
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.timestamp()
+
+
+class _Node:
+    """One compiled piece of the expression: a raw predicate and its display filter"""
+
+    def __init__(self, predicate: Predicate, display: str):
+        self.predicate = predicate
+        self.display = display
+
+
+def _address(value: str) -> Tuple[int, str]:
+    """The ``endpoints.address_key`` of an IPv4/IPv6 address and its display filter field"""
+    try:
+        key = address_key(value)
+    except ValueError:
+        raise FilterError(f"not an IP address: {value!r}")
+    return key, 'ipv6' if key & IPV6_TAG else 'ip'
+
+
+def _network(value: str) -> Tuple[int, int, str, str]:
+    """Network key, mask, text and display field; the mask keeps IPv4 and IPv6 apart"""
+    try:
+        network = ipaddress.ip_network(value, strict=False)
+    except ValueError:
+        raise FilterError(f"not an IP network: {value!r}")
+    tag = IPV6_TAG if network.version == 6 else 0
+    return (int(network.network_address) | tag, int(network.netmask) | IPV6_TAG, str(network),
+            'ipv6' if tag else 'ip')
+
+
+def _port(value: str) -> int:
+    if not value.isdigit() or int(value) > 65535:
+        raise FilterError(f"not a port number: {value!r}")
+    return int(value)
+
+
+def _primitive(kind: str, direction: Optional[str], proto: Optional[str], value: str) -> _Node:
+    """Compile one ``[proto] [src|dst] kind value`` primitive"""
+    if kind == 'host':
+        address, layer = _address(value)
+        if direction == 'src':
+            return _Node(lambda f: f[0] == address, f"{layer}.src == {value}")
+        if direction == 'dst':
+            return _Node(lambda f: f[1] == address, f"{layer}.dst == {value}")
+        return _Node(lambda f: f[0] == address or f[1] == address, f"{layer}.addr == {value}")
+
+    if kind == 'net':
+        network, mask, text, layer = _network(value)
+
+        def in_net(address):
+            return address is not None and address & mask == network
+        if direction == 'src':
+            return _Node(lambda f: in_net(f[0]), f"{layer}.src == {text}")
+        if direction == 'dst':
+            return _Node(lambda f: in_net(f[1]), f"{layer}.dst == {text}")
+        return _Node(lambda f: in_net(f[0]) or in_net(f[1]), f"{layer}.addr == {text}")
+
+    # port / portrange
+    if kind == 'portrange':
+        low, sep, high = value.partition('-')
+        if not sep:
+            raise FilterError(f"portrange needs low-high: {value!r}")
+        low, high = _port(low), _port(high)
+        display_value = f"in {{{low}..{high}}}"
+    else:
+        low = high = _port(value)
+        display_value = f"== {low}"
+    protocols = (IP_PROTOCOLS[proto],) if proto else PORT_PROTOCOLS
+    field = {'src': 'srcport', 'dst': 'dstport'}.get(direction, 'port')
+    display = " || ".join(f"{name}.{field} {display_value}" for name in ((proto,) if proto else ('tcp', 'udp')))
+    if direction == 'src':
+        predicate = lambda f: f[2] in protocols and low <= f[3] <= high  # noqa: E731
+    elif direction == 'dst':
+        predicate = lambda f: f[2] in protocols and low <= f[4] <= high  # noqa: E731
+    else:
+        predicate = lambda f: f[2] in protocols and (low <= f[3] <= high or low <= f[4] <= high)  # noqa: E731
+    return _Node(predicate, f"({display})")
+
+
+class _Parser:
+    """Recursive-descent parser for the supported subset of BPF syntax
+
+    Like tcpdump, a bare value after ``and``/``or`` reuses the previous
+    primitive's qualifiers, so ``port 80 or 443`` means ``port 80 or port 443``.
+    """
+
+    def __init__(self, expression: str):
+        self.tokens = [t.lower() for t in _TOKEN.findall(expression)]
+        if ''.join(self.tokens) != re.sub(r'\s+', '', expression.lower()):
+            raise FilterError(f"cannot tokenize filter: {expression!r}")
+        self.position = 0
+        self.last = None
+
+    def peek(self) -> Optional[str]:
+        return self.tokens[self.position] if self.position < len(self.tokens) else None
+
+    def take(self) -> str:
+        token = self.peek()
+        if token is None:
+            raise FilterError("unexpected end of filter")
+        self.position += 1
+        return token
+
+    def parse(self) -> _Node:
+        node = self.parse_or()
+        if self.peek() is not None:
+            raise FilterError(f"unexpected {self.peek()!r} in filter")
+        return node
+
+    def parse_or(self) -> _Node:
+        node = self.parse_and()
+        while self.peek() in ('or', '||'):
+            self.take()
+            left, right = node, self.parse_and()
+            node = _Node(lambda f, a=left.predicate, b=right.predicate: a(f) or b(f),
+                         f"({left.display} || {right.display})")
+        return node
+
+    def parse_and(self) -> _Node:
+        node = self.parse_not()
+        while self.peek() in ('and', '&&'):
+            self.take()
+            left, right = node, self.parse_not()
+            node = _Node(lambda f, a=left.predicate, b=right.predicate: a(f) and b(f),
+                         f"({left.display} && {right.display})")
+        return node
+
+    def parse_not(self) -> _Node:
+        if self.peek() in ('not', '!'):
+            self.take()
+            inner = self.parse_not()
+            return _Node(lambda f, a=inner.predicate: not a(f), f"!{inner.display}")
+        if self.peek() == '(':
+            self.take()
+            node = self.parse_or()
+            if self.take() != ')':
+                raise FilterError("missing ')' in filter")
+            return node
+        return self.parse_primitive()
+
+    def parse_primitive(self) -> _Node:
+        token = self.take()
+        proto = direction = None
+        if token in IP_PROTOCOLS or token in ('ip', 'ip6'):
+            nxt = self.peek()
+            if token in ('ip', 'ip6') or nxt not in ('src', 'dst', 'port', 'portrange'):
+                if token == 'ip':
+                    return _Node(lambda f: f[0] is not None and f[0] < IPV6_TAG, 'ip')
+                if token == 'ip6':
+                    return _Node(lambda f: f[0] is not None and f[0] >= IPV6_TAG, 'ipv6')
+                number = IP_PROTOCOLS[token]
+                return _Node(lambda f: f[2] == number, token)
+            if token == 'icmp':
+                raise FilterError("icmp has no ports")
+            proto, token = token, self.take()
+        if token in ('src', 'dst'):
+            direction, token = token, self.take()
+        if token in ('host', 'net', 'port', 'portrange'):
+            kind, value = token, self.take()
+        elif direction is not None and not proto:
+            # "src 10.0.0.1" means "src host 10.0.0.1"
+            kind, value = 'host', token
+        elif self.last is not None and proto is None and direction is None:
+            kind, direction, proto = self.last
+            value = token
+        else:
+            raise FilterError(f"unsupported filter primitive {token!r}")
+        if proto and kind not in ('port', 'portrange'):
+            raise FilterError(f"{proto} {kind} is not supported")
+        self.last = (kind, direction, proto)
+        return _primitive(kind, direction, proto, value)
+
+
+class CaptureFilter:
+    """A BPF-style expression and/or time bounds, compiled for each parse path.
+
+    Supports ``host`` and ``net`` (CIDR) for IPv4 and IPv6, ``port`` and
+    ``portrange`` with optional ``src``/``dst`` and ``tcp``/``udp``
+    qualifiers, the ``ip``, ``ip6``, ``tcp``, ``udp`` and ``icmp`` protocols,
+    ``and``/``or``/``not`` and parentheses. The same filter yields a predicate over raw header fields
+    (``matches_raw``), an equivalent TShark display filter
+    (``display_filter``) and a check for decoded packet dicts (``matches``).
+    """
+
+    def __init__(self, expression: Optional[str] = None, start: Optional[float] = None,
+                 end: Optional[float] = None):
+        self.expression = (expression or '').strip() or None
+        self.start = start
+        self.end = end
+        if start is not None and end is not None and end < start:
+            raise FilterError("end time is before start time")
+        self._node = _Parser(self.expression).parse() if self.expression else None
+        self.matches_raw = self._node.predicate if self._node else (lambda fields: True)
+
+    @classmethod
+    def from_params(cls, params) -> Optional['CaptureFilter']:
+        """Build a filter from request parameters, or None when none are given"""
+        capture_filter = cls(params.get('filter'), parse_time(params.get('start_time')),
+                             parse_time(params.get('end_time')))
+        return capture_filter if capture_filter.active else None
+
+    @property
+    def active(self) -> bool:
+        return self.expression is not None or self.start is not None or self.end is not None
+
+    @property
+    def has_time_bounds(self) -> bool:
+        return self.start is not None or self.end is not None
+
+    def in_time(self, timestamp: float) -> bool:
+        return (self.start is None or timestamp >= self.start) and (self.end is None or timestamp <= self.end)
+
+    def display_filter(self) -> Optional[str]:
+        """The filter as a TShark/Wireshark display filter"""
+        parts = []
+        if self._node is not None:
+            parts.append(self._node.display)
+        if self.start is not None:
+            parts.append(f"frame.time_epoch >= {self.start:.6f}")
+        if self.end is not None:
+            parts.append(f"frame.time_epoch <= {self.end:.6f}")
+        return " && ".join(parts) or None
+
+    def matches(self, packet: Dict[str, Any]) -> bool:
+        """Apply the filter to an already decoded packet dict"""
+        if not self.in_time(packet.get('timestamp', 0)):
+            return False
+        if self._node is None:
+            return True
+        return self.matches_raw(_packet_fields(packet))
+
+    def describe(self) -> Dict[str, Any]:
+        return {'expression': self.expression, 'start_time': self.start, 'end_time': self.end}
+
+
+def _packet_fields(packet: Dict[str, Any]) -> Tuple:
+    def address(value):
+        try:
+            return address_key(value)
+        except ValueError:
+            return None
+    proto = {'TCP': 6, 'UDP': 17, 'ICMP': 1}.get(packet.get('protocol'))
+    src = address(packet.get('src_ip'))
+    return (src, address(packet.get('dst_ip')), proto if src is not None else None,
+            packet.get('src_port') or 0, packet.get('dst_port') or 0)
+
@@ -0,0 +1,207 @@
+import bz2
+import gzip
+import io
+import lzma
+import os
+import stat
+import threading
+from typing import BinaryIO, Iterable, Iterator, Optional
+
+try:
+    import zstandard
+except ImportError:  # optional: only needed for .zst captures
+    zstandard = None
+
+# Read size for compressed captures. Decompressors are called once per
+# buffer instead of once per 16-byte record header.
+READ_BUFFER_SIZE = int(os.environ.get('DECOMPRESS_BUFFER_KB', '1024')) * 1024
+
+# Leading bytes of each supported container, checked in order
+MAGIC = (
+    (b'\x1f\x8b', 'gzip'),
+    (b'\x28\xb5\x2f\xfd', 'zstd'),
+    (b'\xfd7zXZ\x00', 'xz'),
+    (b'BZh', 'bzip2'),
+)
+COMPRESSED_EXTENSIONS = ('.gz', '.zst', '.xz', '.bz2')
+
+# What reading a corrupt or truncated compressed capture can raise
+DECOMPRESSION_ERRORS = (OSError, EOFError, lzma.LZMAError) + ((zstandard.ZstdError,) if zstandard else ())
+
+# Linux-only fcntl to grow a pipe beyond its 64 KB default
+_F_SETPIPE_SZ = 1031
+
+
+class UnsupportedCompression(ValueError):
+    """Raised for a compressed capture whose decompressor is not installed"""
+
+
+def detect_compression(path: str) -> Optional[str]:
+    """Name of the compression of a regular file from its magic bytes, or None
+
+    FIFOs and other special files are never read here, since peeking at
+    them would consume the stream.
+    """
+    try:
+        if not stat.S_ISREG(os.stat(path).st_mode):
+            return None
+        with open(path, 'rb') as f:
+            head = f.read(6)
+    except OSError:
+        return None
+    for magic, name in MAGIC:
+        if head.startswith(magic):
+            return name
+    return None
+
+
+def check_decompressor(path: str) -> Optional[str]:
+    """Return the compression of ``path``, raising ``UnsupportedCompression`` if it cannot be decoded here"""
+    compression = detect_compression(path)
+    if compression == 'zstd' and zstandard is None:
+        raise UnsupportedCompression("zstd-compressed capture: install the 'zstandard' package")
+    return compression
+
+
+class _DecompressedStream(io.RawIOBase):
+    """Raw stream over a decompressor: seeks forward only, and ends at truncation
+
+    Captures archived while still being written end mid-stream; like a
+    truncated plain capture, everything decoded up to that point is read
+    and the stream then ends (``truncated`` is set).
+    """
+
+    def __init__(self, stream, compressed_file):
+        self._stream = stream
+        self._compressed_file = compressed_file
+        self._position = 0
+        self.truncated = False
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        # Forward seeks (skipping record bodies) are supported
+        return True
+
+    def readinto(self, buffer) -> int:
+        try:
+            data = self._stream.read1(len(buffer))
+        except EOFError:
+            self.truncated = True
+            data = b''
+        size = len(data)
+        buffer[:size] = data
+        self._position += size
+        return size
+
+    def seek(self, offset: int, whence: int = os.SEEK_SET) -> int:
+        target = offset if whence == os.SEEK_SET else self._position + offset
+        if whence not in (os.SEEK_SET, os.SEEK_CUR) or target < self._position:
+            raise io.UnsupportedOperation("compressed captures only seek forward")
+        while self._position < target and self.read(min(target - self._position, READ_BUFFER_SIZE)):
+            pass
+        return self._position
+
+    def tell(self) -> int:
+        return self._position
+
+    def fileno(self) -> int:
+        return self._compressed_file.fileno()
+
+    def close(self):
+        if not self.closed:
+            try:
+                self._stream.close()
+            finally:
+                self._compressed_file.close()
+        super().close()
+
+
+class _DecompressedReader(io.BufferedReader):
+    """Buffered reader of a decompressed capture, tagged with its compression"""
+
+    def __init__(self, raw: _DecompressedStream, buffer_size: int, compression: str):
+        super().__init__(raw, buffer_size)
+        self.compression = compression
+
+
+def open_capture(path: str, buffer_size: int = READ_BUFFER_SIZE) -> BinaryIO:
+    """Open a capture for sequential reading, decompressing it on the fly
+
+    Plain captures are opened with a ``buffer_size`` read buffer. gzip, zstd,
+    xz and bzip2 files are decoded as a stream; nothing is expanded on disk.
+    Compressed streams only seek forward (by decompressing and discarding),
+    and carry the compression name in a ``compression`` attribute.
+    """
+    compression = check_decompressor(path)
+    if compression is None:
+        return open(path, 'rb', buffering=buffer_size)
+    compressed_file = open(path, 'rb', buffering=buffer_size)
+    try:
+        if compression == 'gzip':
+            stream = gzip.GzipFile(fileobj=compressed_file, mode='rb')
+        elif compression == 'xz':
+            stream = lzma.LZMAFile(compressed_file)
+        elif compression == 'bzip2':
+            stream = bz2.BZ2File(compressed_file)
+        else:
+            stream = zstandard.ZstdDecompressor().stream_reader(compressed_file, read_size=buffer_size,
+                                                                read_across_frames=True, closefd=False)
+        return _DecompressedReader(_DecompressedStream(stream, compressed_file), buffer_size, compression)
+    except Exception:
+        compressed_file.close()
+        raise
+
+
+def pipe_chunks(chunks: Iterable[bytes], buffer_size: int = READ_BUFFER_SIZE, name: str = 'capture') -> int:
+    """Write byte chunks into a pipe from a background thread; returns the read end
+
+    This feeds programs that take a capture on stdin (``tshark -r -``)
+    without staging it on disk. The caller owns the returned descriptor;
+    closing it early stops the thread. The pipe is closed only after
+    ``chunks`` is exhausted, so whatever the iterable does after its last
+    chunk is finished by the time the reader sees end of file.
+    """
+    read_fd, write_fd = os.pipe()
+    try:
+        import fcntl
+        fcntl.fcntl(write_fd, _F_SETPIPE_SZ, buffer_size)
+    except (ImportError, OSError):
+        pass
+
+    def feed():
+        out = os.fdopen(write_fd, 'wb', buffering=buffer_size)
+        try:
+            for chunk in chunks:
+                out.write(chunk)
+            out.flush()
+        except BrokenPipeError:
+            pass
+        except Exception as e:
+            print(f"Feeding {name} stopped: {e}")
+        finally:
+            close = getattr(chunks, 'close', None)
+            if close is not None:
+                close()
+            try:
+                out.close()
+            except BrokenPipeError:
+                pass
+
+    threading.Thread(target=feed, name='capture-pipe', daemon=True).start()
+    return read_fd
+
+
+def _read_chunks(path: str, buffer_size: int) -> Iterator[bytes]:
+    with open_capture(path, buffer_size) as f:
+        while True:
+            chunk = f.read(buffer_size)
+            if not chunk:
+                return
+            yield chunk
+
+
+def pipe_capture(path: str, buffer_size: int = READ_BUFFER_SIZE) -> int:
+    """Decompress a capture into a pipe (see ``pipe_chunks``); returns the read end"""
+    return pipe_chunks(_read_chunks(path, buffer_size), buffer_size, path)
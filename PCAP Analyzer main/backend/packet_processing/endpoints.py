@@ -0,0 +1,101 @@
+import socket
+from typing import Dict, Any, Iterable, List, Mapping, Optional
+
+# Set on integer keys of IPv6 addresses, so they never equal an IPv4 key
+IPV6_TAG = 1 << 128
+_IPV6_MASK = IPV6_TAG - 1
+
+# Packet, flow and anomaly fields that hold an endpoint
+ENDPOINT_FIELDS = ('src_ip', 'dst_ip')
+
+
+def packed_key(packed: bytes) -> int:
+    """Integer key of a 4-byte IPv4 or 16-byte IPv6 address as found in a header"""
+    key = int.from_bytes(packed, 'big')
+    return key | IPV6_TAG if len(packed) == 16 else key
+
+
+def address_key(address: str) -> int:
+    """Integer key of an IPv4 or IPv6 address string; ValueError if it is neither"""
+    try:
+        if ':' in address:
+            return int.from_bytes(socket.inet_pton(socket.AF_INET6, address), 'big') | IPV6_TAG
+        return int.from_bytes(socket.inet_pton(socket.AF_INET, address), 'big')
+    except (OSError, TypeError):
+        raise ValueError(f"not an IP address: {address!r}")
+
+
+def key_text(key: int) -> str:
+    """The address string of an integer key"""
+    if key & IPV6_TAG:
+        return socket.inet_ntop(socket.AF_INET6, (key & _IPV6_MASK).to_bytes(16, 'big'))
+    return socket.inet_ntoa(key.to_bytes(4, 'big'))
+
+
+class EndpointDictionary:
+    """Dense integer IDs for the IPv4 and IPv6 addresses seen in one analysis.
+
+    Each distinct address string is stored once. Packets, flows and
+    features then carry small integers that are cheap to hash, group and
+    keep in memory, and the strings are put back only where results leave
+    the analysis (``restore``).
+    """
+
+    def __init__(self):
+        self._ids: Dict[str, int] = {}
+        self._addresses: List[str] = []
+
+    def __len__(self) -> int:
+        return len(self._addresses)
+
+    def intern(self, address: str) -> int:
+        """Return the ID of ``address``, assigning the next one if it is new"""
+        endpoint_id = self._ids.get(address)
+        if endpoint_id is None:
+            endpoint_id = self._ids[address] = len(self._addresses)
+            self._addresses.append(address)
+        return endpoint_id
+
+    def address(self, endpoint_id) -> str:
+        # Pandas hands IDs back as numpy or float values
+        return self._addresses[int(endpoint_id)]
+
+    def intern_packet(self, packet: Dict[str, Any]) -> Dict[str, Any]:
+        """Replace the address strings of a packet dict with IDs, in place"""
+        for field in ENDPOINT_FIELDS:
+            address = packet.get(field)
+            if address is not None:
+                packet[field] = self.intern(address)
+        return packet
+
+    def restore(self, record: Dict[str, Any]) -> Dict[str, Any]:
+        """Replace the endpoint IDs of a packet, flow or anomaly record with address strings, in place"""
+        for field in ENDPOINT_FIELDS:
+            endpoint_id = record.get(field)
+            # NaN (an absent address in a DataFrame row) is not equal to itself
+            if endpoint_id is not None and endpoint_id == endpoint_id and not isinstance(endpoint_id, str):
+                record[field] = self.address(endpoint_id)
+        return record
+
+    def restore_keys(self, counts: Mapping) -> Dict[str, Any]:
+        """Re-key a mapping of endpoint ID to value by address string"""
+        return {self.address(endpoint_id): value for endpoint_id, value in counts.items()}
+
+
+class InternedPackets(list):
+    """A list of packet dicts whose addresses are IDs in ``endpoints``"""
+
+    def __init__(self, packets: Iterable[Dict[str, Any]] = (), endpoints: Optional[EndpointDictionary] = None):
+        super().__init__(packets)
+        self.endpoints = endpoints if endpoints is not None else EndpointDictionary()
+
+
+def intern_packets(packets: Iterable[Dict[str, Any]]) -> InternedPackets:
+    """Intern the addresses of parsed packet dicts (in place) into a new dictionary"""
+    endpoints = EndpointDictionary()
+    return InternedPackets((endpoints.intern_packet(packet) for packet in packets), endpoints)
+
+
+def endpoints_of(packets) -> Optional[EndpointDictionary]:
+    """The dictionary behind interned packets, or None for packets carrying address strings"""
+    return getattr(packets, 'endpoints', None)
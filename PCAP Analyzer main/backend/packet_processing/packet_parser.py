@@ -1,9 +1,45 @@
 import pyshark
+from pyshark.capture.pipe_capture import PipeCapture
 import pandas as pd
 import numpy as np
 from datetime import datetime
 import os
 import logging
+import time
+
+from packet_processing.compression import detect_compression, pipe_capture, pipe_chunks
+from packet_processing.endpoints import EndpointDictionary, InternedPackets, endpoints_of, intern_packets
+from packet_processing.pcap_stream import header_fields, is_classic_pcap, parse_global_header
+from packet_processing.record_index import iter_records, load_index, pcap_header
+
+# How often (in packets, then seconds) parse progress is reported
+PROGRESS_CHECK_INTERVAL = 500
+PROGRESS_MIN_SECONDS = 0.5
+
+
+class ParsedCapture(InternedPackets):
+    """Interned packets from one ``parse_pcap`` call, with that call's own ``stats``
+
+    ``PacketParser.stats`` accumulates totals over every capture the parser
+    has seen and is shared by concurrent requests; everything describing a
+    single capture (protocols, services, duration, flows, capture filter,
+    sampling estimate, compression) is returned here instead.
+    """
+
+    def __init__(self, packets=(), endpoints=None, stats=None):
+        super().__init__(packets, endpoints)
+        self.stats = stats if stats is not None else {}
+
+    @classmethod
+    def of(cls, packets, stats=None):
+        """Intern packet dicts (in place) and count their protocols into ``stats``"""
+        interned = intern_packets(packets)
+        protocols = {}
+        for packet in interned:
+            protocol = packet.get('protocol', 'Unknown')
+            protocols[protocol] = protocols.get(protocol, 0) + 1
+        return cls(interned, interned.endpoints, dict(stats or {}, protocols=protocols))
+
 
 class PacketParser:
     def __init__(self):
@@ -24,20 +60,61 @@ class PacketParser:
             print("TShark not found. Please install Wireshark/TShark for PCAP parsing.")
             return False
     
-    def parse_pcap(self, file_path):
-        """Parse a PCAP file and extract detailed features for analysis"""
+    def parse_pcap(self, file_path, progress=None, capture_filter=None, index_path=None, sampler=None):
+        """Parse a PCAP file and extract detailed features for analysis
+
+        ``progress`` is an optional ``progress(stage, **data)`` callback that
+        receives periodic parse rates and partial protocol counts.
+        ``capture_filter`` is an optional ``CaptureFilter``; only matching
+        packets are dissected (see ``_push_down``). ``index_path`` is where
+        the capture's record index is cached for time-bounded filters.
+        ``sampler`` is an optional ``FlowSampler``; only the flows it keeps
+        are parsed and the scaled-up totals are returned under ``sampling``.
+        IPv4 and IPv6 addresses are interned: the returned ``ParsedCapture``
+        carries endpoint IDs, and its ``endpoints`` dictionary maps them back.
+        Its ``stats`` describe this capture alone: ``protocols``,
+        ``services``, ``duration``, ``flows``, ``capture_filter`` (push-down
+        statistics when a filter was given), ``sampling`` and ``compression``.
+        gzip/zstd/xz/bzip2-compressed captures are decompressed as a stream
+        in the same single pass; see ``compression.open_capture``.
+        """
+        stats = {'capture_filter': None, 'sampling': None, 'compression': detect_compression(file_path)}
+        compression = stats['compression']
         if not self.tshark_available:
             print(f"Cannot parse {file_path}: TShark not available")
-            return self._get_sample_packet_data()
+            sample_data = self._get_sample_packet_data()
+            if capture_filter is not None:
+                sample_data = [p for p in sample_data if capture_filter.matches(p)]
+            if sampler is not None:
+                sample_data = [p for p in sample_data if sampler.keep_packet(p)]
+                stats['sampling'] = sampler.estimate(sample_data)
+            return ParsedCapture.of(sample_data, stats)
+        
+        parse_path, display_filter, post_sampler = file_path, None, None
+        if capture_filter is not None or sampler is not None:
+            parse_path, display_filter, post_sampler = self._push_down(file_path, capture_filter, sampler,
+                                                                       index_path, progress, stats)
             
+        cap = None
         try:
-            packets = []
-            cap = pyshark.FileCapture(file_path)
+            endpoints = EndpointDictionary()
+            protocol_counts = stats['protocols'] = {}
+            packets = ParsedCapture(endpoints=endpoints, stats=stats)
+            if isinstance(parse_path, int):
+                # TShark reads the pushed-down records from a pipe on stdin
+                cap = PipeCapture(pipe=parse_path, display_filter=display_filter)
+            elif compression:
+                # TShark reads the decompressed bytes from a pipe on stdin
+                cap = PipeCapture(pipe=pipe_capture(file_path), display_filter=display_filter)
+            else:
+                cap = pyshark.FileCapture(parse_path, display_filter=display_filter)
             
             # Track additional information
             services = {}
             first_timestamp = None
             last_timestamp = None
+            parse_started = time.time()
+            last_report = parse_started
             
             for packet in cap:
                 try:
@@ -52,6 +129,7 @@ class PacketParser:
                         'length': int(packet.length),
                         'protocol': packet.transport_layer if hasattr(packet, 'transport_layer') else 'Unknown'
                     }
+                    packet_services = []
                     
                     # Add IP layer features
                     if hasattr(packet, 'ip'):
@@ -60,6 +138,12 @@ class PacketParser:
                             'dst_ip': packet.ip.dst,
                             'ttl': int(packet.ip.ttl)
                         })
+                    elif hasattr(packet, 'ipv6'):
+                        packet_dict.update({
+                            'src_ip': packet.ipv6.src,
+                            'dst_ip': packet.ipv6.dst,
+                            'ttl': int(packet.ipv6.hlim)
+                        })
                     
                     # Add TCP/UDP features and detect services
                     if hasattr(packet, 'tcp'):
@@ -73,11 +157,9 @@ class PacketParser:
                         
                         # Detect common services
                         if dst_port in [80, 443]:
-                            service = f"HTTP/HTTPS (port {dst_port})"
-                            services[service] = services.get(service, 0) + 1
+                            packet_services.append(f"HTTP/HTTPS (port {dst_port})")
                         elif dst_port == 53:
-                            service = "DNS"
-                            services[service] = services.get(service, 0) + 1
+                            packet_services.append("DNS")
                         # Add more service detection logic here
                         
                     elif hasattr(packet, 'udp'):
@@ -90,11 +172,9 @@ class PacketParser:
                         
                         # Detect UDP services
                         if dst_port == 53:
-                            service = "DNS"
-                            services[service] = services.get(service, 0) + 1
+                            packet_services.append("DNS")
                         elif dst_port == 67 or dst_port == 68:
-                            service = "DHCP"
-                            services[service] = services.get(service, 0) + 1
+                            packet_services.append("DHCP")
                     
                     # Detect application layer protocols if available
                     if hasattr(packet, 'highest_layer'):
@@ -103,13 +183,29 @@ class PacketParser:
                         # Track application services
                         app = packet.highest_layer
                         if app not in ['TCP', 'UDP', 'IP']:
-                            services[app] = services.get(app, 0) + 1
+                            packet_services.append(app)
                     
-                    packets.append(packet_dict)
+                    # Formats that could not be sampled before dissection are sampled here
+                    if post_sampler is not None and not post_sampler.keep_packet(packet_dict):
+                        continue
+                    for service in packet_services:
+                        services[service] = services.get(service, 0) + 1
+                    packets.append(endpoints.intern_packet(packet_dict))
                     
                     # Update stats
                     protocol = packet_dict.get('protocol', 'Unknown')
                     self.stats['protocols'][protocol] = self.stats['protocols'].get(protocol, 0) + 1
+                    protocol_counts[protocol] = protocol_counts.get(protocol, 0) + 1
+                    
+                    if progress and len(packets) % PROGRESS_CHECK_INTERVAL == 0:
+                        now = time.time()
+                        if now - last_report >= PROGRESS_MIN_SECONDS:
+                            last_report = now
+                            progress('parsing',
+                                     packets_parsed=len(packets),
+                                     packets_per_sec=round(len(packets) / max(now - parse_started, 1e-6), 1),
+                                     protocols=dict(protocol_counts),
+                                     services=dict(services))
                     
                 except Exception as e:
                     print(f"Error parsing packet: {e}")
@@ -117,22 +213,97 @@ class PacketParser:
                 
             # Calculate duration
             duration = last_timestamp - first_timestamp if first_timestamp and last_timestamp else 0
+            parse_time = time.time() - parse_started
+            
+            if progress:
+                progress('parsed',
+                         packets_parsed=len(packets),
+                         packets_per_sec=round(len(packets) / max(parse_time, 1e-6), 1),
+                         duration=duration,
+                         protocols=dict(protocol_counts),
+                         services=dict(services))
             
             # Update stats
             self.stats['total_packets'] += len(packets)
             self.stats['parsed_packets'] += len(packets)
-            self.stats['duration'] = duration
-            self.stats['services'] = services
+            stats['duration'] = duration
+            stats['services'] = services
+            if sampler is not None:
+                stats['sampling'] = sampler.estimate(packets)
+                stats['sampling']['pushdown'] = 'tshark' if post_sampler is not None else 'raw'
             
             # Analysis flow patterns
             flows = self._analyze_flows(packets)
-            self.stats['flows'] = flows
+            stats['flows'] = flows
+            
+            if progress:
+                progress('flows_built',
+                         total_flows=flows['total_flows'],
+                         top_flows=flows['top_flows'][:5])
             
             return packets
             
         except Exception as e:
             print(f"Error parsing PCAP file: {e}")
-            return self._get_sample_packet_data()
+            return ParsedCapture.of(self._get_sample_packet_data(), stats)
+        finally:
+            if isinstance(cap, PipeCapture):
+                cap.close()
+            elif isinstance(parse_path, int):
+                os.close(parse_path)
+    
+    def _push_down(self, file_path, capture_filter=None, sampler=None, index_path=None, progress=None,
+                   parse_stats=None):
+        """Apply a capture filter and flow sampling before any packet is dissected
+
+        For classic pcap files, time bounds skip whole blocks of records via
+        the record index, and the expression and sampling decision are
+        checked against raw header bytes; only accepted records are streamed
+        to TShark through a pipe, so dissection cost follows the matching
+        traffic and nothing is written to disk. Compressed pcaps take the
+        same path in one sequential pass, without the index. Other formats
+        (pcapng) get the filter as a TShark display filter and are sampled as
+        packets are dissected.
+        Push-down statistics go to ``parse_stats['capture_filter']``; they
+        are complete once TShark has read the whole pipe.
+        Returns ``(path_or_pipe_to_parse, display_filter, sampler_to_apply_while_parsing)``,
+        where a pipe is the read-end file descriptor (an ``int``).
+        """
+        stats = {'filter': capture_filter.describe()} if capture_filter is not None else {}
+        if capture_filter is not None and parse_stats is not None:
+            parse_stats['capture_filter'] = stats
+        if not is_classic_pcap(file_path):
+            stats['pushdown'] = 'tshark'
+            return file_path, capture_filter.display_filter() if capture_filter else None, sampler
+        
+        time_bounded = capture_filter is not None and capture_filter.has_time_bounds
+        index = load_index(file_path, index_path) if time_bounded and not detect_compression(file_path) else None
+        header = pcap_header(file_path)
+        records = self._matching_records(file_path, header, index, capture_filter, sampler, stats, progress)
+        return pipe_chunks(records, name=file_path), None, None
+    
+    @staticmethod
+    def _matching_records(file_path, header, index, capture_filter, sampler, stats, progress):
+        """Yield the pcap global header, then each accepted record, for ``_push_down``"""
+        started = time.time()
+        time_bounded = capture_filter is not None and capture_filter.has_time_bounds
+        linktype = parse_global_header(header)[2]
+        accept = capture_filter.matches_raw if capture_filter is not None else None
+        keep = sampler.keep_fields if sampler is not None else None
+        matched = 0
+        yield header
+        for _, _, record_header, data in iter_records(file_path, index,
+                                                      capture_filter.start if time_bounded else None,
+                                                      capture_filter.end if time_bounded else None, stats):
+            fields = header_fields(data, linktype)
+            if (accept is None or accept(fields)) and (keep is None or keep(fields, data)):
+                yield record_header + data
+                matched += 1
+        stats.update(pushdown='index+raw' if index else 'raw', records_matched=matched,
+                     records_total=index['records'] if index else stats['records_scanned'],
+                     filter_seconds=round(time.time() - started, 3))
+        if progress:
+            progress('filtered', **{k: v for k, v in stats.items() if k != 'filter'})
     
     def _process_packet(self, packet):
         """Process a single packet and return its features"""
@@ -149,6 +320,12 @@ class PacketParser:
                 'dst_ip': packet.ip.dst,
                 'ttl': int(packet.ip.ttl)
             })
+        elif hasattr(packet, 'ipv6'):
+            packet_dict.update({
+                'src_ip': packet.ipv6.src,
+                'dst_ip': packet.ipv6.dst,
+                'ttl': int(packet.ipv6.hlim)
+            })
         
         # Add TCP/UDP features and detect services
         if hasattr(packet, 'tcp'):
@@ -196,8 +373,13 @@ class PacketParser:
         
         return packet_dict
     
-    def _analyze_flows(self, packets):
-        """Analyze packet flows (connections between hosts)"""
+    def _analyze_flows(self, packets, limit=20):
+        """Analyze packet flows (connections between hosts)
+
+        Returns the total flow count and the ``limit`` busiest flows (all
+        flows when ``limit`` is None). Interned packets are grouped by
+        endpoint ID; only the returned flows get their addresses back.
+        """
         flows = {}
         for packet in packets:
             if 'src_ip' in packet and 'dst_ip' in packet:
@@ -208,7 +390,7 @@ class PacketParser:
                 # Create flow key
                 src_port = packet.get('src_port', 0)
                 dst_port = packet.get('dst_port', 0)
-                flow_key = f"{src_ip}:{src_port}-{dst_ip}:{dst_port}-{protocol}"
+                flow_key = (src_ip, src_port, dst_ip, dst_port, protocol)
                 
                 if flow_key not in flows:
                     flows[flow_key] = {
@@ -230,10 +412,15 @@ class PacketParser:
         # Convert to list and sort by packet count
         flow_list = list(flows.values())
         flow_list.sort(key=lambda x: x['packets'], reverse=True)
+        top_flows = flow_list[:limit]  # Top 20 flows by default
+        endpoints = endpoints_of(packets)
+        if endpoints is not None:
+            for flow in top_flows:
+                endpoints.restore(flow)
         
         return {
             'total_flows': len(flow_list),
-            'top_flows': flow_list[:20]  # Return top 20 flows
+            'top_flows': top_flows
         }
     
     def _get_sample_packet_data(self):
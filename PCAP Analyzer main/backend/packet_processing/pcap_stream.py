@@ -0,0 +1,325 @@
+import io
+import os
+import socket
+import stat
+import struct
+import time
+from typing import Dict, Any, Iterator, Optional, Tuple
+
+from packet_processing.compression import DECOMPRESSION_ERRORS, open_capture
+from packet_processing.endpoints import key_text, packed_key
+
+# libpcap magic numbers: microsecond and nanosecond timestamps
+PCAP_MAGIC_USEC = 0xa1b2c3d4
+PCAP_MAGIC_NSEC = 0xa1b23c4d
+PCAPNG_MAGIC = 0x0a0d0d0a
+
+LINKTYPE_NULL = 0
+LINKTYPE_ETHERNET = 1
+LINKTYPE_RAW = 101
+LINKTYPE_RAW_ALT = 12
+LINKTYPE_LINUX_SLL = 113
+
+ETHERTYPE_IPV4 = 0x0800
+ETHERTYPE_IPV6 = 0x86dd
+ETHERTYPE_VLAN = (0x8100, 0x88a8)
+
+# AF_INET6 in DLT_NULL headers: Linux, then the BSDs and macOS
+NULL_AF_INET6 = (10, 24, 28, 30)
+# Hop-by-hop, routing, fragment and destination options headers
+IPV6_EXTENSION_HEADERS = (0, 43, 44, 60)
+IPV6_FRAGMENT = 44
+
+PROTOCOLS = {6: 'TCP', 17: 'UDP'}
+
+
+class PcapFormatError(ValueError):
+    """Raised when a stream is not a classic libpcap capture"""
+
+
+class PcapStreamReader:
+    """Incremental reader for classic libpcap data from a file, FIFO or pipe.
+
+    Records are yielded as ``(timestamp, wire_length, frame_bytes)`` as soon as
+    they are complete. With ``follow`` a regular file is tailed like
+    ``tail -F``: at end of file the reader waits for more data, and starts
+    over when the file is truncated or replaced (ring-buffer writers such as
+    ``tcpdump -C -W``). A FIFO or pipe ends when its writer closes it.
+    ``stop`` is an optional ``threading.Event`` that ends a followed stream.
+    Compressed files (see ``compression.open_capture``) are decoded as they
+    are read and never tailed.
+    """
+
+    def __init__(self, source, follow: bool = False, poll_interval: float = 0.2, stop=None):
+        self.source = source
+        self.follow = follow
+        self.poll_interval = poll_interval
+        self.stop = stop
+        self.linktype = None
+        self.records = 0
+        self.bytes_read = 0
+
+    def _open(self):
+        if isinstance(self.source, (str, bytes, os.PathLike)):
+            # Buffered reads retry the file after EOF, so a growing file's
+            # new bytes are still seen
+            return open_capture(self.source), True
+        return getattr(self.source, 'buffer', self.source), False
+
+    def _is_regular_file(self, f) -> bool:
+        try:
+            return stat.S_ISREG(os.fstat(f.fileno()).st_mode)
+        except (AttributeError, OSError, ValueError):
+            return False
+
+    def _replaced(self, f) -> bool:
+        """Whether a followed path now names a different or truncated file"""
+        try:
+            current = os.stat(self.source)
+            opened = os.fstat(f.fileno())
+        except OSError:
+            return False
+        return current.st_ino != opened.st_ino or current.st_size < f.tell()
+
+    def _stopped(self) -> bool:
+        return self.stop is not None and self.stop.is_set()
+
+    def _read_exact(self, f, size: int, tail: bool) -> Optional[bytes]:
+        """Read ``size`` bytes, waiting for a growing file; None at end of stream"""
+        chunks, remaining = [], size
+        while remaining:
+            chunk = f.read(remaining)
+            if chunk:
+                chunks.append(chunk)
+                remaining -= len(chunk)
+                continue
+            if not tail or self._stopped():
+                return None
+            if isinstance(self.source, (str, bytes, os.PathLike)) and self._replaced(f):
+                raise _Reopen()
+            time.sleep(self.poll_interval)
+        return b''.join(chunks)
+
+    def _read_header(self, f, tail: bool) -> Optional[Tuple[struct.Struct, float]]:
+        header = self._read_exact(f, 24, tail)
+        if header is None:
+            return None
+        record_header, resolution, self.linktype = parse_global_header(header)
+        return record_header, resolution
+
+    def __iter__(self) -> Iterator[Tuple[float, int, bytes]]:
+        while True:
+            f, owned = self._open()
+            tail = self.follow and self._is_regular_file(f) and not getattr(f, 'compression', None)
+            try:
+                parsed = self._read_header(f, tail)
+                if parsed is None:
+                    return
+                record_header, resolution = parsed
+                while True:
+                    raw = self._read_exact(f, 16, tail)
+                    if raw is None:
+                        return
+                    seconds, fraction, captured, wire_length = record_header.unpack(raw)
+                    data = self._read_exact(f, captured, tail)
+                    if data is None:
+                        return
+                    self.records += 1
+                    self.bytes_read += 16 + captured
+                    yield seconds + fraction * resolution, wire_length, data
+            except _Reopen:
+                continue
+            finally:
+                if owned:
+                    f.close()
+
+
+class _Reopen(Exception):
+    """A followed file was rotated or truncated; start reading it again"""
+
+
+def parse_global_header(header: bytes) -> Tuple[struct.Struct, float, int]:
+    """Return the record header struct, timestamp resolution and link type of a pcap header"""
+    magic_le = struct.unpack('<I', header[:4])[0]
+    if magic_le in (PCAP_MAGIC_USEC, PCAP_MAGIC_NSEC):
+        endian = '<'
+        magic = magic_le
+    else:
+        magic = struct.unpack('>I', header[:4])[0]
+        if magic == PCAPNG_MAGIC or magic_le == PCAPNG_MAGIC:
+            raise PcapFormatError("pcapng is not supported by the raw reader; write classic pcap (e.g. tcpdump -w -)")
+        if magic not in (PCAP_MAGIC_USEC, PCAP_MAGIC_NSEC):
+            raise PcapFormatError(f"not a pcap stream (magic {magic_le:#x})")
+        endian = '>'
+    linktype = struct.unpack(endian + 'I', header[20:24])[0] & 0x0fffffff
+    resolution = 1e-9 if magic == PCAP_MAGIC_NSEC else 1e-6
+    return struct.Struct(endian + 'IIII'), resolution, linktype
+
+
+def is_classic_pcap(path: str) -> bool:
+    """Whether a file starts with a libpcap (not pcapng) header, after any decompression"""
+    try:
+        with open_capture(path, buffer_size=io.DEFAULT_BUFFER_SIZE) as f:
+            header = f.read(24)
+        parse_global_header(header)
+        return len(header) == 24
+    except DECOMPRESSION_ERRORS + (ValueError, struct.error):
+        return False
+
+
+def _network_offset(data: bytes, linktype: int) -> Tuple[Optional[int], int]:
+    """Return the ethertype of a frame's network layer and where it starts"""
+    if linktype == LINKTYPE_ETHERNET:
+        ethertype = struct.unpack_from('!H', data, 12)[0]
+        offset = 14
+        while ethertype in ETHERTYPE_VLAN:
+            ethertype = struct.unpack_from('!H', data, offset + 2)[0]
+            offset += 4
+        return ethertype, offset
+    if linktype == LINKTYPE_LINUX_SLL:
+        return struct.unpack_from('!H', data, 14)[0], 16
+    if linktype == LINKTYPE_NULL:
+        family = struct.unpack_from('=I', data, 0)[0]
+        if family == socket.AF_INET:
+            return ETHERTYPE_IPV4, 4
+        return (ETHERTYPE_IPV6 if family in NULL_AF_INET6 else None), 4
+    if linktype in (LINKTYPE_RAW, LINKTYPE_RAW_ALT):
+        return (ETHERTYPE_IPV6 if data[0] >> 4 == 6 else ETHERTYPE_IPV4), 0
+    return None, 0
+
+
+def _ipv6_header(data: bytes, offset: int) -> Tuple[int, int, int, int, int, int, bool]:
+    """Read an IPv6 header at ``offset``, skipping extension headers
+
+    Returns ``(src, dst, ip_proto, hop_limit, transport_offset, ip_end, later_fragment)``
+    with addresses as ``endpoints.packed_key`` integers.
+    """
+    payload_length, proto, hop_limit, src, dst = struct.unpack_from('!HBB16s16s', data, offset + 4)
+    transport = offset + 40
+    later_fragment = False
+    while proto in IPV6_EXTENSION_HEADERS:
+        if proto == IPV6_FRAGMENT:
+            later_fragment = bool(struct.unpack_from('!H', data, transport + 2)[0] & 0xfff8)
+            proto, transport = data[transport], transport + 8
+        else:
+            proto, transport = data[transport], transport + (data[transport + 1] + 1) * 8
+    # A zero payload length means a jumbogram; use the captured length
+    end = offset + 40 + payload_length if payload_length else len(data)
+    return packed_key(src), packed_key(dst), proto, hop_limit, transport, end, later_fragment
+
+
+def header_fields(data: bytes, linktype: int) -> Tuple[Optional[int], Optional[int], Optional[int], int, int]:
+    """Read ``(src, dst, ip_proto, src_port, dst_port)`` straight from the frame bytes
+
+    Addresses are returned as ``endpoints.packed_key`` integers (IPv4 or
+    IPv6) and nothing else is allocated, so filters can reject packets
+    before they are decoded. Fields that are absent are None (addresses,
+    protocol) or 0 (ports).
+    """
+    try:
+        ethertype, offset = _network_offset(data, linktype)
+        if ethertype == ETHERTYPE_IPV4 and data[offset] >> 4 == 4:
+            proto = data[offset + 9]
+            src, dst = struct.unpack_from('!II', data, offset + 12)
+            if proto in PROTOCOLS and not struct.unpack_from('!H', data, offset + 6)[0] & 0x1fff:
+                src_port, dst_port = struct.unpack_from('!HH', data, offset + (data[offset] & 0x0f) * 4)
+                return src, dst, proto, src_port, dst_port
+            return src, dst, proto, 0, 0
+        if ethertype == ETHERTYPE_IPV6 and data[offset] >> 4 == 6:
+            src, dst, proto, _, transport, _, later_fragment = _ipv6_header(data, offset)
+            if proto in PROTOCOLS and not later_fragment:
+                src_port, dst_port = struct.unpack_from('!HH', data, transport)
+                return src, dst, proto, src_port, dst_port
+            return src, dst, proto, 0, 0
+        return None, None, None, 0, 0
+    except (struct.error, IndexError):
+        return None, None, None, 0, 0
+
+
+def transport_payload(data: bytes, linktype: int, fields: Optional[Tuple] = None) -> Tuple[Tuple, bytes]:
+    """Return ``header_fields`` plus the TCP/UDP payload bytes (empty when there are none)
+
+    Pass the frame's ``fields`` when they were already read to skip reading them again.
+    """
+    if fields is None:
+        fields = header_fields(data, linktype)
+    if fields[2] not in PROTOCOLS or not (fields[3] or fields[4]):
+        return fields, b''
+    try:
+        _, offset = _network_offset(data, linktype)
+        if data[offset] >> 4 == 6:
+            transport, end = _ipv6_header(data, offset)[4:6]
+        else:
+            transport = offset + (data[offset] & 0x0f) * 4
+            end = offset + struct.unpack_from('!H', data, offset + 2)[0]
+        if fields[2] == 6:
+            start = transport + (data[transport + 12] >> 4) * 4
+        else:
+            start = transport + 8
+        # Trim Ethernet padding using the IP length
+        return fields, data[start:end]
+    except (struct.error, IndexError):
+        return fields, b''
+
+
+def decode_packet(timestamp: float, wire_length: int, data: bytes, linktype: int) -> Dict[str, Any]:
+    """Decode link, IPv4/IPv6 and TCP/UDP headers into the dict ``parse_pcap`` produces
+
+    Only fixed header fields are read, so decoding costs a few struct
+    unpacks per packet. Frames that cannot be decoded still yield the
+    timestamp and length.
+    """
+    packet = {'timestamp': timestamp, 'length': wire_length, 'protocol': None}
+    try:
+        ethertype, offset = _network_offset(data, linktype)
+        if ethertype == ETHERTYPE_IPV4 and data[offset] >> 4 == 4:
+            ttl, proto = data[offset + 8], data[offset + 9]
+            packet['src_ip'] = socket.inet_ntoa(data[offset + 12:offset + 16])
+            packet['dst_ip'] = socket.inet_ntoa(data[offset + 16:offset + 20])
+            transport = offset + (data[offset] & 0x0f) * 4
+            # Later fragments carry no transport header
+            later_fragment = struct.unpack_from('!H', data, offset + 6)[0] & 0x1fff
+        elif ethertype == ETHERTYPE_IPV6 and data[offset] >> 4 == 6:
+            src, dst, proto, ttl, transport, _, later_fragment = _ipv6_header(data, offset)
+            packet['src_ip'] = key_text(src)
+            packet['dst_ip'] = key_text(dst)
+        else:
+            return packet
+
+        packet['ttl'] = ttl
+        protocol = PROTOCOLS.get(proto)
+        if protocol is None:
+            return packet
+        packet['protocol'] = protocol
+        if later_fragment:
+            return packet
+        packet['src_port'], packet['dst_port'] = struct.unpack_from('!HH', data, transport)
+        if protocol == 'TCP':
+            packet['tcp_flags'] = data[transport + 13]
+    except (struct.error, IndexError, OSError):
+        # Truncated by the snap length: keep whatever was decoded
+        pass
+    return packet
+
+
+def detect_service(packet: Dict[str, Any]) -> Optional[str]:
+    """Name the service of a decoded packet by destination port, as ``parse_pcap`` does"""
+    dst_port = packet.get('dst_port')
+    if packet.get('protocol') == 'TCP':
+        if dst_port in (80, 443):
+            return f"HTTP/HTTPS (port {dst_port})"
+        if dst_port == 53:
+            return "DNS"
+    elif packet.get('protocol') == 'UDP':
+        if dst_port == 53:
+            return "DNS"
+        if dst_port in (67, 68):
+            return "DHCP"
+    return None
+
+
+def iter_packets(source, follow: bool = False, poll_interval: float = 0.2, stop=None) -> Iterator[Dict[str, Any]]:
+    """Yield decoded packet dicts from a pcap file, FIFO or pipe"""
+    reader = PcapStreamReader(source, follow=follow, poll_interval=poll_interval, stop=stop)
+    for timestamp, wire_length, data in reader:
+        yield decode_packet(timestamp, wire_length, data, reader.linktype)
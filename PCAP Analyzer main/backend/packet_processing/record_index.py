@@ -0,0 +1,120 @@
+import io
+import json
+import os
+from typing import Dict, Any, Iterator, Optional, Tuple
+
+from packet_processing.compression import open_capture
+from packet_processing.pcap_stream import parse_global_header
+
+# Records per index block: small enough to skip precisely, large enough that
+# the index of a multi-gigabyte capture stays a few hundred KB
+BLOCK_RECORDS = 4096
+INDEX_VERSION = 1
+
+
+def build_index(path: str, block_records: int = BLOCK_RECORDS) -> Dict[str, Any]:
+    """Scan record headers of a classic pcap into a sparse block index
+
+    Each block is ``[offset, records, min_ts, max_ts]``. Only the
+    16-byte record headers are read; packet bytes are seeked over. Blocks
+    carry their own timestamp range, so captures that are not strictly
+    time-ordered are still skipped correctly.
+    """
+    blocks = []
+    records = 0
+    with open(path, 'rb') as f:
+        record_header, resolution, linktype = parse_global_header(f.read(24))
+        block = None
+        while True:
+            offset = f.tell()
+            raw = f.read(16)
+            if len(raw) < 16:
+                break
+            seconds, fraction, captured, _ = record_header.unpack(raw)
+            timestamp = seconds + fraction * resolution
+            if block is None or block[1] >= block_records:
+                block = [offset, 0, timestamp, timestamp]
+                blocks.append(block)
+            block[1] += 1
+            block[2] = min(block[2], timestamp)
+            block[3] = max(block[3], timestamp)
+            records += 1
+            f.seek(captured, os.SEEK_CUR)
+    return {'version': INDEX_VERSION, 'linktype': linktype, 'records': records,
+            'block_records': block_records, 'blocks': blocks}
+
+
+def load_index(path: str, index_path: Optional[str] = None) -> Dict[str, Any]:
+    """Return the record index of ``path``, reading or writing it at ``index_path`` when given
+
+    Stored captures are content-addressed, so a saved index never goes stale.
+    """
+    if index_path and os.path.exists(index_path):
+        try:
+            with open(index_path) as f:
+                index = json.load(f)
+            if index.get('version') == INDEX_VERSION:
+                return index
+        except (OSError, ValueError):
+            pass
+    index = build_index(path)
+    if index_path:
+        tmp_path = f"{index_path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(index, f)
+        os.replace(tmp_path, index_path)
+    return index
+
+
+def iter_records(path: str, index: Optional[Dict[str, Any]] = None, start: Optional[float] = None,
+                 end: Optional[float] = None, stats: Optional[Dict[str, int]] = None
+                 ) -> Iterator[Tuple[float, int, bytes, bytes]]:
+    """Yield ``(timestamp, wire_length, record_header, data)`` for records within ``[start, end]``
+
+    With an index, blocks whose timestamp range misses the bounds are never
+    read. Without one (as for compressed captures, which cannot seek back)
+    every record is scanned once and checked against the bounds. ``stats``
+    (if given) counts ``records_scanned`` and ``blocks_skipped``.
+    """
+    stats = stats if stats is not None else {}
+    stats.setdefault('records_scanned', 0)
+    stats.setdefault('blocks_skipped', 0)
+    low = float('-inf') if start is None else start
+    high = float('inf') if end is None else end
+    with open_capture(path) as f:
+        record_header, resolution, _ = parse_global_header(f.read(24))
+        if index is None:
+            spans = [(24, None)]
+        else:
+            spans = []
+            for offset, count, min_ts, max_ts in index['blocks']:
+                if max_ts < low or min_ts > high:
+                    stats['blocks_skipped'] += 1
+                else:
+                    spans.append((offset, count))
+        for offset, count in spans:
+            f.seek(offset)
+            remaining = count
+            while remaining is None or remaining > 0:
+                raw = f.read(16)
+                if len(raw) < 16:
+                    break
+                seconds, fraction, captured, wire_length = record_header.unpack(raw)
+                data = f.read(captured)
+                if len(data) < captured:
+                    break
+                if remaining is not None:
+                    remaining -= 1
+                stats['records_scanned'] += 1
+                timestamp = seconds + fraction * resolution
+                if low <= timestamp <= high:
+                    yield timestamp, wire_length, raw, data
+
+
+def pcap_header(path: str) -> bytes:
+    """The 24-byte global header of a (possibly compressed) classic pcap, for writing a filtered copy"""
+    with open_capture(path, buffer_size=io.DEFAULT_BUFFER_SIZE) as f:
+        header = f.read(24)
+    parse_global_header(header)
+    return header
+
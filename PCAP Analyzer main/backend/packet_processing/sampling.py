@@ -0,0 +1,112 @@
+import math
+import zlib
+from collections import defaultdict
+from typing import Dict, Any, List, Optional, Tuple
+
+from packet_processing.endpoints import address_key
+
+_MASK64 = (1 << 64) - 1
+# Two-sided 95% normal quantile
+Z_95 = 1.959964
+PROTOCOL_NUMBERS = {'TCP': 6, 'UDP': 17, 'ICMP': 1}
+
+
+def _mix(x: int) -> int:
+    """splitmix64 finalizer: spreads structured keys (sequential IPs/ports) uniformly"""
+    x = ((x ^ (x >> 30)) * 0xbf58476d1ce4e5b9) & _MASK64
+    x = ((x ^ (x >> 27)) * 0x94d049bb133111eb) & _MASK64
+    return x ^ (x >> 31)
+
+
+def _address(value) -> Optional[int]:
+    try:
+        return address_key(value)
+    except ValueError:
+        return None
+
+
+class FlowSampler:
+    """Keep or drop whole flows by a hash of their 5-tuple.
+
+    The key is direction-independent, so both sides of a conversation are
+    kept together and per-flow statistics of kept flows are exact. Packets
+    without an IP 5-tuple are sampled individually. The same ``seed`` and
+    ``rate`` select the same flows on every run.
+    """
+
+    def __init__(self, rate: float, seed: int = 0):
+        if not 0 < rate <= 1:
+            raise ValueError("sample rate must be in (0, 1]")
+        self.rate = rate
+        self.seed = seed
+        self._threshold = int(rate * (1 << 64))
+
+    def _keep_key(self, src: int, dst: int, proto: int, src_port: int, dst_port: int) -> bool:
+        (low, low_port), (high, high_port) = sorted(((src, src_port), (dst, dst_port)))
+        if high > _MASK64:
+            # IPv6: fold the 128-bit addresses so every bit reaches the mix
+            low, high = (low ^ (low >> 64)) & _MASK64, (high ^ (high >> 64)) & _MASK64
+        x = _mix(self.seed ^ (low << 32) ^ high)
+        x = _mix(x ^ (low_port << 24) ^ (high_port << 8) ^ (proto or 0))
+        return x < self._threshold
+
+    def keep_fields(self, fields: Tuple, data: bytes = b'') -> bool:
+        """Decide on raw ``header_fields`` output; ``data`` seeds non-IP frames"""
+        src, dst, proto, src_port, dst_port = fields
+        if src is None:
+            return _mix(self.seed ^ zlib.crc32(data)) < self._threshold
+        return self._keep_key(src, dst, proto, src_port, dst_port)
+
+    def keep_packet(self, packet: Dict[str, Any]) -> bool:
+        """Decide on a decoded packet dict; IP flows get the same decision as ``keep_fields``"""
+        src, dst = _address(packet.get('src_ip')), _address(packet.get('dst_ip'))
+        if src is None or dst is None:
+            key = hash((packet.get('timestamp'), packet.get('length'))) & _MASK64
+            return _mix(self.seed ^ key) < self._threshold
+        return self._keep_key(src, dst, PROTOCOL_NUMBERS.get(packet.get('protocol'), 0),
+                              packet.get('src_port') or 0, packet.get('dst_port') or 0)
+
+    def scale(self, counts: Dict[str, int]) -> Dict[str, int]:
+        """Point estimates of full-capture counts from sampled counts"""
+        return {key: int(round(value / self.rate)) for key, value in counts.items()}
+
+    def estimate(self, packets: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Scale sampled packet, byte, flow and per-protocol totals back up
+
+        Each total is a Horvitz-Thompson estimate ``sum / rate`` over the
+        sampled flows, with a 95% normal confidence interval from the
+        unbiased variance estimate ``(1 - rate) / rate**2 * sum(y_i**2)``,
+        where ``y_i`` is each sampled flow's contribution.
+        """
+        flows = defaultdict(lambda: [0, 0, None])
+        for index, packet in enumerate(packets):
+            src, dst = packet.get('src_ip'), packet.get('dst_ip')
+            if src is None or dst is None:
+                key = index
+            else:
+                ends = sorted(((src, packet.get('src_port') or 0), (dst, packet.get('dst_port') or 0)))
+                key = (ends[0], ends[1], packet.get('protocol'))
+            flow = flows[key]
+            flow[0] += 1
+            flow[1] += packet.get('length', 0)
+            flow[2] = packet.get('protocol') or 'Unknown'
+
+        per_protocol = defaultdict(list)
+        for flow_packets, _, protocol in flows.values():
+            per_protocol[protocol].append(flow_packets)
+        return {
+            'rate': self.rate,
+            'seed': self.seed,
+            'sampled_packets': len(packets),
+            'sampled_flows': len(flows),
+            'packets': self._interval([f[0] for f in flows.values()]),
+            'bytes': self._interval([f[1] for f in flows.values()]),
+            'flows': self._interval([1] * len(flows)),
+            'protocols': {protocol: self._interval(values) for protocol, values in per_protocol.items()}
+        }
+
+    def _interval(self, values: List[int]) -> Dict[str, Any]:
+        estimate = sum(values) / self.rate
+        margin = Z_95 * math.sqrt((1 - self.rate) / self.rate ** 2 * sum(v * v for v in values))
+        return {'estimate': int(round(estimate)),
+                'ci95': [int(max(sum(values), math.floor(estimate - margin))), int(math.ceil(estimate + margin))]}
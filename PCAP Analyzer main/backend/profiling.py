@@ -0,0 +1,199 @@
+import contextlib
+import cProfile
+import hmac
+import io
+import json
+import os
+import pstats
+import re
+import shutil
+import threading
+import time
+import tracemalloc
+import uuid
+from typing import Dict, Any, List, Optional
+
+# Frames kept per allocation; deeper stacks cost more memory while tracing
+TRACEMALLOC_FRAMES = 10
+TOP_FUNCTIONS = 40
+TOP_ALLOCATIONS = 25
+
+_NOOP = contextlib.nullcontext()
+_tracemalloc_lock = threading.Lock()
+_tracemalloc_users = 0
+# Peak resets and snapshots are process-wide, so profiled stages run one at a time
+_stage_lock = threading.Lock()
+
+_SAFE_ID = re.compile(r'^[A-Za-z0-9_-]+$')
+
+
+def profile_stage(profiler: Optional['AnalysisProfiler'], name: str):
+    """Context manager profiling one stage, or a shared no-op when profiling is off"""
+    return profiler.stage(name) if profiler is not None else _NOOP
+
+
+def _acquire_tracemalloc():
+    global _tracemalloc_users
+    with _tracemalloc_lock:
+        if _tracemalloc_users == 0 and not tracemalloc.is_tracing():
+            tracemalloc.start(TRACEMALLOC_FRAMES)
+        _tracemalloc_users += 1
+
+
+def _release_tracemalloc():
+    global _tracemalloc_users
+    with _tracemalloc_lock:
+        _tracemalloc_users -= 1
+        if _tracemalloc_users == 0 and tracemalloc.is_tracing():
+            tracemalloc.stop()
+
+
+class AnalysisProfiler:
+    """cProfile and tracemalloc results for each stage of one analysis.
+
+    Each stage writes ``<stage>.prof`` (loadable with pstats or snakeviz) and a
+    ``<stage>.txt`` report of the hottest functions and allocation sites into
+    ``<profiles_dir>/<profile_id>/``; ``finish`` adds ``summary.json``. The
+    ``profile_id`` is the client's ``analysis_id`` plus a random suffix, so a
+    client cannot choose (or overwrite) another profile's directory.
+
+    Stages of concurrently profiled analyses wait for each other, so one
+    stage's peak is never reset by another. Allocation figures are still
+    process-wide: they include unprofiled requests running at the same time.
+    """
+
+    def __init__(self, profiles_dir: str, analysis_id: str, file_name: Optional[str] = None):
+        self.profile_id = f"{analysis_id}-{uuid.uuid4().hex[:12]}"
+        self.directory = os.path.join(profiles_dir, self.profile_id)
+        self.analysis_id = analysis_id
+        self.file_name = file_name
+        self.started = time.time()
+        self.stages = {}
+        os.makedirs(self.directory, exist_ok=True)
+        _acquire_tracemalloc()
+        self.finished = False
+
+    @contextlib.contextmanager
+    def stage(self, name: str):
+        with _stage_lock:
+            tracemalloc.reset_peak()
+            before = tracemalloc.take_snapshot()
+            profile = cProfile.Profile()
+            try:
+                profile.enable()
+            except ValueError:
+                # Python 3.12+ allows only one active profiler per process
+                profile = None
+            started = time.perf_counter()
+            try:
+                yield
+            finally:
+                if profile is not None:
+                    profile.disable()
+                seconds = time.perf_counter() - started
+                current, peak = tracemalloc.get_traced_memory()
+                after = tracemalloc.take_snapshot()
+                self._write_stage(name, profile, seconds, current, peak, after.compare_to(before, 'traceback'))
+
+    def _write_stage(self, name, profile, seconds, current, peak, allocations):
+        report = io.StringIO()
+        report.write(f"Stage {name}: {seconds:.3f}s, traced memory peak {peak / 2 ** 20:.1f} MB "
+                     f"(process-wide, including unprofiled requests)\n\n")
+        if profile is not None:
+            profile.dump_stats(os.path.join(self.directory, f"{name}.prof"))
+            pstats.Stats(profile, stream=report).sort_stats('cumulative').print_stats(TOP_FUNCTIONS)
+        else:
+            report.write("No cProfile data: another profile was running at the same time.\n")
+        report.write(f"\nTop {TOP_ALLOCATIONS} allocation sites by growth during the stage:\n")
+        for stat in allocations[:TOP_ALLOCATIONS]:
+            frame = stat.traceback[0]
+            report.write(f"{stat.size_diff / 1024:+12.1f} KiB {stat.count_diff:+9d} blocks  "
+                         f"{frame.filename}:{frame.lineno}\n")
+        with open(os.path.join(self.directory, f"{name}.txt"), 'w') as f:
+            f.write(report.getvalue())
+
+        self.stages[name] = {
+            'seconds': seconds,
+            'traced_peak_bytes': peak,
+            'traced_current_bytes': current,
+            'allocated_bytes': sum(stat.size_diff for stat in allocations if stat.size_diff > 0),
+            'profile': f"{name}.prof" if profile is not None else None,
+            'report': f"{name}.txt"
+        }
+
+    def finish(self) -> Dict[str, Any]:
+        """Write the summary and stop tracing (idempotent)"""
+        if self.finished:
+            return self.summary()
+        self.finished = True
+        _release_tracemalloc()
+        summary = self.summary()
+        with open(os.path.join(self.directory, 'summary.json'), 'w') as f:
+            json.dump(summary, f, indent=2)
+        return summary
+
+    def summary(self) -> Dict[str, Any]:
+        return {'profile_id': self.profile_id, 'analysis_id': self.analysis_id, 'file_name': self.file_name,
+                'started': self.started, 'stages': self.stages}
+
+
+class ProfileStore:
+    """Profiles directory with a retention limit and token-gated access.
+
+    Profiling is requested per upload with the ``X-Profile-Token`` header
+    (compared in constant time with ``token``) or turned on for every
+    upload with ``always``. Without a token the list/download endpoints stay
+    closed.
+    """
+
+    def __init__(self, root: str, token: Optional[str] = None, always: bool = False, keep: int = 50):
+        self.root = root
+        self.token = token or None
+        self.always = always
+        self.keep = keep
+        self.lock = threading.Lock()
+
+    def authorized(self, headers) -> bool:
+        supplied = headers.get('X-Profile-Token')
+        return bool(self.token and supplied) and hmac.compare_digest(supplied.encode(), self.token.encode())
+
+    def profiler_for(self, headers, analysis_id: str, file_name: Optional[str] = None) -> Optional[AnalysisProfiler]:
+        """Return a profiler when this request should be profiled, else None"""
+        if not (self.always or self.authorized(headers)) or not _SAFE_ID.match(analysis_id):
+            return None
+        self._prune()
+        return AnalysisProfiler(self.root, analysis_id, file_name)
+
+    def _prune(self):
+        """Drop the oldest profiles beyond the retention limit"""
+        if not self.keep or not os.path.isdir(self.root):
+            return
+        with self.lock:
+            entries = sorted((os.path.getmtime(os.path.join(self.root, name)), name)
+                             for name in os.listdir(self.root) if os.path.isdir(os.path.join(self.root, name)))
+            for _, name in entries[:max(0, len(entries) - self.keep + 1)]:
+                shutil.rmtree(os.path.join(self.root, name), ignore_errors=True)
+
+    def list(self) -> List[Dict[str, Any]]:
+        """Summaries of stored profiles, newest first"""
+        if not os.path.isdir(self.root):
+            return []
+        profiles = []
+        for name in os.listdir(self.root):
+            directory = os.path.join(self.root, name)
+            try:
+                with open(os.path.join(directory, 'summary.json')) as f:
+                    summary = json.load(f)
+            except (OSError, ValueError):
+                continue
+            summary['files'] = sorted(os.listdir(directory))
+            profiles.append(summary)
+        profiles.sort(key=lambda p: p.get('started', 0), reverse=True)
+        return profiles
+
+    def path(self, profile_id: str, file_name: str) -> Optional[str]:
+        """Resolve a stored profile file, refusing anything outside the store"""
+        if not _SAFE_ID.match(profile_id) or not re.match(r'^[A-Za-z0-9_.-]+$', file_name) or '..' in file_name:
+            return None
+        path = os.path.join(self.root, profile_id, file_name)
+        return path if os.path.isfile(path) else None
@@ -0,0 +1,116 @@
+import json
+import queue
+import threading
+import time
+from collections import deque
+from typing import Dict, Any, Optional, Callable
+
+TERMINAL_STAGES = ("complete", "error")
+
+
+class ProgressBroker:
+    """Fan out analysis progress events to Server-Sent Events subscribers.
+
+    Each analysis has a channel identified by its ``analysis_id``. Events are
+    kept in a short history so a client that subscribes late (or reconnects)
+    still sees everything published so far. Channels that never finish (a
+    client subscribing to an id no analysis uses, or an analysis that died)
+    are dropped after ``idle_timeout`` seconds without events.
+    """
+
+    def __init__(self, history_size=200, retention=300, keepalive=15, idle_timeout=600):
+        self.history_size = history_size
+        self.retention = retention  # seconds a finished channel is kept around
+        self.keepalive = keepalive
+        self.idle_timeout = idle_timeout  # seconds an unfinished channel may go without events
+        self.lock = threading.Lock()
+        self.channels = {}
+
+    def _channel(self, analysis_id: str) -> Dict[str, Any]:
+        """Get or create the channel for an analysis (lock must be held)"""
+        channel = self.channels.get(analysis_id)
+        if channel is None:
+            channel = {
+                'events': deque(maxlen=self.history_size),
+                'subscribers': [],
+                'finished_at': None,
+                'started_at': time.time(),
+                'last_event_at': time.time()
+            }
+            self.channels[analysis_id] = channel
+        return channel
+
+    def _idle(self, channel: Dict[str, Any], now: float) -> bool:
+        return channel['finished_at'] is None and now - channel['last_event_at'] > self.idle_timeout
+
+    def _expire(self):
+        """Drop finished channels past their retention and idle unfinished ones (lock must be held)"""
+        now = time.time()
+        expired = [analysis_id for analysis_id, channel in self.channels.items()
+                   if not channel['subscribers']
+                   and (channel['finished_at'] and now - channel['finished_at'] > self.retention
+                        or self._idle(channel, now))]
+        for analysis_id in expired:
+            del self.channels[analysis_id]
+
+    def publish(self, analysis_id: str, stage: str, **data):
+        """Publish a progress event for an analysis"""
+        with self.lock:
+            channel = self._channel(analysis_id)
+            event = {
+                'analysis_id': analysis_id,
+                'stage': stage,
+                'elapsed': round(time.time() - channel['started_at'], 3),
+                **data
+            }
+            channel['events'].append(event)
+            channel['last_event_at'] = time.time()
+            if stage in TERMINAL_STAGES:
+                channel['finished_at'] = time.time()
+            for subscriber in channel['subscribers']:
+                subscriber.put(event)
+            self._expire()
+
+    def reporter(self, analysis_id: Optional[str]) -> Optional[Callable]:
+        """Return a ``progress(stage, **data)`` callback bound to an analysis"""
+        if not analysis_id:
+            return None
+        return lambda stage, **data: self.publish(analysis_id, stage, **data)
+
+    def subscribe(self, analysis_id: str):
+        """Yield SSE-formatted messages for an analysis until it finishes or goes idle"""
+        subscriber = queue.Queue()
+        with self.lock:
+            self._expire()
+            channel = self._channel(analysis_id)
+            backlog = list(channel['events'])
+            finished = channel['finished_at'] is not None
+            if not finished:
+                channel['subscribers'].append(subscriber)
+
+        try:
+            for event in backlog:
+                yield self.format_event(event)
+            if finished:
+                return
+            while True:
+                try:
+                    event = subscriber.get(timeout=self.keepalive)
+                except queue.Empty:
+                    with self.lock:
+                        if self._idle(channel, time.time()):
+                            return
+                    yield ": keep-alive\n\n"
+                    continue
+                yield self.format_event(event)
+                if event['stage'] in TERMINAL_STAGES:
+                    return
+        finally:
+            with self.lock:
+                if subscriber in channel['subscribers']:
+                    channel['subscribers'].remove(subscriber)
+
+    @staticmethod
+    def format_event(event: Dict[str, Any]) -> str:
+        """Format an event as a Server-Sent Events message"""
+        return f"data: {json.dumps(event, default=str)}\n\n"
@@ -0,0 +1,244 @@
+import ipaddress
+import math
+from typing import Dict, Any, List, Optional, Tuple
+
+# Context size Ollama uses when a model config does not set num_ctx
+DEFAULT_NUM_CTX = 2048
+MIN_PROMPT_BUDGET = 256
+
+# Rough characters-per-token ratio for English text and compact tables
+CHARS_PER_TOKEN = 4
+
+# Anomalies are grouped when their endpoints share these network prefixes and
+# their scores fall in the same bucket of this width
+IPV4_GROUP_PREFIX = 24
+IPV6_GROUP_PREFIX = 64
+SCORE_BUCKET = 0.05
+
+PROMPT_HEADER = """You are a cybersecurity expert analyzing network traffic captured in a PCAP file.
+Provide a comprehensive analysis that includes:
+
+1. TRAFFIC OVERVIEW: Explain what the overall traffic represents and key patterns observed
+2. PROTOCOL ANALYSIS: Analyze the protocol distribution and what activities they indicate
+3. CONNECTION PATTERNS: Identify communication patterns between hosts and their significance
+4. SECURITY ASSESSMENT: Identify potential security issues, suspicious activities, or vulnerabilities
+5. CONTEXTUAL INTERPRETATION: Explain what this traffic likely represents in a network environment
+6. RECOMMENDATIONS: What actions should be taken based on this analysis
+
+Use technical details where relevant, but explain concepts clearly. Be specific about what's happening in this traffic.
+
+"""
+
+PROMPT_FOOTER = "Provide your comprehensive analysis:"
+
+# Footer for structured output, where Ollama constrains the answer to a JSON schema
+JSON_PROMPT_FOOTER = ("Respond with a JSON object with the string fields traffic_overview, protocol_analysis, "
+                      "connection_patterns, security_assessment and contextual_interpretation, alert_level "
+                      "(Low, Medium, High or Critical), and lists identified_threats and recommendations:")
+
+# (response key, heading, instruction) for each section of the analysis
+ANALYSIS_SECTIONS = [
+    ('traffic_overview', "TRAFFIC OVERVIEW",
+     "Explain what the overall traffic represents and key patterns observed"),
+    ('protocol_analysis', "PROTOCOL ANALYSIS",
+     "Analyze the protocol distribution and what activities they indicate"),
+    ('connection_patterns', "CONNECTION PATTERNS",
+     "Identify communication patterns between hosts and their significance"),
+    ('security_assessment', "SECURITY ASSESSMENT",
+     "Identify potential security issues, suspicious activities, or vulnerabilities"),
+    ('contextual_interpretation', "CONTEXTUAL INTERPRETATION",
+     "Explain what this traffic likely represents in a network environment"),
+    ('recommendations', "RECOMMENDATIONS",
+     "What actions should be taken based on this analysis, as a bulleted list starting each item with '-'"),
+]
+
+
+def section_header(heading: str, instruction: str) -> str:
+    """Header for a prompt focused on a single analysis section"""
+    return ("You are a cybersecurity expert analyzing network traffic captured in a PCAP file.\n"
+            f"Write only the {heading} section of a network analysis: {instruction}.\n"
+            "Be concise and specific about what is happening in this traffic.\n\n")
+
+
+# Item limits per section, from most to least generous. When a prompt is over
+# budget the builder steps down through these levels, trimming the least
+# important sections first.
+SECTION_LEVELS = [
+    {'anomalies': 10, 'flows': 10, 'services': 12, 'talkers': 5},
+    {'anomalies': 10, 'flows': 5, 'services': 8, 'talkers': 5},
+    {'anomalies': 8, 'flows': 5, 'services': 6, 'talkers': 3},
+    {'anomalies': 5, 'flows': 3, 'services': 5, 'talkers': 3},
+    {'anomalies': 5, 'flows': 0, 'services': 4, 'talkers': 2},
+    {'anomalies': 3, 'flows': 0, 'services': 3, 'talkers': 1},
+    {'anomalies': 1, 'flows': 0, 'services': 0, 'talkers': 0},
+]
+
+
+def estimate_tokens(text: str) -> int:
+    """Estimate the token count of a prompt without a model tokenizer"""
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def prompt_budget(model_config: Dict[str, Any]) -> int:
+    """Token budget for a model's prompt
+
+    An explicit ``prompt_token_budget`` wins; otherwise whatever the context
+    window leaves after reserving room for ``num_predict`` output tokens.
+    """
+    if model_config.get('prompt_token_budget'):
+        return model_config['prompt_token_budget']
+    num_ctx = model_config.get('num_ctx', DEFAULT_NUM_CTX)
+    num_predict = model_config.get('num_predict', 0)
+    return max(MIN_PROMPT_BUDGET, num_ctx - num_predict)
+
+
+def _score(anomaly: Dict[str, Any]) -> float:
+    try:
+        return float(anomaly.get('anomaly_score', 0) or 0)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def _network(address: Any) -> str:
+    """The grouping network of an address, or the value itself if it is not one"""
+    try:
+        address = ipaddress.ip_address(address)
+    except ValueError:
+        return str(address)
+    prefix = IPV4_GROUP_PREFIX if address.version == 4 else IPV6_GROUP_PREFIX
+    return str(ipaddress.ip_network(f"{address}/{prefix}", strict=False))
+
+
+def _packets(anomaly: Dict[str, Any]) -> int:
+    # Detector rows count the packets of their src/dst pair in length_count
+    try:
+        count = float(anomaly.get('length_count', 0) or 0)
+    except (TypeError, ValueError):
+        return 0
+    return int(count) if count == count else 0
+
+
+def dedupe_anomalies(anomalies: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Collapse similar anomalies into one row each
+
+    The detector reports one row per src/dst pair, so a scan or a flood
+    shows up as many rows that differ only in one address. Rows are grouped
+    by source and destination network, protocol and description (when
+    given) and score bucket. A group shows an address where all its rows
+    share it and the network otherwise, with its most anomalous score
+    (IsolationForest scores are lower for more anomalous rows), a count and
+    the packets involved, most anomalous first.
+    """
+    groups = {}
+    for anomaly in anomalies:
+        src_ip, dst_ip = anomaly.get('src_ip', 'Unknown'), anomaly.get('dst_ip', 'Unknown')
+        score = _score(anomaly)
+        key = (_network(src_ip), _network(dst_ip), anomaly.get('protocol') or '', anomaly.get('description') or '',
+               math.floor(score / SCORE_BUCKET))
+        group = groups.get(key)
+        if group is None:
+            group = groups[key] = {'src_ips': set(), 'dst_ips': set(), 'protocol': key[2], 'description': key[3],
+                                   'anomaly_score': score, 'count': 0, 'packets': 0}
+        group['src_ips'].add(str(src_ip))
+        group['dst_ips'].add(str(dst_ip))
+        group['count'] += 1
+        group['packets'] += _packets(anomaly)
+        group['anomaly_score'] = min(group['anomaly_score'], score)
+
+    deduped = []
+    for (src_network, dst_network, *_), group in groups.items():
+        src_ips, dst_ips = group.pop('src_ips'), group.pop('dst_ips')
+        group['src_ip'] = next(iter(src_ips)) if len(src_ips) == 1 else src_network
+        group['dst_ip'] = next(iter(dst_ips)) if len(dst_ips) == 1 else dst_network
+        deduped.append(group)
+    # Ties are broken on the rendered fields so the prompt stays deterministic
+    return sorted(deduped, key=lambda group: (group['anomaly_score'], group['src_ip'], group['dst_ip'],
+                                              group['protocol'], group['description']))
+
+
+def bucket_services(services: Dict[str, int], limit: int) -> List[Tuple[str, int]]:
+    """Keep the ``limit`` largest services and fold the rest into one bucket"""
+    ranked = sorted(services.items(), key=lambda item: item[1], reverse=True)
+    if len(ranked) <= limit:
+        return ranked
+    kept, rest = ranked[:limit], ranked[limit:]
+    if not kept:
+        return [(f"{len(rest)} services", sum(count for _, count in rest))]
+    return kept + [(f"Other ({len(rest)} services)", sum(count for _, count in rest))]
+
+
+class PromptBuilder:
+    """Build the analysis prompt within a per-model token budget.
+
+    Inputs are ranked and compressed (deduplicated anomalies, bucketed small
+    services, compact one-line tables) and sections are trimmed, least
+    important first, until the estimated token count fits the budget.
+    """
+
+    def build(self, input_data: Dict[str, Any], budget: Optional[int] = None,
+              header: str = PROMPT_HEADER, footer: str = PROMPT_FOOTER) -> Dict[str, Any]:
+        """Return ``{'prompt', 'estimated_tokens', 'budget', 'level'}``"""
+        anomalies = dedupe_anomalies(input_data.get("anomalies", []))
+        packet_summary = input_data.get("packet_summary", {})
+        flow_data = input_data.get("flow_data", {}) or {}
+
+        prompt = None
+        for level, limits in enumerate(SECTION_LEVELS):
+            prompt = self._render(packet_summary, flow_data, anomalies, limits, header, footer)
+            if budget is None or estimate_tokens(prompt) <= budget:
+                break
+        return {
+            'prompt': prompt,
+            'estimated_tokens': estimate_tokens(prompt),
+            'budget': budget,
+            'level': level
+        }
+
+    def _render(self, packet_summary, flow_data, anomalies, limits, header, footer) -> str:
+        lines = [header + "NETWORK SUMMARY:"]
+        lines.append(f"Total Packets: {packet_summary.get('total_packets', 0)}")
+        lines.append(f"Capture Duration: {packet_summary.get('duration', 0)} seconds")
+
+        protocols = packet_summary.get('protocols', {})
+        if protocols:
+            ranked = sorted(protocols.items(), key=lambda item: item[1], reverse=True)
+            lines.append("Protocols: " + ", ".join(f"{name} {count}" for name, count in ranked))
+
+        if limits['talkers']:
+            for label, key in (("Top Sources", 'top_sources'), ("Top Destinations", 'top_destinations')):
+                talkers = packet_summary.get(key, [])[:limits['talkers']]
+                if talkers:
+                    lines.append(f"{label}: " + ", ".join(f"{t.get('ip')} ({t.get('count')})" for t in talkers))
+        lines.append("")
+
+        flows = flow_data.get('top_flows', [])[:limits['flows']]
+        if flows:
+            lines.append("TOP TRAFFIC FLOWS (src > dst, protocol, packets, bytes):")
+            for flow in flows:
+                lines.append(f"{flow.get('src_ip')}:{flow.get('src_port')} > {flow.get('dst_ip')}:{flow.get('dst_port')}"
+                             f" {flow.get('protocol')} {flow.get('packets')} {flow.get('bytes')}")
+            lines.append("")
+
+        services = packet_summary.get('services', {})
+        if services and limits['services']:
+            lines.append("DETECTED SERVICES (connections):")
+            lines.append(", ".join(f"{name} {count}" for name, count in bucket_services(services, limits['services'])))
+            lines.append("")
+
+        shown = anomalies[:limits['anomalies']]
+        if shown:
+            lines.append("DETECTED ANOMALIES (src > dst, score, occurrences, packets, protocol, description):")
+            for anomaly in shown:
+                line = f"{anomaly['src_ip']} > {anomaly['dst_ip']} {anomaly['anomaly_score']:.3f} x{anomaly['count']}"
+                if anomaly['packets']:
+                    line += f" {anomaly['packets']} pkts"
+                for detail in (anomaly['protocol'], anomaly['description']):
+                    if detail:
+                        line += f" {detail}"
+                lines.append(line)
+            if len(anomalies) > len(shown):
+                lines.append(f"... {len(anomalies) - len(shown)} more distinct anomalies omitted")
+            lines.append("")
+
+        lines.append(footer)
+        return "\n".join(lines)
@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+"""Check that each model's configured num_predict actually bounds generation.
+
+Sends a prompt that invites a very long answer to Ollama for every model with
+a config file (or the models given on the command line), using the same
+request mapping as the backend, and verifies the reported eval_count never
+exceeds num_predict. Also reports the worst-case generation time implied by
+the measured tokens/sec.
+"""
+import argparse
+import os
+import sys
+
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from models.model_registry import ModelConfigRegistry  # noqa: E402
+
+LONG_PROMPT = ("Write an exhaustive, multi-section report on every network protocol you know. "
+               "For each protocol describe its history, packet format, security issues and "
+               "detection strategies in as much detail as possible. Do not stop early.")
+
+
+def check_model(api_base, registry, model_name, timeout):
+    request_data = registry.build_request(model_name, LONG_PROMPT)
+    limit = request_data['options']['num_predict']
+    response = requests.post(f"{api_base}/api/generate", json=request_data, timeout=timeout)
+    response.raise_for_status()
+    result = response.json()
+
+    eval_count = result.get('eval_count', 0)
+    eval_seconds = result.get('eval_duration', 0) / 1e9
+    tokens_per_sec = eval_count / eval_seconds if eval_seconds else 0
+    bounded = eval_count <= limit
+    print(f"{model_name}: num_predict={limit} eval_count={eval_count} "
+          f"({tokens_per_sec:.1f} tok/s, generation {eval_seconds:.1f}s) "
+          f"{'OK' if bounded else 'EXCEEDED'}")
+    if tokens_per_sec:
+        print(f"  worst-case generation time at this rate: {limit / tokens_per_sec:.1f}s")
+    return bounded
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('models', nargs='*',
+                        help="Model names to check (default: LLM_MODEL or every configured model)")
+    parser.add_argument('--api-base', default=os.environ.get("LLM_API_BASE", "http://localhost:11434"))
+    parser.add_argument('--timeout', type=float, default=600)
+    args = parser.parse_args()
+
+    registry = ModelConfigRegistry()
+    models = args.models or ([os.environ["LLM_MODEL"]] if os.environ.get("LLM_MODEL") else list(registry.status()))
+
+    failures = 0
+    for model_name in models:
+        try:
+            if not check_model(args.api_base, registry, model_name, args.timeout):
+                failures += 1
+        except requests.RequestException as e:
+            print(f"{model_name}: request failed: {e}")
+            failures += 1
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
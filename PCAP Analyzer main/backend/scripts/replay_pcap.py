@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""Replay a pcap file into a FIFO, stdout or a growing file for live capture testing.
+
+The file is written as a classic pcap stream, the way ``tcpdump -w -``
+would, pacing records by their capture timestamps scaled by ``--speed``
+(0 writes as fast as the reader accepts). With ``--append`` the output is a
+regular file that grows as records are written, like a capture writer's
+output file.
+
+    mkfifo /tmp/live.pcap
+    LIVE_CAPTURE_SOURCE=/tmp/live.pcap python app.py &
+    python scripts/replay_pcap.py capture.pcap /tmp/live.pcap --speed 10
+"""
+import argparse
+import os
+import stat
+import struct
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from packet_processing.pcap_stream import PcapStreamReader  # noqa: E402
+
+
+def write_header(out, linktype, snaplen=262144):
+    out.write(struct.pack('<IHHiIII', 0xa1b2c3d4, 2, 4, 0, 0, snaplen, linktype))
+
+
+def replay(source, out, speed=1.0, loops=1):
+    """Write the records of ``source`` to ``out``; returns the number written"""
+    written = 0
+    offset = 0.0
+    for _ in range(loops):
+        reader = PcapStreamReader(source)
+        first = None
+        started = time.monotonic()
+        last = None
+        for timestamp, wire_length, data in reader:
+            if written == 0:
+                write_header(out, reader.linktype)
+            if first is None:
+                first = timestamp
+            if speed > 0:
+                delay = (timestamp - first) / speed - (time.monotonic() - started)
+                if delay > 0:
+                    out.flush()
+                    time.sleep(delay)
+            # Later loops continue after the previous one instead of going back in time
+            timestamp += offset
+            seconds = int(timestamp)
+            out.write(struct.pack('<IIII', seconds, min(int((timestamp - seconds) * 1e6), 999999),
+                                  len(data), wire_length))
+            out.write(data)
+            written += 1
+            last = timestamp
+        if first is not None:
+            offset = last + 1e-3 - first
+    out.flush()
+    return written
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('pcap', help="Capture to replay (classic pcap)")
+    parser.add_argument('output', nargs='?', default='-',
+                        help="FIFO or file to write (created as a FIFO if missing; '-' for stdout)")
+    parser.add_argument('--speed', type=float, default=1.0, help="Playback speed multiplier; 0 for no pacing")
+    parser.add_argument('--loop', type=int, default=1, help="Replay this many times with advancing timestamps")
+    parser.add_argument('--append', action='store_true', help="Write a regular, growing file instead of a FIFO")
+    args = parser.parse_args()
+
+    if args.output == '-':
+        count = replay(args.pcap, sys.stdout.buffer, args.speed, args.loop)
+    else:
+        if not args.append and not os.path.exists(args.output):
+            os.mkfifo(args.output)
+        elif not args.append and not stat.S_ISFIFO(os.stat(args.output).st_mode):
+            parser.error(f"{args.output} exists and is not a FIFO (use --append for a regular file)")
+        # Opening a FIFO blocks until the live capture opens it for reading
+        with open(args.output, 'ab' if args.append else 'wb') as out:
+            count = replay(args.pcap, out, args.speed, args.loop)
+    print(f"Replayed {count} packets", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
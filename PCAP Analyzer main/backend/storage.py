@@ -0,0 +1,306 @@
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Dict, Any, Optional, List, Set
+
+from packet_processing.compression import COMPRESSED_EXTENSIONS
+
+CHUNK_SIZE = 1024 * 1024
+
+# Capture extensions, also when compressed; stored objects keep the one their upload had
+CAPTURE_EXTENSIONS = tuple(f"{ext}{suffix}" for ext in ('.pcap', '.pcapng', '.cap')
+                           for suffix in ('',) + COMPRESSED_EXTENSIONS)
+DEFAULT_EXTENSION = '.pcap'
+
+
+def capture_extension(filename: Optional[str]) -> str:
+    """The capture extension of an upload name (``.pcapng.gz``, ...), or ``.pcap`` if it has none"""
+    name = (filename or '').lower()
+    # Longest first, so '.pcap' is not taken for '.cap'
+    for ext in sorted(CAPTURE_EXTENSIONS, key=len, reverse=True):
+        if name.endswith(ext):
+            return ext
+    return DEFAULT_EXTENSION
+
+
+class UploadStore:
+    """Content-addressed storage for uploaded captures.
+
+    Captures are stored once per SHA-256 digest under ``objects/``; artifacts
+    derived from a capture (record indexes, cached parses, ...) live under
+    ``derived/<digest>/`` and are removed together with it. An ``index.json``
+    keeps per-capture metadata and reference counts.
+    """
+
+    def __init__(self, root: str, max_bytes: Optional[int] = None, eviction_policy: str = "lru"):
+        if eviction_policy not in ("lru", "age"):
+            raise ValueError(f"Unknown eviction policy: {eviction_policy}")
+        self.root = root
+        self.objects_dir = os.path.join(root, 'objects')
+        self.derived_dir = os.path.join(root, 'derived')
+        self.tmp_dir = os.path.join(root, 'tmp')
+        self.index_path = os.path.join(root, 'index.json')
+        self.max_bytes = max_bytes
+        self.eviction_policy = eviction_policy
+        self.lock = threading.RLock()
+        self._active = {}  # digest -> number of analyses currently using the capture
+        # Captures whose derived artifacts may have changed since they were last measured
+        self._derived_dirty = set()
+        self.stats = {
+            'uploads': 0,
+            'dedup_hits': 0,
+            'evictions': 0,
+            'evicted_bytes': 0
+        }
+        for directory in (self.objects_dir, self.derived_dir, self.tmp_dir):
+            os.makedirs(directory, exist_ok=True)
+        self.entries = self._load_index()
+
+    def _load_index(self) -> Dict[str, Dict[str, Any]]:
+        """Load capture metadata, dropping entries whose object has disappeared"""
+        if not os.path.exists(self.index_path):
+            return {}
+        try:
+            with open(self.index_path, 'r') as f:
+                entries = json.load(f)
+        except Exception as e:
+            print(f"Error loading upload index: {e}")
+            return {}
+        return {digest: entry for digest, entry in entries.items()
+                if os.path.exists(self._object_path(digest, entry))}
+
+    def _save_index(self):
+        """Persist capture metadata atomically"""
+        tmp_path = f"{self.index_path}.{uuid.uuid4().hex}"
+        with open(tmp_path, 'w') as f:
+            json.dump(self.entries, f, indent=2)
+        os.replace(tmp_path, self.index_path)
+
+    def _object_path(self, digest: str, entry: Dict[str, Any]) -> str:
+        extension = entry.get('extension', DEFAULT_EXTENSION)
+        return os.path.join(self.objects_dir, digest[:2], f"{digest}{extension}")
+
+    def object_path(self, digest: str) -> str:
+        """Return the on-disk location of a stored capture"""
+        return self._object_path(digest, self.entries.get(digest, {}))
+
+    def derived_path(self, digest: str, name: str) -> str:
+        """Return a path for an artifact derived from a capture, creating its directory
+
+        The capture's derived size is re-measured at the next eviction check.
+        """
+        directory = os.path.join(self.derived_dir, digest)
+        os.makedirs(directory, exist_ok=True)
+        with self.lock:
+            self._derived_dirty.add(digest)
+        return os.path.join(directory, name)
+
+    def save(self, file_storage, filename: str, pin: bool = False) -> Dict[str, Any]:
+        """Store an uploaded file, deduplicating identical content
+
+        The returned entry carries the capture ``path`` and whether the content
+        was already present (``deduplicated``). With ``pin`` the capture is
+        protected from eviction until ``unpin`` is called.
+        """
+        hasher = hashlib.sha256()
+        size = 0
+        tmp_path = os.path.join(self.tmp_dir, f"upload_{uuid.uuid4().hex}")
+        stream = getattr(file_storage, 'stream', file_storage)
+        try:
+            with open(tmp_path, 'wb') as out:
+                while True:
+                    chunk = stream.read(CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    hasher.update(chunk)
+                    out.write(chunk)
+                    size += len(chunk)
+        except BaseException:
+            # A failed or aborted upload must not leave its partial copy behind
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            raise
+        digest = hasher.hexdigest()
+        now = time.time()
+
+        with self.lock:
+            self.stats['uploads'] += 1
+            entry = self.entries.get(digest)
+            if entry is not None:
+                os.remove(tmp_path)
+                self.stats['dedup_hits'] += 1
+                entry['references'] += 1
+                entry['last_access'] = now
+                if filename and filename not in entry['names']:
+                    entry['names'].append(filename)
+                deduplicated = True
+            else:
+                entry = {
+                    'digest': digest,
+                    'extension': capture_extension(filename),
+                    'size': size,
+                    'derived_size': 0,
+                    'names': [filename] if filename else [],
+                    'references': 1,
+                    'created': now,
+                    'last_access': now
+                }
+                object_path = self._object_path(digest, entry)
+                os.makedirs(os.path.dirname(object_path), exist_ok=True)
+                os.replace(tmp_path, object_path)
+                self.entries[digest] = entry
+                deduplicated = False
+            if pin:
+                self._active[digest] = self._active.get(digest, 0) + 1
+            self._save_index()
+            self.evict(protect={digest})
+            return dict(entry, path=self.object_path(digest), deduplicated=deduplicated)
+
+    def get(self, digest: str) -> Optional[Dict[str, Any]]:
+        """Return metadata for a stored capture and mark it as recently used"""
+        with self.lock:
+            entry = self.entries.get(digest)
+            if entry is None:
+                return None
+            entry['last_access'] = time.time()
+            self._save_index()
+            return dict(entry, path=self.object_path(digest))
+
+    def list(self) -> List[Dict[str, Any]]:
+        """Return metadata for all stored captures"""
+        with self.lock:
+            return [dict(entry, in_use=digest in self._active) for digest, entry in self.entries.items()]
+
+    def unpin(self, digest: str):
+        """Release a pin taken by ``save(pin=True)`` or ``checkout``
+
+        A capture released while pinned is removed with its last pin.
+        """
+        with self.lock:
+            self._active[digest] -= 1
+            if self._active[digest] <= 0:
+                del self._active[digest]
+                entry = self.entries.get(digest)
+                if entry is not None and entry['references'] <= 0:
+                    self._remove(digest)
+                    self._save_index()
+
+    @contextmanager
+    def receive(self, file_storage, filename: str):
+        """Store an upload and keep it pinned for the duration of the block"""
+        stored = self.save(file_storage, filename, pin=True)
+        try:
+            yield stored
+        finally:
+            self.unpin(stored['digest'])
+
+    @contextmanager
+    def checkout(self, digest: str):
+        """Pin a stored capture so it cannot be evicted while it is being analyzed"""
+        with self.lock:
+            if digest not in self.entries:
+                raise KeyError(digest)
+            self._active[digest] = self._active.get(digest, 0) + 1
+            self.entries[digest]['last_access'] = time.time()
+        try:
+            yield self.object_path(digest)
+        finally:
+            self.unpin(digest)
+
+    def release(self, digest: str) -> bool:
+        """Drop one reference to a capture, removing it once unreferenced and unpinned"""
+        with self.lock:
+            entry = self.entries.get(digest)
+            if entry is None:
+                return False
+            entry['references'] -= 1
+            if entry['references'] <= 0 and digest not in self._active:
+                self._remove(digest)
+            self._save_index()
+            return True
+
+    def _derived_bytes(self, digest: str) -> int:
+        """Measure the artifacts derived from a capture on disk"""
+        total = 0
+        for dirpath, _, filenames in os.walk(os.path.join(self.derived_dir, digest)):
+            for name in filenames:
+                try:
+                    total += os.path.getsize(os.path.join(dirpath, name))
+                except OSError:
+                    pass
+        return total
+
+    def _entry_bytes(self, digest: str) -> int:
+        """Size of a capture plus everything derived from it
+
+        Derived sizes are kept in the index and only re-measured for
+        captures that handed out a ``derived_path`` since the last check.
+        """
+        entry = self.entries[digest]
+        if digest in self._derived_dirty or 'derived_size' not in entry:
+            self._derived_dirty.discard(digest)
+            entry['derived_size'] = self._derived_bytes(digest)
+        return entry['size'] + entry['derived_size']
+
+    def usage(self) -> int:
+        """Total bytes used by stored captures and derived artifacts"""
+        with self.lock:
+            return sum(self._entry_bytes(digest) for digest in self.entries)
+
+    def _remove(self, digest: str):
+        """Delete a capture and its derived artifacts"""
+        object_path = self.object_path(digest)
+        self.entries.pop(digest, None)
+        self._derived_dirty.discard(digest)
+        try:
+            os.remove(object_path)
+        except FileNotFoundError:
+            pass
+        shutil.rmtree(os.path.join(self.derived_dir, digest), ignore_errors=True)
+
+    def evict(self, protect: Optional[Set[str]] = None) -> List[str]:
+        """Evict captures until the store fits within its disk budget"""
+        if not self.max_bytes:
+            return []
+        protect = protect or set()
+        evicted = []
+        with self.lock:
+            sizes = {digest: self._entry_bytes(digest) for digest in self.entries}
+            total = sum(sizes.values())
+            if total <= self.max_bytes:
+                return []
+            order_key = 'last_access' if self.eviction_policy == 'lru' else 'created'
+            candidates = sorted(
+                (entry for digest, entry in self.entries.items()
+                 if digest not in protect and digest not in self._active),
+                key=lambda entry: entry[order_key]
+            )
+            for entry in candidates:
+                if total <= self.max_bytes:
+                    break
+                digest = entry['digest']
+                total -= sizes[digest]
+                self.stats['evictions'] += 1
+                self.stats['evicted_bytes'] += sizes[digest]
+                self._remove(digest)
+                evicted.append(digest)
+            if evicted:
+                print(f"Evicted {len(evicted)} capture(s) to stay within the {self.max_bytes} byte upload budget")
+                self._save_index()
+        return evicted
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Return storage statistics"""
+        with self.lock:
+            return dict(self.stats,
+                        captures=len(self.entries),
+                        bytes_used=self.usage(),
+                        max_bytes=self.max_bytes,
+                        eviction_policy=self.eviction_policy)
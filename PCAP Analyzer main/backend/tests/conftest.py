@@ -0,0 +1,42 @@
+import os
+import socket
+import struct
+import sys
+
+import pytest
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND)
+sys.path.insert(0, os.path.join(BACKEND, 'benchmarks'))
+
+from synth_pcap import PCAP_GLOBAL_HEADER, RECORD_HEADER  # noqa: E402
+
+
+@pytest.fixture
+def write_pcap(tmp_path):
+    """Write ``[(timestamp, frame), ...]`` as a classic Ethernet pcap and return its path"""
+    def write(records, name='capture.pcap'):
+        path = tmp_path / name
+        with open(path, 'wb') as f:
+            f.write(PCAP_GLOBAL_HEADER)
+            for timestamp, frame in records:
+                seconds = int(timestamp)
+                f.write(RECORD_HEADER.pack(seconds, int(round((timestamp - seconds) * 1e6)), len(frame), len(frame)))
+                f.write(frame)
+        return str(path)
+    return write
+
+
+@pytest.fixture
+def ipv6_frame():
+    """Build an Ethernet/IPv6 TCP or UDP frame (synth_pcap only writes IPv4)"""
+    def build(proto, src, dst, sport, dport, payload=b'', hop_limit=64):
+        if proto == 'TCP':
+            transport = struct.pack('!HHIIBBHHH', sport, dport, 0, 0, 5 << 4, 0x02, 65535, 0, 0)
+        else:
+            transport = struct.pack('!HHHH', sport, dport, 8 + len(payload), 0)
+        body = transport + payload
+        ip = struct.pack('!IHBB', 6 << 28, len(body), 6 if proto == 'TCP' else 17, hop_limit)
+        ip += socket.inet_pton(socket.AF_INET6, src) + socket.inet_pton(socket.AF_INET6, dst)
+        return b'\x00' * 12 + b'\x86\xdd' + ip + body
+    return build
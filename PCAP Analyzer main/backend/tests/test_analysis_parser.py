@@ -0,0 +1,101 @@
+import json
+
+import pytest
+
+from analysis_parser import parse_alert_level, parse_analysis, parse_sections, parse_structured, render_sections
+
+ANALYSIS = """## TRAFFIC OVERVIEW
+Mostly HTTPS browsing with a high volume of DNS lookups.
+
+**3. Connection patterns:** one host talks to many ports.
+
+SECURITY ASSESSMENT
+The port scan from 10.0.0.5 is a high risk. Possible data exfiltration over DNS.
+
+## RECOMMENDATIONS
+- Block 10.0.0.5
+2. Review DNS logs
+* **Enable egress filtering**
+"""
+
+
+@pytest.mark.parametrize('text, level', [
+    ("Alert level: High", "High"),
+    ("Risk level - **medium**", "Medium"),
+    ("Severity: critical. Otherwise low risk.", "Critical"),
+    ("The threat level is moderate", "Medium"),
+    ("Some low risk hosts and one critical threat", "Critical"),
+    ("A high volume of traffic", "Low"),
+    ("", "Low"),
+])
+def test_alert_level(text, level):
+    assert parse_alert_level(text) == level
+
+
+def test_sections_split_on_marked_up_headings():
+    sections = parse_sections(ANALYSIS)
+
+    assert list(sections) == ['traffic_overview', 'connection_patterns', 'security_assessment', 'recommendations']
+    assert sections['connection_patterns'] == "one host talks to many ports."
+    assert sections['traffic_overview'].startswith("Mostly HTTPS")
+
+
+def test_body_line_starting_with_a_heading_is_not_a_heading():
+    sections = parse_sections("## SECURITY ASSESSMENT\nRecommendations follow below once reviewed.")
+
+    assert list(sections) == ['security_assessment']
+
+
+def test_analysis_takes_the_level_from_the_security_assessment():
+    parsed = parse_analysis("## TRAFFIC OVERVIEW\nCritical threat in an old report.\n"
+                            "## SECURITY ASSESSMENT\nAlert level: Medium")
+
+    assert parsed['alert_level'] == "Medium"
+
+
+def test_analysis_threats_and_recommendations():
+    parsed = parse_analysis(ANALYSIS)
+
+    assert parsed['alert_level'] == "High"
+    assert parsed['identified_threats'] == ["Scan", "Data Exfiltration", "Port Scan"]
+    assert parsed['recommendations'] == ["Block 10.0.0.5", "Review DNS logs", "Enable egress filtering"]
+    # Callers get their own copies of the memoized result
+    parsed['recommendations'].append("changed")
+    assert len(parse_analysis(ANALYSIS)['recommendations']) == 3
+
+
+def test_threats_overlapping_another_indicator_are_found():
+    assert parse_analysis("A port scan was seen")['identified_threats'] == ["Scan", "Port Scan"]
+
+
+def test_missing_recommendations():
+    assert parse_analysis("Nothing to see")['recommendations'] == ["No specific recommendations found"]
+
+
+def test_structured_output():
+    parsed = parse_structured(json.dumps({
+        'traffic_overview': 'Web browsing', 'security_assessment': 'Nothing suspicious',
+        'recommendations': '- Keep monitoring\n- Patch hosts', 'alert_level': 'moderate',
+        'identified_threats': 'Scan'}))
+
+    assert parsed == {'sections': {'traffic_overview': 'Web browsing', 'security_assessment': 'Nothing suspicious',
+                                   'recommendations': '- Keep monitoring\n- Patch hosts'},
+                      'alert_level': 'Medium', 'identified_threats': ['Scan'],
+                      'recommendations': ['Keep monitoring', 'Patch hosts']}
+
+
+def test_structured_output_with_an_unknown_level_reads_the_assessment():
+    parsed = parse_structured(json.dumps({'security_assessment': 'A high risk beacon', 'alert_level': 'severe'}))
+
+    assert parsed['alert_level'] == "High"
+
+
+@pytest.mark.parametrize('text', ['not json', '["a list"]', ''])
+def test_non_object_output_is_not_structured(text):
+    assert parse_structured(text) is None
+
+
+def test_rendered_sections_parse_back():
+    sections = parse_sections(ANALYSIS)
+
+    assert parse_sections(render_sections(sections)) == sections
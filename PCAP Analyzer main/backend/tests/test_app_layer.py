@@ -0,0 +1,124 @@
+import struct
+
+import pytest
+
+from packet_processing import app_layer
+from packet_processing.app_layer import (MAX_ITEMS, TUNNEL_MIN_QUERIES, decode_dns, decode_http_request,
+                                         decode_tls_client_hello, flow_selector, inspect_capture, pair_selector,
+                                         service_selector)
+from synth_pcap import _dns_query, encode_frame
+
+TUNNEL_NAME = "nbswy3dpeb3w64tmmqqgc3tpnzzw45djnzsxi2lpnyqg64tmmr2ws3tp.t.example-tunnel.net"
+
+
+def dns_frame(name, ident):
+    return encode_frame('UDP', '10.0.0.5', '10.0.0.53', 40000 + ident, 53, 64, _dns_query(name, ident), 0, ident)
+
+
+def client_hello(sni=None, version=0x0303, supported_versions=()):
+    """A minimal TLS ClientHello record"""
+    extensions = b''
+    if sni:
+        name = sni.encode()
+        server_name = struct.pack('!BH', 0, len(name)) + name
+        extensions += struct.pack('!HHH', 0, len(server_name) + 2, len(server_name)) + server_name
+    if supported_versions:
+        body = struct.pack('!B', 2 * len(supported_versions)) + b''.join(struct.pack('!H', v)
+                                                                       for v in supported_versions)
+        extensions += struct.pack('!HH', 43, len(body)) + body
+    hello = (struct.pack('!H', version) + b'\x00' * 32 + b'\x00' + struct.pack('!H', 2) + b'\x13\x01'
+             + b'\x01\x00' + struct.pack('!H', len(extensions)) + extensions)
+    handshake = b'\x01' + len(hello).to_bytes(3, 'big') + hello
+    return struct.pack('!BHH', 22, 0x0301, len(handshake)) + handshake
+
+
+def tcp_frame(src, dst, sport, dport, payload):
+    return encode_frame('TCP', src, dst, sport, dport, 64, payload, 0x18)
+
+
+def test_decode_dns_query():
+    decoded = decode_dns(_dns_query('www.example.com', 7))
+
+    assert decoded == {'query': 'www.example.com', 'qtype': 'A', 'response': False, 'rcode': 0, 'answers': 0}
+    assert decode_dns(b'\x00\x01') is None
+
+
+def test_decode_tls_client_hello():
+    decoded = decode_tls_client_hello(client_hello('example.org', supported_versions=(0x0a0a, 0x0304, 0x0303)))
+
+    assert decoded['sni'] == 'example.org'
+    assert decoded['client_version'] == 'TLS 1.2'
+    assert decoded['highest_version'] == 'TLS 1.3'
+    assert decoded['cipher_suites'] == 1
+    assert decode_tls_client_hello(b'\x17\x03\x03\x00\x10') is None
+
+
+def test_decode_http_request():
+    payload = b'GET /index.html HTTP/1.1\r\nHost: example.com\r\nUser-Agent: curl/8.0\r\n\r\n'
+
+    assert decode_http_request(payload) == {'method': 'GET', 'path': '/index.html', 'version': 'HTTP/1.1',
+                                            'host': 'example.com', 'user_agent': 'curl/8.0'}
+    assert decode_http_request(b'HTTP/1.1 200 OK\r\n\r\n') is None
+    assert decode_http_request(b'GET nonsense\r\n\r\n') is None
+
+
+def test_weak_tls_and_missing_sni_are_flagged(write_pcap):
+    path = write_pcap([(1.0, tcp_frame('10.0.0.5', '10.0.0.9', 50000, 443, client_hello(version=0x0301))),
+                       (2.0, tcp_frame('10.0.0.5', '10.0.0.10', 50001, 443, client_hello('ok.example')))])
+
+    result = inspect_capture(path, service_selector(['tls']))
+
+    flagged, clean = result['flows']
+    assert [i['type'] for i in flagged['indicators']] == ['weak_tls', 'tls_without_sni']
+    assert clean['indicators'] == []
+    assert 'highest_version_code' not in flagged['tls'][0]
+
+
+def test_selectors_match_either_direction(write_pcap):
+    request = b'GET / HTTP/1.0\r\nHost: a\r\n\r\n'
+    path = write_pcap([(1.0, tcp_frame('10.0.0.5', '10.0.0.80', 40000, 80, request)),
+                       (2.0, tcp_frame('10.0.0.80', '10.0.0.5', 80, 40000, b'HTTP/1.0 200 OK\r\n\r\n')),
+                       (3.0, tcp_frame('10.0.0.6', '10.0.0.80', 40001, 80, request))])
+
+    by_pair = inspect_capture(path, pair_selector([('10.0.0.80', '10.0.0.5')]))
+    by_flow = inspect_capture(path, flow_selector('10.0.0.5', '10.0.0.80', 40000, 80))
+
+    for result in (by_pair, by_flow):
+        (flow,) = result['flows']
+        assert flow['packets_inspected'] == 2
+        assert flow['http'][0]['host'] == 'a'
+    assert len(inspect_capture(path, service_selector(['http']))['flows']) == 2
+    with pytest.raises(ValueError):
+        service_selector(['smtp'])
+
+
+def test_payloads_are_extracted_only_for_selected_packets(write_pcap, monkeypatch):
+    request = b'GET / HTTP/1.0\r\nHost: a\r\n\r\n'
+    path = write_pcap([(1.0 + i, tcp_frame(f"10.0.1.{i}", '10.0.0.80', 40000 + i, 80, request)) for i in range(10)]
+                      + [(20.0, dns_frame('example.com', 1))])
+    extracted = []
+    original = app_layer.transport_payload
+    monkeypatch.setattr(app_layer, 'transport_payload',
+                        lambda data, linktype, fields=None: extracted.append(fields) or original(data, linktype,
+                                                                                                 fields))
+
+    result = inspect_capture(path, service_selector(['dns']))
+
+    assert result['flows'][0]['dns'][0]['query'] == 'example.com'
+    assert len(extracted) == 1
+
+
+def test_tunnel_queries_after_stored_items_are_reported(write_pcap):
+    # More benign queries than are kept per flow, then enough tunnelling ones to flag
+    benign = [dns_frame('example.com', i) for i in range(MAX_ITEMS + 6)]
+    tunnel = [dns_frame(TUNNEL_NAME, 100 + i) for i in range(TUNNEL_MIN_QUERIES)]
+    path = write_pcap([(1.0 + i, frame) for i, frame in enumerate(benign + tunnel)])
+
+    result = inspect_capture(path, service_selector(['dns']))
+
+    (flow,) = result['flows']
+    assert len(flow['dns']) == MAX_ITEMS
+    assert flow['counts']['suspicious_dns'] == TUNNEL_MIN_QUERIES
+    (indicator,) = [i for i in flow['indicators'] if i['type'] == 'dns_tunneling']
+    assert TUNNEL_NAME in indicator['detail']
+    assert 'suspicious_example' not in flow
@@ -0,0 +1,102 @@
+import io
+import tarfile
+import zipfile
+from collections import Counter
+
+import pytest
+
+from batch import ArchiveTooLarge, ExpansionBudget, is_archive, iter_archive_captures, merge_results, stitch_flows
+
+
+def flow(start, end, packets=1, src_port=1000, files=None):
+    return {'src_ip': '10.0.0.1', 'src_port': src_port, 'dst_ip': '10.0.0.2', 'dst_port': 443, 'protocol': 'TCP',
+            'packets': packets, 'bytes': 100 * packets, 'start_time': start, 'end_time': end}
+
+
+def test_flows_continuing_across_captures_are_stitched():
+    stitched = stitch_flows([[flow(0, 50, 3)], [flow(60, 90, 2)], [flow(500, 510, 1)]], max_gap=30)
+
+    assert [(f['packets'], f['bytes'], f['start_time'], f['end_time'], f['files'], f['stitched'])
+            for f in stitched] == [(5, 500, 0, 90, [0, 1], True), (1, 100, 500, 510, [2], False)]
+
+
+def test_different_five_tuples_are_not_stitched():
+    stitched = stitch_flows([[flow(0, 50, src_port=1000)], [flow(51, 60, src_port=1001)]])
+
+    assert len(stitched) == 2
+    assert not any(f['stitched'] for f in stitched)
+
+
+def file_result(name, start, flows, protocols, sources, status='success'):
+    return {
+        'result': {'status': status, 'file_name': name, 'packet_count': sum(f['packets'] for f in flows),
+                   'summary': {'protocols': protocols, 'services': {'HTTPS': len(flows)}}, 'anomalies': [{}]},
+        'start_time': start, 'end_time': max(f['end_time'] for f in flows),
+        'sources': Counter(sources), 'destinations': Counter({'10.0.0.2': 1}), 'flows': flows
+    }
+
+
+def test_merge_follows_capture_time_and_skips_failures():
+    # Listed out of order: the later rotation comes first
+    results = [
+        file_result('b.pcap', 60, [flow(60, 90, 2)], {'TCP': 2}, {'10.0.0.1': 2}),
+        file_result('a.pcap', 0, [flow(0, 50, 3)], {'TCP': 3, 'UDP': 1}, {'10.0.0.1': 3, '10.0.0.9': 1}),
+        {'result': {'status': 'error', 'file_name': 'broken.pcap', 'error': 'bad capture'}},
+    ]
+
+    summary = merge_results(results, max_gap=30)
+
+    assert summary['files'] == 2
+    assert summary['total_packets'] == 5
+    assert summary['duration'] == 90
+    assert summary['protocols'] == {'TCP': 5, 'UDP': 1}
+    assert summary['top_sources'][0] == {'ip': '10.0.0.1', 'count': 5}
+    assert summary['total_flows'] == 1
+    assert summary['stitched_flows'] == 1
+    assert summary['top_flows'][0]['files'] == ['a.pcap', 'b.pcap']
+    assert summary['anomaly_count'] == 2
+
+
+def zip_archive(members):
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w') as archive:
+        for name, data in members.items():
+            archive.writestr(name, data)
+    buffer.seek(0)
+    return buffer
+
+
+def tar_archive(members):
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode='w:gz') as archive:
+        for name, data in members.items():
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            archive.addfile(info, io.BytesIO(data))
+    buffer.seek(0)
+    return buffer
+
+
+@pytest.mark.parametrize('build, filename', [(zip_archive, 'captures.zip'), (tar_archive, 'captures.tar.gz')])
+def test_archives_yield_only_captures(build, filename):
+    archive = build({'day1/a.pcap': b'first', 'b.pcapng.gz': b'second', 'README.txt': b'notes'})
+
+    members = [(name, member.read()) for name, member in iter_archive_captures(archive, filename)]
+
+    assert is_archive(filename)
+    assert members == [('a.pcap', b'first'), ('b.pcapng.gz', b'second')]
+
+
+def test_archive_member_limit():
+    archive = zip_archive({f"{i}.pcap": b'x' for i in range(3)})
+
+    with pytest.raises(ArchiveTooLarge):
+        list(iter_archive_captures(archive, 'captures.zip', ExpansionBudget(max_members=2)))
+
+
+def test_expansion_budget_is_shared_across_archives():
+    budget = ExpansionBudget(max_bytes=15)
+    assert len(list(iter_archive_captures(zip_archive({'a.pcap': b'x' * 10}), 'a.zip', budget))) == 1
+
+    with pytest.raises(ArchiveTooLarge):
+        list(iter_archive_captures(tar_archive({'b.pcap': b'x' * 10}), 'b.tar.gz', budget))
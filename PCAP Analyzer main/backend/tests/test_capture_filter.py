@@ -0,0 +1,113 @@
+import pytest
+
+from packet_processing.capture_filter import CaptureFilter, FilterError, parse_time
+from packet_processing.pcap_stream import decode_packet, header_fields
+from synth_pcap import encode_frame
+
+ETHERNET = 1
+
+
+@pytest.fixture
+def frames(ipv6_frame):
+    return [
+        encode_frame('TCP', '10.0.0.5', '192.168.1.1', 40000, 443, 64, 0, 0x02),
+        encode_frame('TCP', '192.168.1.1', '10.0.0.5', 443, 40000, 64, 0, 0x12),
+        encode_frame('UDP', '10.0.0.5', '8.8.8.8', 53000, 53, 64, 30, 0),
+        encode_frame('UDP', '172.16.0.9', '10.20.0.1', 1500, 1999, 64, 30, 0),
+        encode_frame('UDP', '172.16.0.9', '8.8.8.8', 123, 123, 64, 48, 0),
+        ipv6_frame('TCP', '2001:db8::1', '2001:db8:ffff::2', 50000, 80),
+        ipv6_frame('UDP', 'fe80::1', '2001:db8::1', 5353, 5353),
+    ]
+
+
+@pytest.mark.parametrize('expression, expected', [
+    ('host 10.0.0.5', [0, 1, 2]),
+    ('src host 10.0.0.5', [0, 2]),
+    ('net 10.0.0.0/8', [0, 1, 2, 3]),
+    ('dst net 8.8.0.0/16 and udp', [2, 4]),
+    ('tcp port 443', [0, 1]),
+    ('dst port 443 or dst port 53', [0, 2]),
+    ('portrange 1000-2000', [3]),
+    ('udp port 123', [4]),
+    ('ip and not tcp', [2, 3, 4]),
+    ('ip6', [5, 6]),
+    ('net 2001:db8::/32', [5, 6]),
+    ('host 2001:db8::1 and tcp dst port 80', [5]),
+    ('not (udp or icmp)', [0, 1, 5]),
+    ('src net 172.16.0.0/12 and not dst host 8.8.8.8', [3]),
+])
+def test_raw_and_decoded_matching_agree(frames, expression, expected):
+    capture_filter = CaptureFilter(expression)
+
+    raw = [i for i, frame in enumerate(frames) if capture_filter.matches_raw(header_fields(frame, ETHERNET))]
+    decoded = [i for i, frame in enumerate(frames)
+               if capture_filter.matches(decode_packet(1.0, len(frame), frame, ETHERNET))]
+
+    assert raw == expected
+    assert decoded == expected
+
+
+def test_icmp_matches_raw_headers_and_named_protocols():
+    # Decoded packets, like TShark's, leave ICMP's protocol unset; sample
+    # data and other dicts that name it still match
+    frame = encode_frame('ICMP', '172.16.0.9', '8.8.8.8', 0, 0, 64, 8, 0)
+    capture_filter = CaptureFilter('icmp and host 8.8.8.8')
+
+    assert capture_filter.matches_raw(header_fields(frame, ETHERNET))
+    assert capture_filter.matches({'timestamp': 1.0, 'protocol': 'ICMP', 'src_ip': '172.16.0.9',
+                                   'dst_ip': '8.8.8.8'})
+
+
+def test_ipv4_net_does_not_match_ipv6_addresses(ipv6_frame):
+    # ::a00:5 has the same low 32 bits as 10.0.0.5
+    frame = ipv6_frame('TCP', '::a00:5', '2001:db8::2', 1, 2)
+
+    assert not CaptureFilter('net 10.0.0.0/8').matches_raw(header_fields(frame, ETHERNET))
+
+
+def test_display_filter_includes_time_bounds():
+    capture_filter = CaptureFilter('src host 10.0.0.5 and tcp dst port 443', start=100, end=200.5)
+
+    assert capture_filter.display_filter() == (
+        "(ip.src == 10.0.0.5 && (tcp.dstport == 443)) && "
+        "frame.time_epoch >= 100.000000 && frame.time_epoch <= 200.500000")
+    assert CaptureFilter('host 2001:db8::1').display_filter() == "ipv6.addr == 2001:db8::1"
+
+
+def test_time_bounds_apply_to_decoded_packets():
+    capture_filter = CaptureFilter(start=10, end=20)
+
+    assert [t for t in (5, 10, 15, 20, 25) if capture_filter.matches({'timestamp': t})] == [10, 15, 20]
+    assert capture_filter.has_time_bounds
+
+
+@pytest.mark.parametrize('expression', [
+    'host',
+    'host 10.0.0.256',
+    'net 10.0.0.0/33',
+    'port 70000',
+    'portrange 20',
+    'tcp host 10.0.0.1',
+    '(tcp or udp',
+    'tcp udp',
+])
+def test_invalid_expressions_raise(expression):
+    with pytest.raises(FilterError):
+        CaptureFilter(expression)
+
+
+def test_from_params():
+    assert CaptureFilter.from_params({}) is None
+    assert CaptureFilter.from_params({'filter': '  ', 'start_time': ''}) is None
+    capture_filter = CaptureFilter.from_params({'filter': 'udp', 'start_time': '1970-01-01T00:01:40Z'})
+    assert capture_filter.describe() == {'expression': 'udp', 'start_time': 100.0, 'end_time': None}
+    with pytest.raises(FilterError):
+        CaptureFilter.from_params({'start_time': 20, 'end_time': 10})
+
+
+def test_parse_time():
+    assert parse_time('1700000000.5') == 1700000000.5
+    assert parse_time('2023-11-14T22:13:20') == 1700000000.0
+    assert parse_time('2023-11-14T23:13:20+01:00') == 1700000000.0
+    with pytest.raises(FilterError):
+        parse_time('yesterday')
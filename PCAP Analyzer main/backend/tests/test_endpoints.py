@@ -0,0 +1,80 @@
+import math
+
+import pytest
+
+from packet_processing.endpoints import (EndpointDictionary, address_key, endpoints_of, intern_packets, key_text,
+                                         packed_key)
+from packet_processing.packet_parser import PacketParser
+
+
+def test_address_keys_round_trip_and_keep_families_apart():
+    v4 = address_key('0.0.0.1')
+    v6 = address_key('::1')
+
+    assert v4 != v6
+    assert key_text(v4) == '0.0.0.1'
+    assert key_text(v6) == '::1'
+    assert packed_key(bytes([10, 0, 0, 1])) == address_key('10.0.0.1')
+    assert packed_key(bytes(15) + b'\x01') == v6
+
+
+@pytest.mark.parametrize('address', ['', 'example.com', '10.0.0', '2001:db8::zz', None])
+def test_address_key_rejects_non_addresses(address):
+    with pytest.raises(ValueError):
+        address_key(address)
+
+
+def test_each_address_is_interned_once():
+    endpoints = EndpointDictionary()
+
+    ids = [endpoints.intern(address) for address in ('10.0.0.1', '2001:db8::1', '10.0.0.1')]
+
+    assert ids == [0, 1, 0]
+    assert len(endpoints) == 2
+    assert endpoints.address(1.0) == '2001:db8::1'
+
+
+def test_packets_are_interned_and_restored():
+    packets = [{'src_ip': '10.0.0.1', 'dst_ip': '10.0.0.2', 'protocol': 'TCP'},
+               {'src_ip': '10.0.0.2', 'dst_ip': '10.0.0.1', 'protocol': 'TCP'},
+               {'protocol': 'ARP'}]
+
+    interned = intern_packets(packets)
+
+    assert [(p.get('src_ip'), p.get('dst_ip')) for p in interned] == [(0, 1), (1, 0), (None, None)]
+    assert endpoints_of(interned) is interned.endpoints
+    assert endpoints_of(packets) is None
+    assert interned.endpoints.restore(dict(interned[1])) == {'src_ip': '10.0.0.2', 'dst_ip': '10.0.0.1',
+                                                            'protocol': 'TCP'}
+    assert interned.endpoints.restore_keys({0: 5, 1: 3}) == {'10.0.0.1': 5, '10.0.0.2': 3}
+
+
+def test_restore_leaves_missing_and_string_addresses_alone():
+    endpoints = EndpointDictionary()
+    endpoints.intern('10.0.0.1')
+
+    record = endpoints.restore({'src_ip': math.nan, 'dst_ip': '192.0.2.1'})
+
+    assert math.isnan(record['src_ip'])
+    assert record['dst_ip'] == '192.0.2.1'
+
+
+def test_flows_group_by_id_and_report_addresses():
+    packets = intern_packets([
+        {'timestamp': 1.0, 'length': 60, 'protocol': 'TCP', 'src_ip': '10.0.0.1', 'dst_ip': '10.0.0.2',
+         'src_port': 1000, 'dst_port': 80},
+        {'timestamp': 2.0, 'length': 40, 'protocol': 'TCP', 'src_ip': '10.0.0.1', 'dst_ip': '10.0.0.2',
+         'src_port': 1000, 'dst_port': 80},
+        {'timestamp': 3.0, 'length': 90, 'protocol': 'UDP', 'src_ip': '2001:db8::1', 'dst_ip': '2001:db8::2',
+         'src_port': 53, 'dst_port': 53},
+    ])
+
+    flows = PacketParser()._analyze_flows(packets)
+
+    assert flows['total_flows'] == 2
+    busiest = flows['top_flows'][0]
+    assert (busiest['src_ip'], busiest['dst_ip'], busiest['packets'], busiest['bytes']) == ('10.0.0.1', '10.0.0.2',
+                                                                                           2, 100)
+    assert flows['top_flows'][1]['src_ip'] == '2001:db8::1'
+    # The packets themselves keep their IDs
+    assert packets[0]['src_ip'] == 0
@@ -0,0 +1,55 @@
+import os
+import time
+
+from llm_cache import LLMResponseCache
+
+
+def test_key_ignores_whitespace_but_not_config():
+    key = LLMResponseCache.make_key("Analyze  this\n traffic", 'mistral', {'temperature': 0.2})
+
+    assert key == LLMResponseCache.make_key("Analyze this traffic", 'mistral', {'temperature': 0.2})
+    assert key != LLMResponseCache.make_key("Analyze this traffic", 'mistral', {'temperature': 0.3})
+    assert key != LLMResponseCache.make_key("Analyze this traffic", 'phi', {'temperature': 0.2})
+
+
+def test_entries_are_returned_as_copies(tmp_path):
+    cache = LLMResponseCache(str(tmp_path))
+    value = {'analysis': 'text', 'identified_threats': ['scan']}
+    cache.put('key', value)
+    value['identified_threats'].append('changed after put')
+
+    first = cache.get('key')
+    first['identified_threats'].append('changed by a caller')
+
+    assert cache.get('key') == {'analysis': 'text', 'identified_threats': ['scan']}
+    assert cache.get_stats()['memory_hits'] == 2
+
+
+def test_disk_tier_survives_a_restart(tmp_path):
+    LLMResponseCache(str(tmp_path)).put('key', {'analysis': 'text'})
+
+    cache = LLMResponseCache(str(tmp_path))
+
+    assert cache.get('key') == {'analysis': 'text'}
+    assert cache.get_stats()['disk_hits'] == 1
+    assert cache.get('key') == {'analysis': 'text'}
+    assert cache.get_stats()['memory_hits'] == 1
+
+
+def test_expired_entries_are_misses(tmp_path, monkeypatch):
+    cache = LLMResponseCache(str(tmp_path), ttl=60)
+    cache.put('key', {'analysis': 'old'})
+    later = time.time() + 120
+    monkeypatch.setattr(time, 'time', lambda: later)
+
+    assert cache.get('key') is None
+    assert not os.path.exists(os.path.join(str(tmp_path), 'key.json'))
+
+
+def test_memory_tier_is_lru_bounded():
+    cache = LLMResponseCache(memory_entries=2)
+    for key in ('a', 'b', 'c'):
+        cache.put(key, {'analysis': key})
+
+    assert cache.get('a') is None
+    assert cache.get('c') == {'analysis': 'c'}
@@ -0,0 +1,102 @@
+import threading
+
+import pytest
+
+import llm_engine
+from llm_engine import LLMEngine, LLMHealthMonitor
+from llm_scheduler import LLMScheduler, SchedulerBusy
+from prompt_builder import ANALYSIS_SECTIONS
+from models.model_registry import ModelConfigRegistry
+
+TIMEOUT = 5
+INPUT = {'packet_summary': {'total_packets': 10, 'protocols': {'TCP': 10}}, 'anomalies': []}
+
+
+@pytest.fixture
+def engine(tmp_path):
+    """An engine whose health monitor reports Ollama as available, without contacting it"""
+    engine = LLMEngine(registry=ModelConfigRegistry(str(tmp_path)), scheduler=LLMScheduler(workers=1, max_queue=8))
+    engine.health = LLMHealthMonitor(engine)
+    engine.health.state['available'] = True
+    return engine
+
+
+@pytest.fixture
+def fast_polling(monkeypatch):
+    monkeypatch.setattr(llm_engine, 'STREAM_POLL_INTERVAL', 0.01)
+
+
+def test_analysis_that_is_not_answered_in_time_returns_an_error(engine, monkeypatch):
+    monkeypatch.setattr(llm_engine, 'ANALYSIS_TIMEOUT', 0.1)
+    release = threading.Event()
+    engine.scheduler.submit('hold', lambda: release.wait(TIMEOUT))
+
+    try:
+        result = engine.analyze(INPUT)
+    finally:
+        release.set()
+
+    assert result['error'] == 'LLM analysis timed out after 0.1s'
+    assert engine.scheduler.get_stats()['cancelled'] == 1
+
+
+def test_stream_relays_worker_events(engine):
+    def stream(prepared):
+        yield {'type': 'token', 'text': 'Hello'}
+        yield {'type': 'result', 'result': {'analysis': 'Hello'}}
+    engine._stream = stream
+
+    events = list(engine.analyze_stream(INPUT))
+
+    assert events == [{'type': 'token', 'text': 'Hello'}, {'type': 'result', 'result': {'analysis': 'Hello'}}]
+
+
+def test_stream_whose_worker_fails_ends_with_an_error(engine, fast_polling):
+    def fail(prepared, events, stop):
+        events.put({'type': 'token', 'text': 'partial'})
+        raise RuntimeError('worker died')
+    engine._stream_into = fail
+
+    events = list(engine.analyze_stream(INPUT))
+
+    assert events[0] == {'type': 'token', 'text': 'partial'}
+    assert events[-1]['type'] == 'result'
+    assert events[-1]['result']['error'] == 'LLM stream failed: worker died'
+
+
+def test_stream_that_never_starts_times_out_and_leaves_the_queue(engine, fast_polling, monkeypatch):
+    monkeypatch.setattr(llm_engine, 'STREAM_WAIT_TIMEOUT', 0.1)
+    release = threading.Event()
+    engine.scheduler.submit('hold', lambda: release.wait(TIMEOUT))
+
+    try:
+        events = list(engine.analyze_stream(INPUT))
+    finally:
+        release.set()
+
+    assert len(events) == 1
+    assert events[0]['result']['error'] == 'LLM stream produced nothing for 0.1s'
+    assert engine.scheduler.get_stats()['cancelled'] == 1
+
+
+def test_sections_run_concurrently_on_the_scheduler(engine):
+    engine._generate_section = lambda prepared, timeout: "Alert level: High" if 'SECURITY' in prepared[
+        'request_data']['prompt'] else "text"
+
+    result = engine.analyze_sections(INPUT, section_timeout=TIMEOUT)
+
+    assert set(result['sections']) == {key for key, _, _ in ANALYSIS_SECTIONS}
+    assert result['section_errors'] == {}
+    assert result['alert_level'] == 'High'
+
+
+def test_sections_that_do_not_all_fit_are_not_queued(engine):
+    # Six sections never fit a queue of four
+    engine.scheduler = LLMScheduler(workers=1, max_queue=4)
+    generated = []
+    engine._generate_section = lambda prepared, timeout: generated.append(prepared) or "text"
+
+    with pytest.raises(SchedulerBusy):
+        engine.analyze_sections(INPUT, section_timeout=TIMEOUT)
+    assert engine.scheduler.get_stats()['submitted'] == 0
+    assert generated == []
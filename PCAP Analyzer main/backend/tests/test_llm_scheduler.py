@@ -0,0 +1,148 @@
+import threading
+from concurrent.futures import CancelledError, TimeoutError as FutureTimeout
+
+import pytest
+
+from llm_scheduler import LLMScheduler, SchedulerBusy
+
+TIMEOUT = 5
+
+
+@pytest.fixture
+def blocked():
+    """A one-worker scheduler whose worker is held by a running job until ``release`` is set"""
+    scheduler = LLMScheduler(workers=1, max_queue=3)
+    started, release = threading.Event(), threading.Event()
+
+    def hold():
+        started.set()
+        release.wait(TIMEOUT)
+        return 'held'
+    future = scheduler.submit('hold', hold)
+    assert started.wait(TIMEOUT)
+    yield scheduler, release, future
+    release.set()
+
+
+def test_run_returns_the_result():
+    scheduler = LLMScheduler(workers=2)
+
+    assert scheduler.run('key', lambda: 42, timeout=TIMEOUT) == 42
+    assert scheduler.get_stats()['completed'] == 1
+
+
+def test_errors_reach_the_caller():
+    scheduler = LLMScheduler(workers=1)
+
+    def fail():
+        raise RuntimeError("boom")
+    with pytest.raises(RuntimeError, match="boom"):
+        scheduler.run('key', fail, timeout=TIMEOUT)
+    assert scheduler.get_stats()['failed'] == 1
+
+
+def test_identical_requests_are_coalesced(blocked):
+    scheduler, release, _ = blocked
+    calls = []
+
+    first = scheduler.submit('same', lambda: calls.append(1) or 'result')
+    second = scheduler.submit('same', lambda: calls.append(2) or 'other')
+    release.set()
+
+    assert first is second
+    assert first.result(TIMEOUT) == 'result'
+    assert calls == [1]
+    assert scheduler.get_stats()['coalesced'] == 1
+
+
+def test_interactive_requests_are_served_before_batch(blocked):
+    scheduler, release, _ = blocked
+    order = []
+
+    futures = [scheduler.submit('batch', lambda: order.append('batch'), priority='batch'),
+               scheduler.submit('interactive', lambda: order.append('interactive'))]
+    release.set()
+    for future in futures:
+        future.result(TIMEOUT)
+
+    assert order == ['interactive', 'batch']
+
+
+def test_full_queue_rejects_at_once(blocked):
+    scheduler, _, _ = blocked
+    for i in range(3):
+        scheduler.submit(f"queued-{i}", lambda: None)
+
+    with pytest.raises(SchedulerBusy) as busy:
+        scheduler.submit('one-too-many', lambda: None)
+    with pytest.raises(SchedulerBusy):
+        scheduler.submit_many([('another', lambda: None)])
+    assert busy.value.retry_after >= 1
+    assert scheduler.get_stats()['rejected'] == 2
+    # Joining a queued request takes no extra slot
+    scheduler.submit('queued-0', lambda: None)
+
+
+def test_submit_many_queues_all_or_nothing(blocked):
+    scheduler, release, _ = blocked
+    scheduler.submit('queued', lambda: 'queued')
+
+    with pytest.raises(SchedulerBusy):
+        scheduler.submit_many([(f"section-{i}", lambda: None) for i in range(3)])
+    assert scheduler.get_stats()['queued'] == 1
+
+    # A request already in flight takes no slot, so these fit
+    futures = scheduler.submit_many([('queued', lambda: 'other'), ('a', lambda: 'a'), ('b', lambda: 'b')])
+    release.set()
+    assert [future.result(TIMEOUT) for future in futures] == ['queued', 'a', 'b']
+
+
+def test_cancel_withdraws_a_queued_request(blocked):
+    scheduler, release, _ = blocked
+    ran = []
+
+    future = scheduler.submit('abandoned', lambda: ran.append(1))
+
+    assert scheduler.cancel('abandoned', future)
+    assert future.cancelled()
+    with pytest.raises(CancelledError):
+        future.result(TIMEOUT)
+    assert scheduler.get_stats()['queued'] == 0
+    release.set()
+    assert scheduler.run('after', lambda: 'done', timeout=TIMEOUT) == 'done'
+    assert ran == []
+
+
+def test_run_withdraws_a_request_that_times_out(blocked):
+    scheduler, release, _ = blocked
+    ran = []
+
+    with pytest.raises(FutureTimeout):
+        scheduler.run('slow', lambda: ran.append(1), timeout=0.05)
+
+    assert scheduler.get_stats()['cancelled'] == 1
+    release.set()
+    assert scheduler.run('after', lambda: 'done', timeout=TIMEOUT) == 'done'
+    assert ran == []
+
+
+def test_cancel_keeps_a_request_other_callers_wait_for(blocked):
+    scheduler, release, _ = blocked
+
+    future = scheduler.submit('shared', lambda: 'value')
+    scheduler.submit('shared', lambda: 'value')
+
+    assert not scheduler.cancel('shared', future)
+    release.set()
+    assert future.result(TIMEOUT) == 'value'
+
+
+def test_cancel_cannot_stop_a_running_request(blocked):
+    scheduler, release, held = blocked
+
+    assert not scheduler.cancel('hold', held)
+    # A new identical request no longer joins the abandoned one
+    fresh = scheduler.submit('hold', lambda: 'fresh')
+    release.set()
+    assert held.result(TIMEOUT) == 'held'
+    assert fresh.result(TIMEOUT) == 'fresh'
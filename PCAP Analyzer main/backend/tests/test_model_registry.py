@@ -0,0 +1,84 @@
+import json
+import os
+
+from models.model_registry import DEFAULT_OPTIONS, ModelConfigRegistry
+
+
+def write_config(directory, base_name, config, mtime=None):
+    path = directory / f"{base_name}_config.json"
+    path.write_text(config if isinstance(config, str) else json.dumps(config))
+    if mtime is not None:
+        os.utime(path, (mtime, mtime))
+    return path
+
+
+def test_configs_are_loaded_at_startup(tmp_path):
+    write_config(tmp_path, 'phi', {'temperature': 0.3, 'num_predict': 256, 'system': 'Be brief'})
+
+    registry = ModelConfigRegistry(str(tmp_path))
+
+    assert registry.get('phi:latest') == {'temperature': 0.3, 'num_predict': 256, 'system': 'Be brief'}
+    assert registry.status() == {'phi': {'valid': True, 'errors': [], 'num_predict': 256}}
+
+
+def test_request_puts_sampling_settings_in_options(tmp_path):
+    write_config(tmp_path, 'phi', {'top_k': 20, 'num_predict': 256, 'keep_alive': '5m',
+                                   'prompt_token_budget': 900})
+
+    request = ModelConfigRegistry(str(tmp_path)).build_request('phi:2.7b', 'Analyze', stream=True)
+
+    assert request == {'model': 'phi:2.7b', 'prompt': 'Analyze', 'stream': True, 'keep_alive': '5m',
+                       'options': {'temperature': DEFAULT_OPTIONS['temperature'], 'top_k': 20, 'num_predict': 256}}
+
+
+def test_edited_config_is_reloaded_on_mtime_change(tmp_path):
+    write_config(tmp_path, 'phi', {'num_predict': 256}, mtime=1000)
+    registry = ModelConfigRegistry(str(tmp_path))
+    assert registry.options('phi')['num_predict'] == 256
+
+    write_config(tmp_path, 'phi', {'num_predict': 512}, mtime=2000)
+
+    assert registry.options('phi')['num_predict'] == 512
+
+
+def test_unchanged_config_is_not_reread(tmp_path):
+    path = write_config(tmp_path, 'phi', {'num_predict': 256}, mtime=1000)
+    registry = ModelConfigRegistry(str(tmp_path))
+    # Same mtime: the cached config stands even though the content differs
+    write_config(tmp_path, 'phi', {'num_predict': 999}, mtime=1000)
+
+    assert registry.get('phi') == {'num_predict': 256}
+    path.unlink()
+    assert registry.get('phi') == {}
+
+
+def test_invalid_configs_fall_back_to_defaults(tmp_path):
+    write_config(tmp_path, 'phi', {'temperature': 5, 'top_k': True, 'colour': 'blue', 'output_format': 'yaml'})
+    write_config(tmp_path, 'gemma', '{not json')
+
+    registry = ModelConfigRegistry(str(tmp_path))
+
+    assert registry.options('phi') == DEFAULT_OPTIONS
+    assert registry.get('gemma') == {}
+    status = registry.status()
+    assert not status['phi']['valid']
+    assert len(status['phi']['errors']) == 4
+    assert status['gemma']['errors'][0].startswith('could not be parsed')
+
+
+def test_a_fixed_config_becomes_valid_again(tmp_path):
+    write_config(tmp_path, 'phi', {'num_predict': 0}, mtime=1000)
+    registry = ModelConfigRegistry(str(tmp_path))
+    assert not registry.status()['phi']['valid']
+
+    write_config(tmp_path, 'phi', {'num_predict': 64}, mtime=2000)
+
+    assert registry.get('phi') == {'num_predict': 64}
+    assert registry.status()['phi']['valid']
+
+
+def test_shipped_configs_are_valid():
+    registry = ModelConfigRegistry()
+
+    assert registry.status()
+    assert all(entry['valid'] for entry in registry.status().values())
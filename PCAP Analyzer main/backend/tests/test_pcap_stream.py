@@ -0,0 +1,96 @@
+import gzip
+
+import pytest
+
+from packet_processing.endpoints import address_key
+from packet_processing.pcap_stream import (PcapFormatError, PcapStreamReader, decode_packet, detect_service,
+                                           header_fields, is_classic_pcap, iter_packets, transport_payload)
+from synth_pcap import encode_frame
+
+ETHERNET = 1
+
+
+def test_reader_yields_records_in_order(write_pcap):
+    frames = [encode_frame('TCP', '10.0.0.1', '10.0.0.2', 40000 + i, 80, 64, 10, 0x18) for i in range(3)]
+    path = write_pcap([(100.5 + i, frame) for i, frame in enumerate(frames)])
+
+    reader = PcapStreamReader(path)
+    records = list(reader)
+
+    assert [timestamp for timestamp, _, _ in records] == [100.5, 101.5, 102.5]
+    assert [data for _, _, data in records] == frames
+    assert reader.linktype == ETHERNET
+    assert reader.records == 3
+
+
+def test_gzip_capture_reads_like_plain(write_pcap, tmp_path):
+    frames = [encode_frame('UDP', '10.0.0.1', '10.0.0.2', 5000, 53, 64, 20, 0, i) for i in range(5)]
+    path = write_pcap([(1.0 + i, frame) for i, frame in enumerate(frames)])
+    compressed = tmp_path / 'capture.pcap.gz'
+    with open(path, 'rb') as f:
+        compressed.write_bytes(gzip.compress(f.read()))
+
+    assert list(iter_packets(str(compressed))) == list(iter_packets(path))
+    assert is_classic_pcap(str(compressed))
+
+
+def test_pcapng_and_garbage_are_not_classic(tmp_path):
+    pcapng = tmp_path / 'capture.pcapng'
+    pcapng.write_bytes(b'\x0a\x0d\x0d\x0a' + b'\x00' * 28)
+    garbage = tmp_path / 'notes.txt'
+    garbage.write_bytes(b'not a capture at all, just text')
+
+    assert not is_classic_pcap(str(pcapng))
+    assert not is_classic_pcap(str(garbage))
+    with pytest.raises(PcapFormatError):
+        list(PcapStreamReader(str(pcapng)))
+
+
+def test_decode_ipv4_tcp():
+    frame = encode_frame('TCP', '192.168.1.10', '93.184.216.34', 51515, 443, 57, 0, 0x12)
+
+    packet = decode_packet(1.25, len(frame), frame, ETHERNET)
+
+    assert packet == {'timestamp': 1.25, 'length': len(frame), 'protocol': 'TCP', 'src_ip': '192.168.1.10',
+                      'dst_ip': '93.184.216.34', 'ttl': 57, 'src_port': 51515, 'dst_port': 443, 'tcp_flags': 0x12}
+    assert detect_service(packet) == 'HTTP/HTTPS (port 443)'
+
+
+def test_decode_ipv6_udp(ipv6_frame):
+    frame = ipv6_frame('UDP', '2001:db8::1', '2001:db8::53', 40000, 53, b'payload', hop_limit=33)
+
+    packet = decode_packet(2.0, len(frame), frame, ETHERNET)
+
+    assert packet['src_ip'] == '2001:db8::1'
+    assert packet['dst_ip'] == '2001:db8::53'
+    assert (packet['protocol'], packet['ttl'], packet['src_port'], packet['dst_port']) == ('UDP', 33, 40000, 53)
+    assert detect_service(packet) == 'DNS'
+
+
+def test_header_fields_use_address_keys(ipv6_frame):
+    v4 = encode_frame('UDP', '10.1.2.3', '10.3.2.1', 1234, 5678, 64, 4, 0)
+    v6 = ipv6_frame('TCP', '2001:db8::a', '2001:db8::b', 1111, 2222)
+
+    assert header_fields(v4, ETHERNET) == (address_key('10.1.2.3'), address_key('10.3.2.1'), 17, 1234, 5678)
+    assert header_fields(v6, ETHERNET) == (address_key('2001:db8::a'), address_key('2001:db8::b'), 6, 1111, 2222)
+
+
+def test_transport_payload_trims_ethernet_padding():
+    # A short UDP datagram is padded to the 60-byte Ethernet minimum
+    frame = encode_frame('UDP', '10.0.0.1', '10.0.0.2', 1000, 2000, 64, b'abc', 0)
+
+    fields, payload = transport_payload(frame, ETHERNET)
+
+    assert fields[3:] == (1000, 2000)
+    assert payload == b'abc'
+
+
+def test_truncated_frame_keeps_what_was_decoded():
+    frame = encode_frame('TCP', '10.0.0.1', '10.0.0.2', 1000, 80, 64, 0, 0x02)
+    # Cut inside the TCP header: addresses survive, ports do not
+    packet = decode_packet(3.0, len(frame), frame[:36], ETHERNET)
+
+    assert packet['src_ip'] == '10.0.0.1'
+    assert packet['protocol'] == 'TCP'
+    assert 'dst_port' not in packet
+    assert header_fields(b'\x00' * 10, ETHERNET) == (None, None, None, 0, 0)
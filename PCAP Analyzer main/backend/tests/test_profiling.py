@@ -0,0 +1,75 @@
+import json
+import os
+import threading
+
+from profiling import AnalysisProfiler, ProfileStore, profile_stage
+
+TIMEOUT = 5
+
+
+def test_stages_write_reports_and_a_summary(tmp_path):
+    profiler = AnalysisProfiler(str(tmp_path), 'analysis-1', 'capture.pcap')
+
+    with profiler.stage('parse'):
+        data = [bytes(1024) for _ in range(100)]
+    summary = profiler.finish()
+
+    assert profiler.profile_id.startswith('analysis-1-') and profiler.profile_id != 'analysis-1'
+    stage = summary['stages']['parse']
+    assert stage['traced_peak_bytes'] >= 100 * 1024
+    assert os.path.exists(os.path.join(profiler.directory, stage['report']))
+    with open(os.path.join(profiler.directory, 'summary.json')) as f:
+        assert json.load(f)['profile_id'] == profiler.profile_id
+    assert len(data) == 100
+
+
+def test_concurrent_profiled_stages_do_not_reset_each_others_peak(tmp_path):
+    first, second = AnalysisProfiler(str(tmp_path), 'a'), AnalysisProfiler(str(tmp_path), 'b')
+    allocated, release = threading.Event(), threading.Event()
+    order = []
+
+    def large_stage():
+        with first.stage('detection'):
+            buffer = bytearray(8 * 2 ** 20)
+            allocated.set()
+            release.wait(TIMEOUT)
+            del buffer
+            order.append('first done')
+
+    def small_stage():
+        with second.stage('detection'):
+            order.append('second started')
+
+    worker = threading.Thread(target=large_stage)
+    worker.start()
+    assert allocated.wait(TIMEOUT)
+    waiter = threading.Thread(target=small_stage)
+    waiter.start()
+    # Without the stage lock the second stage would run (and reset the peak) here
+    waiter.join(0.2)
+    release.set()
+    worker.join(TIMEOUT)
+    waiter.join(TIMEOUT)
+    first.finish()
+    second.finish()
+
+    assert order == ['first done', 'second started']
+    assert first.stages['detection']['traced_peak_bytes'] >= 8 * 2 ** 20
+
+
+def test_store_only_profiles_authorized_requests(tmp_path):
+    store = ProfileStore(str(tmp_path), token='secret')
+
+    assert store.profiler_for({}, 'a') is None
+    assert store.profiler_for({'X-Profile-Token': 'wrong'}, 'a') is None
+    assert store.profiler_for({'X-Profile-Token': 'secret'}, '../escape') is None
+    profiler = store.profiler_for({'X-Profile-Token': 'secret'}, 'a')
+    with profile_stage(profiler, 'parse'):
+        pass
+    profiler.finish()
+
+    assert [p['profile_id'] for p in store.list()] == [profiler.profile_id]
+    assert store.path(profiler.profile_id, 'parse.txt') is not None
+    assert store.path(profiler.profile_id, '../summary.json') is None
+    with profile_stage(None, 'parse'):
+        pass
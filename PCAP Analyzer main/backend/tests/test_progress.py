@@ -0,0 +1,70 @@
+import json
+import threading
+import time
+
+from progress import ProgressBroker
+
+
+def events(messages):
+    return [json.loads(message[len('data: '):]) for message in messages if message.startswith('data: ')]
+
+
+def test_late_subscriber_replays_a_finished_analysis():
+    broker = ProgressBroker()
+    report = broker.reporter('a1')
+    report('parsed', packets=10)
+    report('complete')
+
+    replayed = events(broker.subscribe('a1'))
+
+    assert [(event['analysis_id'], event['stage']) for event in replayed] == [('a1', 'parsed'), ('a1', 'complete')]
+    assert replayed[0]['packets'] == 10
+    assert broker.reporter(None) is None
+
+
+def test_subscriber_receives_live_events_until_the_analysis_ends():
+    broker = ProgressBroker(keepalive=0.05)
+    stream = broker.subscribe('a1')
+    report = broker.reporter('a1')
+    report('stored')
+    received = [next(stream)]
+
+    publisher = threading.Timer(0.1, lambda: (report('parsed'), report('error', error='boom')))
+    publisher.start()
+    received += list(stream)
+    publisher.join()
+
+    assert [event['stage'] for event in events(received)] == ['stored', 'parsed', 'error']
+    assert ': keep-alive\n\n' in received
+    assert broker.channels['a1']['subscribers'] == []
+
+
+def test_finished_channels_expire_after_retention():
+    broker = ProgressBroker(retention=60)
+    broker.publish('old', 'complete')
+    broker.channels['old']['finished_at'] -= 120
+    broker.publish('recent', 'complete')
+
+    assert set(broker.channels) == {'recent'}
+
+
+def test_idle_unfinished_channels_expire():
+    broker = ProgressBroker(idle_timeout=60)
+    broker.publish('stalled', 'parsing')
+    broker.channels['stalled']['last_event_at'] -= 120
+    broker.publish('active', 'parsing')
+
+    assert set(broker.channels) == {'active'}
+
+
+def test_subscription_to_an_idle_channel_ends():
+    broker = ProgressBroker(keepalive=0.01, idle_timeout=0.05)
+    started = time.time()
+
+    messages = list(broker.subscribe('nobody-publishes-this'))
+
+    assert time.time() - started < 5
+    assert all(message == ': keep-alive\n\n' for message in messages)
+    # Nothing keeps the channel once its subscriber has gone
+    broker.publish('other', 'stored')
+    assert 'nobody-publishes-this' not in broker.channels
@@ -0,0 +1,122 @@
+from prompt_builder import (MIN_PROMPT_BUDGET, PROMPT_FOOTER, SECTION_LEVELS, PromptBuilder, bucket_services,
+                            dedupe_anomalies, estimate_tokens, prompt_budget)
+
+
+def analysis_input(anomalies=40, flows=20, services=30):
+    return {
+        'packet_summary': {
+            'total_packets': 12345,
+            'duration': 60.5,
+            'protocols': {'UDP': 100, 'TCP': 900, 'ICMP': 5},
+            'services': {f"service-{i}": 100 - i for i in range(services)},
+            'top_sources': [{'ip': f"10.0.0.{i}", 'count': 50 - i} for i in range(10)],
+            'top_destinations': [{'ip': f"10.1.0.{i}", 'count': 40 - i} for i in range(10)],
+        },
+        'anomalies': [{'src_ip': f"10.0.0.{i}", 'dst_ip': '8.8.8.8', 'protocol': 'UDP',
+                       'anomaly_score': -0.5 - i / 100, 'description': f"odd burst {i}"}
+                      for i in range(anomalies)],
+        'flow_data': {'top_flows': [{'src_ip': '10.0.0.1', 'src_port': 1000 + i, 'dst_ip': '10.0.0.2',
+                                     'dst_port': 443, 'protocol': 'TCP', 'packets': 100 - i, 'bytes': 5000}
+                                    for i in range(flows)]},
+    }
+
+
+def test_prompt_budget():
+    assert prompt_budget({'prompt_token_budget': 900, 'num_ctx': 4096}) == 900
+    assert prompt_budget({'num_ctx': 4096, 'num_predict': 1024}) == 3072
+    assert prompt_budget({'num_ctx': 512, 'num_predict': 500}) == MIN_PROMPT_BUDGET
+
+
+def detector_row(src_ip, dst_ip, score, packets=10):
+    """An anomaly as AnomalyDetector reports it: one row of per-pair flow features"""
+    return {'src_ip': src_ip, 'dst_ip': dst_ip, 'length_count': packets, 'length_mean': 60.0, 'length_std': 0.0,
+            'length_min': 60, 'length_max': 60, 'inter_arrival_time_mean': 0.01, 'inter_arrival_time_std': 0.0,
+            'anomaly_score': score}
+
+
+def test_dedupe_groups_a_scan_reported_per_pair():
+    # One host probing a /24, plus an unrelated and more anomalous pair
+    anomalies = [detector_row('10.0.0.5', f"10.0.1.{i}", -0.11 - i / 1000, packets=2) for i in range(1, 31)]
+    anomalies.append(detector_row('192.168.1.7', '203.0.113.9', -0.4, packets=5000))
+
+    groups = dedupe_anomalies(anomalies)
+
+    assert groups == [
+        {'src_ip': '192.168.1.7', 'dst_ip': '203.0.113.9', 'protocol': '', 'description': '',
+         'anomaly_score': -0.4, 'count': 1, 'packets': 5000},
+        {'src_ip': '10.0.0.5', 'dst_ip': '10.0.1.0/24', 'protocol': '', 'description': '',
+         'anomaly_score': -0.14, 'count': 30, 'packets': 60},
+    ]
+
+
+def test_dedupe_keeps_score_buckets_networks_and_descriptions_apart():
+    anomalies = [detector_row('10.0.0.5', '10.0.1.1', -0.12), detector_row('10.0.0.5', '10.0.1.2', -0.32),
+                 detector_row('10.0.0.5', '10.0.2.1', -0.12),
+                 dict(detector_row('10.0.0.5', '10.0.1.3', -0.12), description='port sweep')]
+
+    assert len(dedupe_anomalies(anomalies)) == 4
+
+
+def test_dedupe_groups_ipv6_by_prefix_and_tolerates_odd_values():
+    anomalies = [detector_row(f"2001:db8::{i}", '2001:db8:1::1', -0.2) for i in range(1, 4)]
+    anomalies.append({'src_ip': 'Unknown', 'dst_ip': None, 'anomaly_score': 'bad', 'length_count': float('nan')})
+
+    groups = dedupe_anomalies(anomalies)
+
+    assert [(g['src_ip'], g['dst_ip'], g['count'], g['packets']) for g in groups] == [
+        ('2001:db8::/64', '2001:db8:1::1', 3, 30), ('Unknown', 'None', 1, 0)]
+
+
+def test_grouped_anomalies_are_rendered_compactly():
+    data = analysis_input(anomalies=0, flows=0, services=0)
+    data['anomalies'] = [detector_row('10.0.0.5', f"10.0.1.{i}", -0.12, packets=3) for i in range(1, 21)]
+
+    built = PromptBuilder().build(data)
+
+    assert "10.0.0.5 > 10.0.1.0/24 -0.120 x20 60 pkts\n" in built['prompt']
+
+
+def test_bucket_services_folds_the_tail():
+    services = {'DNS': 50, 'HTTP': 30, 'NTP': 2, 'SSDP': 1}
+
+    assert bucket_services(services, 4) == [('DNS', 50), ('HTTP', 30), ('NTP', 2), ('SSDP', 1)]
+    assert bucket_services(services, 2) == [('DNS', 50), ('HTTP', 30), ('Other (2 services)', 3)]
+    assert bucket_services(services, 0) == [('4 services', 83)]
+
+
+def test_unbounded_prompt_uses_the_most_generous_level():
+    built = PromptBuilder().build(analysis_input())
+
+    assert built['level'] == 0
+    assert built['prompt'].endswith(PROMPT_FOOTER)
+    assert "Protocols: TCP 900, UDP 100, ICMP 5" in built['prompt']
+    assert f"... {40 - SECTION_LEVELS[0]['anomalies']} more distinct anomalies omitted" in built['prompt']
+    assert built['estimated_tokens'] == estimate_tokens(built['prompt'])
+
+
+def test_sections_are_trimmed_to_fit_the_budget():
+    builder = PromptBuilder()
+    full = builder.build(analysis_input())
+
+    built = builder.build(analysis_input(), budget=full['estimated_tokens'] - 100)
+
+    assert built['level'] > 0
+    assert built['estimated_tokens'] <= built['budget']
+    # Anomalies are the last section to be trimmed
+    assert "DETECTED ANOMALIES" in built['prompt']
+
+
+def test_same_input_gives_the_same_prompt():
+    # The LLM cache is keyed on the prompt, so building must be deterministic
+    first = PromptBuilder().build(analysis_input(), budget=600)
+
+    assert PromptBuilder().build(analysis_input(), budget=600) == first
+
+
+def test_custom_header_and_footer():
+    built = PromptBuilder().build(analysis_input(anomalies=0, flows=0, services=0), header="HEAD\n",
+                                  footer="FOOT")
+
+    assert built['prompt'].startswith("HEAD\nNETWORK SUMMARY:")
+    assert built['prompt'].endswith("FOOT")
+    assert "DETECTED ANOMALIES" not in built['prompt']
@@ -0,0 +1,88 @@
+import random
+
+import pytest
+
+from packet_processing.pcap_stream import decode_packet, header_fields
+from packet_processing.sampling import FlowSampler
+from synth_pcap import encode_frame
+
+ETHERNET = 1
+
+
+def flow_packets(count, seed=0):
+    """One packet in each direction for ``count`` random TCP/UDP flows"""
+    rng = random.Random(seed)
+    packets = []
+    for i in range(count):
+        proto = rng.choice(['TCP', 'UDP'])
+        src, dst = f"10.0.{rng.randint(0, 255)}.{rng.randint(1, 254)}", f"192.168.{i // 250}.{i % 250 + 1}"
+        sport, dport = rng.randint(1024, 65535), rng.choice([53, 80, 443])
+        packets.append({'protocol': proto, 'src_ip': src, 'dst_ip': dst, 'src_port': sport, 'dst_port': dport,
+                        'length': 100, 'timestamp': float(i)})
+        packets.append({'protocol': proto, 'src_ip': dst, 'dst_ip': src, 'src_port': dport, 'dst_port': sport,
+                        'length': 60, 'timestamp': i + 0.5})
+    return packets
+
+
+@pytest.mark.parametrize('rate', [0, -0.1, 1.5])
+def test_rate_must_be_in_unit_interval(rate):
+    with pytest.raises(ValueError):
+        FlowSampler(rate)
+
+
+def test_flows_are_kept_or_dropped_whole():
+    sampler = FlowSampler(0.3, seed=7)
+    packets = flow_packets(500)
+
+    decisions = [sampler.keep_packet(p) for p in packets]
+
+    # Both directions of every flow get the same decision
+    assert decisions[0::2] == decisions[1::2]
+    assert 0.2 < sum(decisions[0::2]) / 500 < 0.4
+
+
+def test_decisions_depend_on_seed_only():
+    packets = flow_packets(200)
+
+    first = [FlowSampler(0.5, seed=1).keep_packet(p) for p in packets]
+
+    assert first == [FlowSampler(0.5, seed=1).keep_packet(p) for p in packets]
+    assert first != [FlowSampler(0.5, seed=2).keep_packet(p) for p in packets]
+
+
+def test_raw_and_decoded_decisions_agree(ipv6_frame):
+    sampler = FlowSampler(0.5, seed=3)
+    frames = [encode_frame('TCP', f"10.0.0.{i}", '10.1.0.1', 30000 + i, 443, 64, 0, 0x02) for i in range(1, 60)]
+    frames += [ipv6_frame('UDP', f"2001:db8::{i:x}", '2001:db8:1::1', 40000 + i, 53) for i in range(1, 60)]
+
+    for frame in frames:
+        packet = decode_packet(1.0, len(frame), frame, ETHERNET)
+        assert sampler.keep_fields(header_fields(frame, ETHERNET), frame) == sampler.keep_packet(packet)
+
+
+def test_full_rate_estimate_is_exact():
+    packets = flow_packets(100)
+
+    estimate = FlowSampler(1).estimate(packets)
+
+    assert estimate['packets']['estimate'] == 200
+    assert estimate['bytes']['estimate'] == 100 * 160
+    assert estimate['flows']['estimate'] == 100
+    assert estimate['packets']['ci95'] == [200, 200]
+
+
+def test_estimate_scales_sampled_totals():
+    sampler = FlowSampler(0.25, seed=5)
+    packets = flow_packets(4000)
+    kept = [p for p in packets if sampler.keep_packet(p)]
+
+    estimate = sampler.estimate(kept)
+
+    assert estimate['sampled_packets'] == len(kept)
+    assert estimate['packets']['estimate'] == round(len(kept) / 0.25)
+    low, high = estimate['packets']['ci95']
+    assert len(kept) <= low <= len(packets) <= high
+    low, high = estimate['flows']['ci95']
+    assert low <= 4000 <= high
+    assert set(estimate['protocols']) == {'TCP', 'UDP'}
+    assert sampler.scale({'DNS': 10}) == {'DNS': 40}
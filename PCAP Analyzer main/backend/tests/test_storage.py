@@ -0,0 +1,113 @@
+import io
+import os
+
+import pytest
+
+from storage import UploadStore, capture_extension
+
+
+def upload(store, content, name='capture.pcap', **kwargs):
+    return store.save(io.BytesIO(content), name, **kwargs)
+
+
+def test_identical_uploads_are_stored_once(tmp_path):
+    store = UploadStore(str(tmp_path))
+
+    first = upload(store, b'capture bytes', 'a.pcap')
+    second = upload(store, b'capture bytes', 'b.pcap')
+
+    assert first['digest'] == second['digest']
+    assert (first['deduplicated'], second['deduplicated']) == (False, True)
+    assert second['references'] == 2
+    assert second['names'] == ['a.pcap', 'b.pcap']
+    assert store.get_stats()['dedup_hits'] == 1
+    with open(second['path'], 'rb') as f:
+        assert f.read() == b'capture bytes'
+
+
+@pytest.mark.parametrize('name, extension', [
+    ('trace.pcap', '.pcap'), ('trace.PCAPNG', '.pcapng'), ('trace.cap', '.cap'),
+    ('trace.pcap.gz', '.pcap.gz'), ('trace.pcapng.zst', '.pcapng.zst'), ('trace', '.pcap'), (None, '.pcap'),
+])
+def test_capture_extension(name, extension):
+    assert capture_extension(name) == extension
+
+
+def test_objects_keep_their_upload_extension_across_restarts(tmp_path):
+    stored = upload(UploadStore(str(tmp_path)), b'\x0a\x0d\x0d\x0a', 'trace.pcapng.gz')
+
+    assert stored['path'].endswith(stored['digest'] + '.pcapng.gz')
+    assert UploadStore(str(tmp_path)).get(stored['digest'])['path'] == stored['path']
+
+
+def test_release_removes_unreferenced_captures_with_derived_artifacts(tmp_path):
+    store = UploadStore(str(tmp_path))
+    stored = upload(store, b'capture bytes')
+    upload(store, b'capture bytes')
+    derived = store.derived_path(stored['digest'], 'record_index.json')
+    with open(derived, 'w') as f:
+        f.write('{}')
+
+    assert store.release(stored['digest'])
+    assert os.path.exists(stored['path'])
+    assert store.release(stored['digest'])
+    assert not os.path.exists(stored['path'])
+    assert not os.path.exists(derived)
+    assert not store.release(stored['digest'])
+
+
+def test_release_while_pinned_removes_with_the_last_pin(tmp_path):
+    store = UploadStore(str(tmp_path))
+
+    with store.receive(io.BytesIO(b'capture bytes'), 'capture.pcap') as stored:
+        with store.checkout(stored['digest']):
+            store.release(stored['digest'])
+        assert os.path.exists(stored['path'])
+
+    assert not os.path.exists(stored['path'])
+    assert store.get(stored['digest']) is None
+    assert UploadStore(str(tmp_path)).list() == []
+
+
+def test_eviction_drops_least_recently_used_unpinned_captures(tmp_path):
+    store = UploadStore(str(tmp_path), max_bytes=250)
+    old = upload(store, b'a' * 100)
+    pinned = upload(store, b'b' * 100, pin=True)
+    store.get(old['digest'])
+
+    upload(store, b'c' * 100)
+
+    # The pinned capture is the least recently used, but only the old one may go
+    assert store.get(old['digest']) is None
+    assert store.get(pinned['digest']) is not None
+    assert store.get_stats()['evictions'] == 1
+    assert store.usage() == 200
+
+
+def test_age_policy_evicts_the_oldest_capture(tmp_path):
+    store = UploadStore(str(tmp_path), max_bytes=250, eviction_policy='age')
+    old = upload(store, b'a' * 100)
+    newer = upload(store, b'b' * 100)
+    store.get(old['digest'])
+
+    upload(store, b'c' * 100)
+
+    assert store.get(old['digest']) is None
+    assert store.get(newer['digest']) is not None
+
+
+def test_derived_artifacts_count_against_the_budget(tmp_path):
+    store = UploadStore(str(tmp_path), max_bytes=250)
+    first = upload(store, b'a' * 100)
+    with open(store.derived_path(first['digest'], 'index.json'), 'wb') as f:
+        f.write(b'x' * 100)
+
+    second = upload(store, b'b' * 100)
+
+    assert store.get(first['digest']) is None
+    assert store.get(second['digest']) is not None
+
+
+def test_unknown_eviction_policy_is_rejected(tmp_path):
+    with pytest.raises(ValueError):
+        UploadStore(str(tmp_path), eviction_policy='random')
@@ -77,7 +77,7 @@ export default function UploadPage() {
         return (
           <Box sx={{ textAlign: 'center', py: 4 }}>
             <input
-              accept=".pcap,.pcapng,.cap"
+              accept=".pcap,.pcapng,.cap,.gz,.zst,.xz,.bz2"
               style={{ display: 'none' }}
               id="file-upload"
               type="file"
@@ -95,7 +95,7 @@ export default function UploadPage() {
               </Button>
             </label>
             <Typography variant="body2" color="text.secondary">
-              Supported formats: .pcap, .pcapng, .cap
+              Supported formats: .pcap, .pcapng, .cap (optionally .gz, .zst, .xz or .bz2 compressed)
             </Typography>
           </Box>
         );
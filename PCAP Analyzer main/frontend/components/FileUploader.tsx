@@ -7,11 +7,12 @@ import {
 } from '@mui/material';
 import { CloudUpload, BarChart } from '@mui/icons-material';
 import { useAnalysis } from '@/contexts/AnalysisContext';
-import { fetchAnalysisData, fetchSampleAnalysis } from '@/services/api';
+import { fetchAnalysisData, fetchSampleAnalysis, subscribeToProgress, AnalysisProgress } from '@/services/api';
 import { useRouter } from 'next/navigation';
 
 const FileUploader: React.FC = () => {
   const [localLoading, setLocalLoading] = useState(false);
+  const [progress, setProgress] = useState<AnalysisProgress | null>(null);
   const { setAnalysisData, setIsLoading, setError, isLoading, error } = useAnalysis();
   const router = useRouter();
   
@@ -23,10 +24,19 @@ const FileUploader: React.FC = () => {
     setLocalLoading(true);
     setIsLoading(true);
     setError(null);
+    setProgress(null);
+    
+    // Subscribe to progress before uploading so no events are missed
+    const analysisId = crypto.randomUUID().replace(/-/g, '');
+    // Merge events so partial results (e.g. protocol counts) stay visible
+    const unsubscribe = subscribeToProgress(analysisId, (event) =>
+      setProgress((previous) => ({ ...previous, ...event }))
+    );
     
     const formData = new FormData();
     formData.append('file', file);
     formData.append('run_llm_analysis', 'true');
+    formData.append('analysis_id', analysisId);
     
     try {
       const data = await fetchAnalysisData(formData);
@@ -37,11 +47,37 @@ const FileUploader: React.FC = () => {
       setError(errorMessage);
       console.error('Upload error:', err);
     } finally {
+      unsubscribe();
       setLocalLoading(false);
       setIsLoading(false);
     }
   };
   
+  const describeProgress = (event: AnalysisProgress | null) => {
+    if (!event) return 'Analyzing network traffic...';
+    switch (event.stage) {
+      case 'stored':
+        return 'Upload stored, starting analysis...';
+      case 'parsing':
+        return `Parsing packets: ${event.packets_parsed.toLocaleString()} (${Math.round(event.packets_per_sec).toLocaleString()} pkts/s)`;
+      case 'parsed':
+        return `Parsed ${event.packets_parsed.toLocaleString()} packets`;
+      case 'flows_built':
+        return `Built ${event.total_flows.toLocaleString()} flows`;
+      case 'features_extracted':
+        return 'Features extracted, detecting anomalies...';
+      case 'detection_done':
+        return `Detected ${event.anomaly_count} anomalies`;
+      case 'llm_started':
+        return `Running LLM analysis (${event.model})...`;
+      case 'llm_done':
+      case 'complete':
+        return 'Finalizing results...';
+      default:
+        return 'Analyzing network traffic...';
+    }
+  };
+  
   const handleViewDemo = async () => {
     setLocalLoading(true);
     setIsLoading(true);
@@ -69,7 +105,7 @@ const FileUploader: React.FC = () => {
       
       <Box sx={{ display: 'flex', flexDirection: 'column', alignItems: 'center', py: 3 }}>
         <input
-          accept=".pcap,.pcapng"
+          accept=".pcap,.pcapng,.gz,.zst,.xz,.bz2"
           style={{ display: 'none' }}
           id="raised-button-file"
           type="file"
@@ -89,9 +125,18 @@ const FileUploader: React.FC = () => {
         </label>
         
         {localLoading && (
-          <Box sx={{ display: 'flex', alignItems: 'center', mt: 2 }}>
-            <CircularProgress size={24} sx={{ mr: 1 }} />
-            <Typography>Analyzing network traffic...</Typography>
+          <Box sx={{ display: 'flex', flexDirection: 'column', alignItems: 'center', mt: 2 }}>
+            <Box sx={{ display: 'flex', alignItems: 'center' }}>
+              <CircularProgress size={24} sx={{ mr: 1 }} />
+              <Typography>{describeProgress(progress)}</Typography>
+            </Box>
+            {progress?.protocols && (
+              <Typography variant="body2" color="text.secondary" sx={{ mt: 1 }}>
+                {Object.entries(progress.protocols)
+                  .map(([protocol, count]) => `${protocol}: ${count}`)
+                  .join(' · ')}
+              </Typography>
+            )}
           </Box>
         )}
       </Box>
@@ -22,6 +22,35 @@ export const fetchAnalysisData = async (fileData: FormData) => {
   }
 };
 
+export interface AnalysisProgress {
+  analysis_id: string;
+  stage: string;
+  elapsed: number;
+  [key: string]: any;
+}
+
+// Subscribe to Server-Sent Events progress for an analysis; returns an unsubscribe function
+export const subscribeToProgress = (
+  analysisId: string,
+  onEvent: (event: AnalysisProgress) => void
+) => {
+  const source = new EventSource(`${API_URL}/api/progress/${analysisId}`);
+  
+  source.onmessage = (message) => {
+    const event: AnalysisProgress = JSON.parse(message.data);
+    onEvent(event);
+    if (event.stage === 'complete' || event.stage === 'error') {
+      source.close();
+    }
+  };
+  source.onerror = () => {
+    // Progress is best-effort; the upload request still returns the full result
+    source.close();
+  };
+  
+  return () => source.close();
+};
+
 export const checkBackendStatus = async () => {
   try {
     const response = await fetch(`${API_URL}/api/status`);
@@ -53,6 +82,55 @@ export const requestLLMAnalysis = async (data: any) => {
   }
 };
 
+// Stream a comprehensive LLM analysis: onToken receives text as it is generated,
+// the returned promise resolves with the structured result once generation ends
+export const streamPcapAnalysis = async (
+  data: any,
+  onToken: (text: string) => void
+) => {
+  const response = await fetch(`${API_URL}/api/analyze-pcap`, {
+    method: 'POST',
+    headers: {
+      'Content-Type': 'application/json',
+      'Accept': 'text/event-stream',
+    },
+    body: JSON.stringify({ ...data, stream: true }),
+  });
+  
+  if (!response.ok || !response.body) {
+    throw new Error(`API Error (${response.status})`);
+  }
+  
+  const reader = response.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = '';
+  let result: any = null;
+  
+  while (true) {
+    const { done, value } = await reader.read();
+    if (done) break;
+    buffer += decoder.decode(value, { stream: true });
+    
+    // SSE messages are separated by a blank line
+    let boundary;
+    while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+      const message = buffer.slice(0, boundary);
+      buffer = buffer.slice(boundary + 2);
+      const eventLine = message.split('\n').find((line) => line.startsWith('event: '));
+      const dataLine = message.split('\n').find((line) => line.startsWith('data: '));
+      if (!dataLine) continue;
+      const payload = JSON.parse(dataLine.slice('data: '.length));
+      if (eventLine === 'event: token') {
+        onToken(payload.text);
+      } else if (eventLine === 'event: result') {
+        result = payload;
+      }
+    }
+  }
+  
+  return result;
+};
+
 export const fetchSampleAnalysis = async () => {
   try {
     const response = await fetch(`${API_URL}/api/sample-analysis`);